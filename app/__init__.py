@@ -1,22 +1,90 @@
+import os
 from flask import Flask
-from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
+from app.replica import RoutingSQLAlchemy
 
 
-db = SQLAlchemy()
+db = RoutingSQLAlchemy()
+migrate = Migrate()
 
 
 def create_app():
     from . import config
     from . import routes
+    from . import instrumentation
+    from . import commands
+    from . import db_pool
+    from . import schema
+    from . import replica
+    from . import search
+    from . import leaderboard
+    from . import metrics
+    from . import profiler
+    from .services import auth_service
 
     flask_app = Flask(__name__)
     flask_app.config["SQLALCHEMY_DATABASE_URI"] = config.DATABASE_CONNECTION_URI
     flask_app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if config.DATABASE_REPLICA_URI:
+        flask_app.config["SQLALCHEMY_BINDS"] = {replica.REPLICA: config.DATABASE_REPLICA_URI}
+    flask_app.config["REPLICA_STICKY_SECONDS"] = config.REPLICA_STICKY_SECONDS
+    flask_app.config["DB_POOL_SIZE"] = config.DB_POOL_SIZE
+    flask_app.config["DB_MAX_OVERFLOW"] = config.DB_MAX_OVERFLOW
+    flask_app.config["DB_POOL_TIMEOUT"] = config.DB_POOL_TIMEOUT
+    flask_app.config["DB_POOL_RECYCLE"] = config.DB_POOL_RECYCLE
+    flask_app.config["DB_POOL_PRE_PING"] = config.DB_POOL_PRE_PING
+    flask_app.config["DB_STATEMENT_TIMEOUT"] = config.DB_STATEMENT_TIMEOUT
+    flask_app.config["SQLALCHEMY_ENGINE_OPTIONS"] = db_pool.engine_options(flask_app.config)
     flask_app.config["SECRET_KEY"] = config.secret_key
+    flask_app.config["FAST_START"] = config.FAST_START
+    flask_app.config["DEFAULT_PAGE_SIZE"] = config.DEFAULT_PAGE_SIZE
+    flask_app.config["MAX_PAGE_SIZE"] = config.MAX_PAGE_SIZE
+    flask_app.config["SEARCH_BACKEND"] = config.SEARCH_BACKEND
+    flask_app.config["TOP_CACHE_TTL"] = config.TOP_CACHE_TTL
+    flask_app.config["TOP_PRIOR_WEIGHT"] = config.TOP_PRIOR_WEIGHT
+    flask_app.config["BULK_MAX_ITEMS"] = config.BULK_MAX_ITEMS
+    flask_app.config["AUTH_ROLES_FROM_TOKEN"] = config.AUTH_ROLES_FROM_TOKEN
+    flask_app.config["TOKEN_CACHE_SIZE"] = config.TOKEN_CACHE_SIZE
+    flask_app.config["TOKEN_CACHE_TTL"] = config.TOKEN_CACHE_TTL
+    flask_app.config["TOKEN_VERSION_TTL"] = config.TOKEN_VERSION_TTL
+    flask_app.config["SQL_STATEMENT_LIMIT"] = config.SQL_STATEMENT_LIMIT
+    flask_app.config["SLOW_QUERY_SECONDS"] = config.SLOW_QUERY_SECONDS
+    flask_app.config["N_PLUS_ONE_THRESHOLD"] = config.N_PLUS_ONE_THRESHOLD
+    flask_app.config["HASH_POOL_WORKERS"] = config.HASH_POOL_WORKERS
+    flask_app.config["HASH_POOL_QUEUE_SIZE"] = config.HASH_POOL_QUEUE_SIZE
+    flask_app.config["HASH_POOL_TIMEOUT"] = config.HASH_POOL_TIMEOUT
+    flask_app.config["HASH_POOL_RETRY_AFTER"] = config.HASH_POOL_RETRY_AFTER
+    flask_app.config["METRICS_ENABLED"] = config.METRICS_ENABLED
+    flask_app.config["PROFILE_DIR"] = config.PROFILE_DIR
+    flask_app.config["PROFILE_SAMPLE_RATE"] = config.PROFILE_SAMPLE_RATE
+    flask_app.config["PROFILE_FORMAT"] = config.PROFILE_FORMAT
+    flask_app.config["COMPRESS_ENABLED"] = config.COMPRESS_ENABLED
+    flask_app.config["COMPRESS_MIN_SIZE"] = config.COMPRESS_MIN_SIZE
+    flask_app.config["COMPRESS_GZIP_LEVEL"] = config.COMPRESS_GZIP_LEVEL
+    flask_app.config["COMPRESS_BROTLI_QUALITY"] = config.COMPRESS_BROTLI_QUALITY
+    flask_app.config["KAFKA_BOOTSTRAP_SERVERS"] = config.KAFKA_1
+    flask_app.config["KAFKA_TOPIC"] = config.KAFKA_TOPIC
+    flask_app.config["KAFKA_LINGER_MS"] = config.KAFKA_LINGER_MS
+    flask_app.config["KAFKA_BATCH_SIZE"] = config.KAFKA_BATCH_SIZE
+    flask_app.config["OUTBOX_BATCH_SIZE"] = config.OUTBOX_BATCH_SIZE
+    flask_app.config["OUTBOX_POLL_INTERVAL"] = config.OUTBOX_POLL_INTERVAL
 
     with flask_app.app_context():
         db.init_app(flask_app)
-        db.create_all()
+        migrate.init_app(flask_app, db, directory=os.path.join(os.path.dirname(flask_app.root_path), "migrations"))
+        instrumentation.init_app(flask_app)
+        replica.init_app(flask_app, db)
+        search.init_app(flask_app)
+        leaderboard.init_app(flask_app)
+        metrics.init_app(flask_app)
+        auth_service.init_app(flask_app)
+        if not flask_app.config["FAST_START"]:
+            schema.check_revision(flask_app)
         flask_app.register_blueprint(routes.api, url_prefix="/api")
+        profiler.init_app(flask_app)
+
+    flask_app.cli.add_command(commands.rebuild_grade_aggregates)
+    flask_app.cli.add_command(commands.relay_outbox)
+    flask_app.cli.add_command(commands.migrate)
 
     return flask_app
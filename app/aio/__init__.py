@@ -0,0 +1,42 @@
+'''
+ASGI variant of the API: the same routes as app.routes, as coroutines served by Quart, with async
+SQLAlchemy sessions over asyncpg. A worker serves many concurrent requests on one event loop instead
+of one per thread: it waits for the database and the password hashing pool without holding a thread.
+    uvicorn asgi:app --workers 4
+
+Served routes are signup, login, company registration and company, comment and grade reads and writes.
+Admin, bulk, search and top rated company routes, response compression, read replica and the statement
+budget stay in the WSGI app.
+'''
+from quart import Quart
+
+
+def create_app() -> Quart:
+    from app import config
+    from app.aio import database, routes
+    from app.services import auth_service
+
+    asgi_app = Quart(__name__)
+    asgi_app.config["DATABASE_URI"] = config.DATABASE_CONNECTION_URI
+    asgi_app.config["DB_POOL_SIZE"] = config.DB_POOL_SIZE
+    asgi_app.config["DB_MAX_OVERFLOW"] = config.DB_MAX_OVERFLOW
+    asgi_app.config["DB_POOL_TIMEOUT"] = config.DB_POOL_TIMEOUT
+    asgi_app.config["DB_POOL_RECYCLE"] = config.DB_POOL_RECYCLE
+    asgi_app.config["DB_POOL_PRE_PING"] = config.DB_POOL_PRE_PING
+    asgi_app.config["DB_STATEMENT_TIMEOUT"] = config.DB_STATEMENT_TIMEOUT
+    asgi_app.config["SECRET_KEY"] = config.secret_key
+    asgi_app.config["DEFAULT_PAGE_SIZE"] = config.DEFAULT_PAGE_SIZE
+    asgi_app.config["MAX_PAGE_SIZE"] = config.MAX_PAGE_SIZE
+    asgi_app.config["AUTH_ROLES_FROM_TOKEN"] = config.AUTH_ROLES_FROM_TOKEN
+    asgi_app.config["TOKEN_CACHE_SIZE"] = config.TOKEN_CACHE_SIZE
+    asgi_app.config["TOKEN_CACHE_TTL"] = config.TOKEN_CACHE_TTL
+    asgi_app.config["TOKEN_VERSION_TTL"] = config.TOKEN_VERSION_TTL
+    asgi_app.config["HASH_POOL_WORKERS"] = config.HASH_POOL_WORKERS
+    asgi_app.config["HASH_POOL_QUEUE_SIZE"] = config.HASH_POOL_QUEUE_SIZE
+    asgi_app.config["HASH_POOL_TIMEOUT"] = config.HASH_POOL_TIMEOUT
+    asgi_app.config["HASH_POOL_RETRY_AFTER"] = config.HASH_POOL_RETRY_AFTER
+
+    database.init_app(asgi_app)
+    auth_service.init_app(asgi_app) # token caches and hash pool only use app's config and extensions
+    asgi_app.register_blueprint(routes.api, url_prefix="/api")
+    return asgi_app
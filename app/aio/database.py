@@ -0,0 +1,59 @@
+'''
+Async database access of the ASGI app: SQLAlchemy AsyncSession over asyncpg, with the same mapped
+models as the sync app. Every request gets its own session, closed when the request ends.
+Relationships can not be lazy loaded with await, so queries load what they serialize upfront.
+'''
+from quart import Quart, current_app, g
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+
+def async_uri(uri: str) -> str:
+    '''Same database, asyncpg driver.'''
+    return make_url(uri).set(drivername='postgresql+asyncpg').render_as_string(hide_password=False)
+
+
+def engine_options(config) -> dict:
+    '''Engine options built from the same DB_* settings as the sync pool.'''
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT'] is not None:
+        options['connect_args'] = {'server_settings': {'statement_timeout': str(config['DB_STATEMENT_TIMEOUT'])}}
+    return options
+
+
+def session() -> AsyncSession:
+    '''Session of current request, created on first use.'''
+    if 'db_session' not in g:
+        g.db_session = current_app.extensions['async_session']()
+    return g.db_session
+
+
+async def get_page(statement, column, after=None, limit: int = 50, descending: bool = False) -> list:
+    '''Keyset (cursor) pagination, see app.database.get_page.'''
+    if after is not None:
+        statement = statement.where(column < after if descending else column > after)
+    statement = statement.order_by(column.desc() if descending else column.asc()).limit(limit)
+    return (await session().execute(statement)).scalars().all()
+
+
+def init_app(app: Quart):
+    engine = create_async_engine(async_uri(app.config['DATABASE_URI']), **engine_options(app.config))
+    app.extensions['async_engine'] = engine
+    app.extensions['async_session'] = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    @app.teardown_appcontext
+    async def close_session(exception):
+        db_session = g.pop('db_session', None)
+        if db_session is not None:
+            await db_session.close()
+
+    @app.after_serving
+    async def dispose_engine():
+        await engine.dispose()
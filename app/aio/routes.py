@@ -0,0 +1,159 @@
+from quart import Blueprint, jsonify, request
+from sqlalchemy.exc import IntegrityError
+
+from app import serializers
+from app.aio.services import auth_service, company_service
+from app.services import company_service as sync_company_service
+from app.services.auth_service import AuthException
+from app.services.company_service import NotApproved, RoleNotAllowed
+
+
+api = Blueprint('api', __name__)
+from app.aio.routes_utils import check_token, required_roles, get_logged_in_user, json_response, page_response, \
+    serialize, not_modified
+from app import routes as sync_routes # app.routes_utils registers its handlers on the sync blueprint, import it first
+from app.routes_utils import company_etag, page_etag
+
+
+@api.post('/signup')
+async def signup():
+    '''Registers new user on the system'''
+    data = await request.get_json()
+    if not data or not data.get('username') or not data.get('password'):
+        return 'did not receive username or password', 400
+
+    try:
+        user = await auth_service.signup(data.get('username'), data.get('password'))
+        return json_response(await serialize(user))
+    except IntegrityError:
+        return 'username not unique', 400
+
+
+@api.post('/login')
+async def login():
+    '''login on system'''
+    data = await request.get_json()
+    if not data or not data.get('username') or not data.get('password'):
+        return 'did not receive username or password', 400
+
+    try:
+        return jsonify(await auth_service.login(data['username'], data['password']))
+    except AuthException as e:
+        return jsonify(str(e)), 400
+
+
+@api.post('/company')
+@check_token
+async def create_company_registration():
+    data = await request.get_json()
+    if not data:
+        return 'did not receive data.', 400
+
+    user = await get_logged_in_user()
+    try:
+        company = await company_service.create_company_registration(user, data)
+        return json_response(await serialize(company))
+    except IntegrityError as e:
+        return jsonify(str(e)), 400
+
+
+@api.get('/company/<string:type>')
+@check_token
+@required_roles(['admin'])
+async def get_companies(type: str):
+    '''Returns one page of all/approved/not-resolved companies, see app.routes.get_companies.'''
+    try:
+        limit, after = request.args.get('limit', type=int), request.args.get('after', type=int)
+        if request.if_none_match:
+            versions = await company_service.get_page_versions(type, after=after, limit=limit)
+            response = not_modified(page_etag(versions))
+            if response:
+                if versions and len(versions) == company_service.page_size(limit):
+                    response.headers['X-Next-Cursor'] = str(versions[-1][0])
+                return response
+
+        companies = await company_service.get_all_companies(type, after=after, limit=limit,
+                                                            options=sync_company_service.serialization_loaders())
+        response = page_response(companies, limit)
+        response.set_etag(page_etag([(company.id, company.version) for company in companies]))
+        return response
+    except ValueError as e:
+        return jsonify(str(e)), 400
+
+
+@api.get('/company/<int:company_id>')
+@check_token
+async def get_company(company_id: int):
+    '''Get one company, see app.routes.get_company.'''
+    collections = request.args.get('embed', 'true').lower() != 'false'
+    if request.if_none_match:
+        response = not_modified(company_etag(company_id, await company_service.get_version(company_id), collections))
+        if response:
+            return response
+
+    company = await company_service.get_company(company_id,
+                                                options=sync_company_service.serialization_loaders(collections))
+    rules = () if collections else sync_company_service.WITHOUT_COLLECTIONS_RULES
+    response = json_response(serializers.to_dict(company, rules))
+    response.set_etag(company_etag(company.id, company.version, collections))
+    return response
+
+
+@api.get('/company/<int:company_id>/comments')
+@check_token
+async def get_company_comments(company_id: int):
+    '''Returns one page of company comments, newest first.'''
+    try:
+        limit = request.args.get('limit', type=int)
+        comments = await company_service.get_comments(company_id, after=request.args.get('after', type=int), limit=limit)
+        return page_response(comments, limit, rules=('-company',))
+    except ValueError as e:
+        return jsonify(str(e)), 400
+
+
+@api.get('/company/<int:company_id>/grades')
+@check_token
+async def get_company_grades(company_id: int):
+    '''Returns one page of company grades, newest first.'''
+    try:
+        limit = request.args.get('limit', type=int)
+        grades = await company_service.get_grades(company_id, after=request.args.get('after', type=int), limit=limit)
+        return page_response(grades, limit, rules=('-company',))
+    except ValueError as e:
+        return jsonify(str(e)), 400
+
+
+@api.post('/company/<int:company_id>/comment')
+@check_token
+@required_roles(['user'])
+async def create_comment(company_id: int):
+    '''Logged in user (ony as user role) creates comment for specified (only approved) company.'''
+    data = await request.get_json()
+    if not data or not data.get('description'):
+        return 'did not receive data.', 400
+
+    user = await get_logged_in_user()
+    try:
+        comment = await company_service.create_comment(user, company_id, data.get('description'))
+        return json_response(await serialize(comment))
+    except NotApproved as e:
+        return jsonify(str(e)), 400
+    except RoleNotAllowed as e:
+        return jsonify(str(e)), 403
+
+
+@api.post('/company/<int:company_id>/grade')
+@check_token
+@required_roles(['user'])
+async def add_grade(company_id: int):
+    '''Logged in user (ony as user role) adds grade for specified (only approved) company.'''
+    data = await request.get_json()
+    if not data or not data.get('grade'):
+        return 'did not receive data.', 400
+
+    user = await get_logged_in_user()
+    try:
+        grade = await company_service.add_grade(user, company_id, data.get('grade'))
+        return json_response(await serialize(grade))
+    except (NotApproved, RoleNotAllowed, ValueError) as e:
+        return jsonify(str(e)), 400
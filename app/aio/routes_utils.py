@@ -0,0 +1,134 @@
+from functools import wraps
+from typing import Optional
+
+import jwt
+from quart import Response, current_app, g, jsonify, request
+from sqlalchemy.exc import NoResultFound
+
+from app import serializers
+from app.aio.database import session
+from app.aio.services import auth_service, company_service
+from app.hash_pool import PoolSaturated
+from app.models import User
+from .routes import api
+
+
+class AuthContext:
+    '''Identity of the user who sent current request, see app.routes_utils.AuthContext.'''
+
+    def __init__(self, token: str, claims: dict):
+        self.token = token
+        self.claims = claims
+        self._user: User | None = None
+
+    async def role(self) -> str:
+        if current_app.config['AUTH_ROLES_FROM_TOKEN']:
+            return self.claims['role']
+        return (await self.user()).role.name
+
+    async def user(self) -> User:
+        if self._user is None:
+            self._user = await auth_service.find_by_username(self.claims['username'])
+            if not self._user:
+                raise NoResultFound(f"No user with given username: {self.claims['username']}")
+        return self._user
+
+
+async def get_auth_context() -> AuthContext:
+    token = request.headers['authorization'].split(' ')[1]
+    auth: AuthContext | None = g.get('auth')
+    if auth is None or auth.token != token:
+        auth = AuthContext(token, await auth_service.decode_token(token))
+        g.auth = auth
+    return auth
+
+
+async def get_logged_in_user() -> User:
+    return await (await get_auth_context()).user()
+
+
+def json_response(data, status: int = 200) -> Response:
+    return current_app.response_class(serializers.dumps(data), status=status, mimetype='application/json')
+
+
+async def serialize(instance, rules: tuple = ()) -> dict:
+    '''Serializes instance in sync code, where relationships which were not loaded upfront can still be lazy loaded.'''
+    return await session().run_sync(lambda _: serializers.to_dict(instance, rules))
+
+
+def page_response(items: list, limit: int = None, rules: tuple = ()) -> Response:
+    '''Serializes one page of items, see app.routes_utils.page_response. Items must be fully loaded.'''
+    response = json_response([serializers.to_dict(item, rules) for item in items])
+    if items and len(items) == company_service.page_size(limit):
+        response.headers['X-Next-Cursor'] = str(items[-1].id)
+    return response
+
+
+def not_modified(etag: str) -> Optional[Response]:
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class('', status=304)
+    response.set_etag(etag)
+    return response
+
+
+def check_token(f):
+    @wraps(f)
+    async def wrap(*args, **kwargs):
+        if not request.headers.get('authorization'):
+            return jsonify('no token provided'), 403
+        try:
+            await get_auth_context()
+            if not current_app.config['AUTH_ROLES_FROM_TOKEN']:
+                await get_logged_in_user() # user from token must exist
+
+        except jwt.ExpiredSignatureError:
+            return 'Signature expired. Please log in again.', 403
+        except jwt.InvalidTokenError:
+            return 'Invalid token. Please log in again.', 403
+        except Exception:
+            return 'Problem with authentication.', 403
+
+        return await f(*args, **kwargs)
+
+    return wrap
+
+
+def required_roles(roles: list[str]):
+    def decorator_required_roles(f):
+        @wraps(f)
+        async def wrap(*args, **kwargs):
+            try:
+                role = await (await get_auth_context()).role()
+                if role not in roles:
+                    return f'provided role: {role}. Accepted roles: {roles}', 403
+            except Exception:
+                return 'Problem with auth.', 403
+
+            return await f(*args, **kwargs)
+        return wrap
+    return decorator_required_roles
+
+
+@api.app_errorhandler(PoolSaturated)
+async def handle_pool_saturated(e):
+    return jsonify(str(e)), 503, {'Retry-After': str(current_app.config['HASH_POOL_RETRY_AFTER'])}
+
+
+@api.app_errorhandler(KeyError)
+async def handle_key_error(e):
+    return jsonify("Bad keys. Check json keys."), 400
+
+
+@api.app_errorhandler(NoResultFound)
+async def handle_no_result(e):
+    return jsonify(str(e)), 404
+
+
+@api.after_app_request
+async def after_request(response):
+    header = response.headers
+    header["Access-Control-Allow-Origin"] = "*"
+    header["Access-Control-Allow-Headers"] = "*"
+    header["Access-Control-Allow-Methods"] = "*"
+    return response
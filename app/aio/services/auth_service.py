@@ -0,0 +1,76 @@
+'''Coroutine versions of app.services.auth_service.'''
+from datetime import datetime, timedelta
+import time
+
+import jwt
+from quart import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import NoResultFound
+
+from app.aio.database import session
+from app.cache import LRUCache
+from app.hash_pool import HashPool
+from app.models import User
+from app.services.auth_service import AuthException
+
+
+async def signup(username: str, password: str) -> User:
+    '''creates new user with given username and password.'''
+    pass_hash = await hash_pool().generate_password_hash_async(password)
+    user = User({'username': username, 'password': pass_hash})
+    session().add(user)
+    await commit()
+    return user
+
+
+async def login(username: str, password: str) -> str:
+    user = await find_by_username(username)
+    if not user:
+        raise NoResultFound(f"No user with given username: {username}")
+
+    if not await hash_pool().check_password_hash_async(user.password, password):
+        raise AuthException('wrong password provided')
+
+    return jwt.encode({'username': user.username, 'role': user.role.name, 'ver': user.token_version,
+                       'exp': datetime.utcnow() + timedelta(minutes=30)},
+                      current_app.config['SECRET_KEY'],
+                      algorithm='HS256')
+
+
+async def find_by_username(username: str) -> User | None:
+    return (await session().execute(select(User).where(User.username == username))).scalar_one_or_none()
+
+
+async def commit():
+    try:
+        await session().commit()
+    except Exception:
+        await session().rollback()
+        raise
+
+
+def hash_pool() -> HashPool:
+    return current_app.extensions['hash_pool']
+
+
+async def decode_token(token: str) -> dict:
+    '''Verifies token, see app.services.auth_service.decode_token.'''
+    verified_tokens: LRUCache = current_app.extensions['verified_tokens']
+    claims = verified_tokens.get(token)
+    if claims is None:
+        claims = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        verified_tokens.set(token, claims, ttl=claims['exp'] - time.time() if 'exp' in claims else None)
+
+    if current_app.config['AUTH_ROLES_FROM_TOKEN'] and claims.get('ver', 0) < await token_version(claims['username']):
+        raise jwt.InvalidTokenError('token was revoked')
+    return claims
+
+
+async def token_version(username: str) -> int:
+    token_versions: LRUCache = current_app.extensions['token_versions']
+    version = token_versions.get(username)
+    if version is None:
+        version = (await session().execute(select(User.token_version).where(User.username == username))).scalar()
+        version = version or 0
+        token_versions.set(username, version)
+    return version
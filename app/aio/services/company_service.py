@@ -0,0 +1,143 @@
+'''Coroutine versions of app.services.company_service, for the routes served by the ASGI app.'''
+from typing import Literal
+
+from quart import current_app
+from sqlalchemy import select, update
+from sqlalchemy.exc import NoResultFound
+
+from app import outbox
+from app.aio.database import get_page, session
+from app.aio.services.auth_service import commit
+from app.models import User, Company, UserRole, Comment, Grade
+from app.services.company_service import NotApproved, RoleNotAllowed, grade_aggregates_increment, is_grade, \
+    version_increment
+
+
+async def create_company_registration(user: User, data: dict) -> Company:
+    company = Company(fields={key: value for key, value in data.items() if key not in Company.rating_fields})
+    company.approved = False
+
+    def register(sync_session):
+        # replacing user's company lazy loads the previous one, which only works in sync code
+        user.company = company
+        sync_session.add(company)
+        sync_session.flush()
+        sync_session.add(outbox.event('company_registered', company.id, {'company_id': company.id, 'user_id': user.id,
+                                                                         'name': company.name}))
+
+    try:
+        await session().run_sync(register)
+    except Exception:
+        await session().rollback()
+        raise
+    await commit()
+    return company
+
+
+async def get_company(company_id: int, options: tuple = ()) -> Company:
+    company = (await session().execute(select(Company).where(Company.id == company_id).options(*options))).scalar()
+    if not company:
+        raise NoResultFound(f'no company with id: {company_id}')
+    return company
+
+
+async def get_comments(company_id: int, after: int = None, limit: int = None) -> list[Comment]:
+    '''Returns one page of company's comments, newest first.'''
+    await get_version(company_id)
+    statement = select(Comment).where(Comment.company_id == company_id)
+    return await get_page(statement, Comment.id, after=after, limit=page_size(limit), descending=True)
+
+
+async def get_grades(company_id: int, after: int = None, limit: int = None) -> list[Grade]:
+    '''Returns one page of company's grades, newest first.'''
+    await get_version(company_id)
+    statement = select(Grade).where(Grade.company_id == company_id)
+    return await get_page(statement, Grade.id, after=after, limit=page_size(limit), descending=True)
+
+
+async def get_all_companies(type: Literal['approved', 'all', 'not-resolved'], after: int = None, limit: int = None,
+                            options: tuple = ()) -> list[Company]:
+    '''Returns one page of companies ordered by id.'''
+    statement = companies_statement(select(Company), type).options(*options)
+    return await get_page(statement, Company.id, after=after, limit=page_size(limit))
+
+
+async def get_page_versions(type: Literal['approved', 'all', 'not-resolved'], after: int = None,
+                            limit: int = None) -> list[tuple[int, int]]:
+    '''Returns (id, version) of companies on the same page get_all_companies returns.'''
+    statement = companies_statement(select(Company.id, Company.version), type)
+    if after is not None:
+        statement = statement.where(Company.id > after)
+    rows = await session().execute(statement.order_by(Company.id).limit(page_size(limit)))
+    return [tuple(row) for row in rows]
+
+
+async def get_version(company_id: int) -> int:
+    version = (await session().execute(select(Company.version).where(Company.id == company_id))).scalar()
+    if version is None:
+        raise NoResultFound(f'no company with id: {company_id}')
+    return version
+
+
+def companies_statement(statement, type: Literal['approved', 'all', 'not-resolved']):
+    match type:
+        case 'all':
+            return statement
+        case 'approved':
+            return statement.where(Company.approved == True)
+        case 'not-resolved':
+            return statement.where(Company.approved == False)
+        case _:
+            raise ValueError(f'unknown company type: {type}. Type can be: all, approved or not-resolved.')
+
+
+def page_size(limit: int = None) -> int:
+    '''Returns requested page size, bounded by configured maximum.'''
+    if limit is None:
+        return current_app.config['DEFAULT_PAGE_SIZE']
+    if limit < 1:
+        raise ValueError('limit must be positive.')
+    return min(limit, current_app.config['MAX_PAGE_SIZE'])
+
+
+async def approved_company(user: User, company_id: int) -> Company:
+    company = await session().get(Company, company_id)
+    if not company:
+        raise NoResultFound(f'no company with id: {company_id}')
+    if not company.approved:
+        raise NotApproved('company registration not approved by admin')
+    if user.role != UserRole.user:
+        raise RoleNotAllowed('must login as user')
+    return company
+
+
+async def create_comment(user: User, company_id: int, description: str) -> Comment:
+    await approved_company(user, company_id)
+
+    comment = Comment({'company_id': company_id, 'description': description, 'user_id': user.id})
+    session().add(comment)
+    await session().flush()
+    session().add(outbox.event('comment_created', company_id, {'id': comment.id, 'company_id': company_id,
+                                                               'user_id': user.id, 'description': description}))
+    await session().execute(update(Company).where(Company.id == company_id).values(version_increment())
+                            .execution_options(synchronize_session=False))
+    await commit()
+    return comment
+
+
+async def add_grade(user: User, company_id: int, grade: int) -> Grade:
+    await approved_company(user, company_id)
+    if not is_grade(grade):
+        raise ValueError('grade must be in range [1,5].')
+
+    # grade, company aggregates and grade event are written in the same transaction
+    grade = Grade({'company_id': company_id, 'grade': grade, 'user_id': user.id})
+    session().add(grade)
+    await session().flush()
+    session().add(outbox.event('grade_created', company_id, {'id': grade.id, 'company_id': company_id,
+                                                             'user_id': user.id, 'grade': grade.grade}))
+    await session().execute(update(Company).where(Company.id == company_id)
+                            .values({**grade_aggregates_increment(grade.grade), **version_increment()})
+                            .execution_options(synchronize_session=False))
+    await commit()
+    return grade
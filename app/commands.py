@@ -0,0 +1,44 @@
+import signal
+from threading import Event
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+import flask_migrate
+from app import outbox, schema
+from app.services import company_service
+
+
+@click.command('rebuild-grade-aggregates')
+@with_appcontext
+def rebuild_grade_aggregates():
+    '''Recomputes company rating aggregates from Grade table.'''
+    graded = company_service.rebuild_grade_aggregates()
+    click.echo(f'rebuilt rating aggregates, {graded} companies have grades.')
+
+
+@click.command('migrate')
+@with_appcontext
+def migrate():
+    '''Migrates database schema to the newest revision. Run once per deploy, before the app is started.'''
+    flask_migrate.upgrade()
+    click.echo(f"database is at revision {', '.join(sorted(schema.current_revisions()))}.")
+
+
+@click.command('relay-outbox')
+@with_appcontext
+def relay_outbox():
+    '''Publishes outbox events to Kafka until stopped with SIGINT or SIGTERM.'''
+    if current_app.config['KAFKA_BOOTSTRAP_SERVERS'] == 'none':
+        raise click.UsageError('KAFKA1 is not set, there is no broker to publish to.')
+
+    stop = Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    relay = outbox.create_relay(current_app)
+    click.echo(f"relaying outbox events to {current_app.config['KAFKA_TOPIC']}")
+    try:
+        relay.run(stop)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        relay.producer.close()
+    click.echo(f'stopped, published {relay.published} events.')
@@ -0,0 +1,83 @@
+'''
+Negotiated response compression. JSON responses are compressed with brotli (when installed) or gzip,
+whichever the client prefers in Accept-Encoding. Small bodies are sent as they are, compressing
+them costs more CPU than it saves bytes. Streamed responses are compressed chunk by chunk.
+'''
+import zlib
+from typing import Iterable, Iterator
+
+from flask import Request, Response, current_app
+
+try:
+    import brotli
+except ImportError: # optional, only gzip is offered without it
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html', 'text/csv'}
+
+
+def available_encodings() -> list[str]:
+    '''Supported encodings, preferred first.'''
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def choose_encoding(request: Request) -> str | None:
+    return request.accept_encodings.best_match(available_encodings())
+
+
+def compressor(encoding: str):
+    '''Returns (compress chunk, finish) functions of a streaming compressor.'''
+    if encoding == 'br':
+        stream = brotli.Compressor(quality=current_app.config['COMPRESS_BROTLI_QUALITY'])
+        return lambda chunk: stream.process(chunk) + stream.flush(), stream.finish
+    # wbits 31 writes gzip header and trailer
+    stream = zlib.compressobj(current_app.config['COMPRESS_GZIP_LEVEL'], zlib.DEFLATED, 31)
+    return lambda chunk: stream.compress(chunk) + stream.flush(zlib.Z_SYNC_FLUSH), stream.flush
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    compress_chunk, finish = compressor(encoding)
+    return compress_chunk(data) + finish()
+
+
+def compress_stream(chunks: Iterable[bytes], compress_chunk, finish) -> Iterator[bytes]:
+    '''Every chunk is flushed, so the client receives data as soon as the app produces it.'''
+    try:
+        for chunk in chunks:
+            if chunk:
+                yield compress_chunk(chunk.encode() if isinstance(chunk, str) else chunk)
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(request: Request, response: Response) -> Response:
+    '''Compresses response body in place when it is worth it and the client accepts it.'''
+    if (not current_app.config['COMPRESS_ENABLED'] or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 304)
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or 'no-transform' in response.headers.get('Cache-Control', '')):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(request)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        # size is not known upfront, streamed bodies are always compressed
+        response.response = compress_stream(response.response, *compressor(encoding))
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+        response.set_data(compress(data, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    # compressed body is a different representation, same content stays a weak match for If-None-Match
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -1,6 +1,8 @@
+from collections import deque
 from typing import Optional, TypeVar
 from .models import User, db
 from flask import current_app
+from sqlalchemy import insert
 from sqlalchemy.exc import SQLAlchemyError
 
 T = TypeVar('T')
@@ -11,12 +13,52 @@ def get_all(model: T) -> list[T]:
     return data
 
 
+def get_page(query, column, after=None, limit: int = 50, descending: bool = False) -> list:
+    '''Keyset (cursor) pagination. Returns at most `limit` rows of `query` ordered by `column`,
+    starting right after the `after` cursor value. `column` must be unique so the order is stable.'''
+    if after is not None:
+        query = query.filter(column < after if descending else column > after)
+    order = column.desc() if descending else column.asc()
+    return query.order_by(order).limit(limit).all()
+
+
 def add_or_update(instance: T) -> T:
     ret = db.session.merge(instance)
     commit_changes()
     return ret
 
 
+def add(instance: T) -> T:
+    '''Adds instance to current transaction without committing it.'''
+    db.session.add(instance)
+    return instance
+
+
+def flush():
+    '''Sends pending changes of current transaction to the database, e.g. to get generated ids, without committing.'''
+    try:
+        db.session.flush()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        current_app.logger.error(e)
+        raise e
+
+
+def insert_many(model, rows: list[dict], chunk_size: int = 1000) -> list[int]:
+    '''Inserts rows with multi-row INSERT statements, without committing. Returns ids of inserted rows, in order of `rows`.
+    RETURNING does not guarantee order of VALUES, so returned rows are matched back to `rows` by their values.'''
+    ids = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        keys = list(chunk[0])
+        statement = insert(model).values(chunk).returning(model.id, *(model.__table__.c[key] for key in keys))
+        ids_by_values: dict[tuple, deque] = {}
+        for id, *values in db.session.execute(statement):
+            ids_by_values.setdefault(tuple(values), deque()).append(id)
+        ids.extend(ids_by_values[tuple(row[key] for key in keys)].popleft() for row in chunk)
+    return ids
+
+
 def delete_instance(model, id: int):
     model.query.filter_by(id=id).delete()
     commit_changes()
@@ -34,8 +76,9 @@ def find_by_username(username: str) -> Optional[User]:
     return User.query.filter_by(username=username).first()
 
 
-def find_by_id(model: T, id) -> T:
-    return model.query.get(id)
+def find_by_id(model: T, id, options: tuple = ()) -> T:
+    '''Finds instance by primary key. `options` are loader options, e.g. eager loading of relationships.'''
+    return model.query.options(*options).get(id)
 
 
 def commit_changes():
@@ -0,0 +1,85 @@
+'''
+Database connection pool settings and metrics. TimedQueuePool is the default QueuePool which also
+measures how long callers wait to check out a connection, so pool exhaustion shows up in metrics
+before it shows up as pool timeouts.
+'''
+import time
+from threading import Lock
+
+from flask import Flask
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from app import db
+
+
+class PoolStats:
+    '''Checkout counters of a pool, kept when the pool is recreated after invalidation or dispose.'''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+
+class TimedQueuePool(QueuePool):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            with self.stats.lock:
+                self.stats.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - start
+            with self.stats.lock:
+                self.stats.checkouts += 1
+                self.stats.wait_seconds_total += waited
+                self.stats.wait_seconds_max = max(self.stats.wait_seconds_max, waited)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def metrics(self) -> dict:
+        with self.stats.lock:
+            return {
+                'size': self.size(),
+                'checked_out': self.checkedout(),
+                'overflow': max(0, self.overflow()), # QueuePool counts overflow from -size
+                'checkouts': self.stats.checkouts,
+                'timeouts': self.stats.timeouts,
+                'checkout_wait_seconds_total': self.stats.wait_seconds_total,
+                'checkout_wait_seconds_max': self.stats.wait_seconds_max,
+            }
+
+
+def engine_options(config) -> dict:
+    '''SQLALCHEMY_ENGINE_OPTIONS built from DB_* settings.'''
+    options = {
+        'poolclass': TimedQueuePool,
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+    if config['DB_STATEMENT_TIMEOUT'] is not None:
+        options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT']}"}
+    return options
+
+
+def metrics(app: Flask) -> dict:
+    '''Metrics of every engine's pool, by bind name. Default engine is named `default`.'''
+    binds = [None, *(app.config.get('SQLALCHEMY_BINDS') or {})]
+    pools = {bind or 'default': db.get_engine(app, bind=bind).pool for bind in binds}
+    return {name: pool.metrics() for name, pool in pools.items() if isinstance(pool, TimedQueuePool)}
@@ -0,0 +1,183 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from threading import BoundedSemaphore, Lock
+from werkzeug import security
+
+
+class PoolSaturated(Exception):
+    '''When password hashing pool can not accept more work.'''
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def timed(fn, *args):
+    '''Runs fn in worker process and returns its result with time spent in it.'''
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class HashPool:
+    '''
+    Runs CPU bound password hashing in a pool of worker processes, so it does not starve request threads.
+    At most `workers` hashes run at once and at most `queue_size` more wait for a worker,
+    any further request is rejected right away with PoolSaturated. With 0 workers hashing runs inline.
+    '''
+
+    def __init__(self, workers: int, queue_size: int, timeout: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(workers + queue_size) if workers else None
+        self._executor: ProcessPoolExecutor | None = None
+        self._pid: int | None = None
+        # guards executor only, counters have their own lock which done-callbacks take,
+        # so shutdown can wait for callbacks without holding a lock they need
+        self._executor_lock = Lock()
+        self._lock = Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.wait_seconds_total = 0.0
+
+    def executor(self) -> ProcessPoolExecutor:
+        # executor is created lazily in every process, e.g. after pre-forking server starts its workers
+        with self._executor_lock:
+            if self._executor is None or self._pid != os.getpid():
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._pid = os.getpid()
+            return self._executor
+
+    def run(self, fn, *args):
+        start = time.perf_counter()
+        if not self.workers:
+            result, hash_seconds = timed(fn, *args)
+            self.record(start, hash_seconds)
+            return result
+
+        future, executor = self.submit(fn, *args)
+        try:
+            result, hash_seconds = future.result(timeout=self.timeout)
+        except TimeoutError:
+            self.timed_out()
+        except BrokenProcessPool:
+            self.broken(executor)
+
+        self.record(start, hash_seconds)
+        return result
+
+    async def run_async(self, fn, *args):
+        '''Like run, but awaits the worker process instead of blocking the calling thread, for the ASGI app.
+        With 0 workers hashing runs in the event loop's default thread pool.'''
+        start = time.perf_counter()
+        if not self.workers:
+            result, hash_seconds = await asyncio.get_running_loop().run_in_executor(None, timed, fn, *args)
+            self.record(start, hash_seconds)
+            return result
+
+        future, executor = self.submit(fn, *args)
+        try:
+            result, hash_seconds = await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+        except asyncio.TimeoutError:
+            self.timed_out()
+        except BrokenProcessPool:
+            self.broken(executor)
+
+        self.record(start, hash_seconds)
+        return result
+
+    def submit(self, fn, *args) -> tuple[Future, ProcessPoolExecutor]:
+        '''Takes a slot and queues fn in a worker process. Returns its future and the executor which runs it.'''
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PoolSaturated('password hashing queue is full.')
+
+        with self._lock:
+            self.in_flight += 1
+        executor = None
+        try:
+            executor = self.executor()
+            future = executor.submit(timed, fn, *args)
+        except BrokenProcessPool:
+            self.release()
+            self.discard(executor)
+            raise PoolSaturated('password hashing workers are restarting.')
+        except Exception:
+            self.release()
+            raise
+        # slot is freed when work is done, even if caller stopped waiting for it
+        future.add_done_callback(lambda _: self.release())
+        return future, executor
+
+    def timed_out(self):
+        with self._lock:
+            self.rejected += 1
+        raise PoolSaturated('password hashing timed out.')
+
+    def broken(self, executor: ProcessPoolExecutor):
+        # a worker died, executor can not be used anymore and is recreated by next call
+        self.discard(executor)
+        raise PoolSaturated('password hashing workers are restarting.')
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def record(self, start: float, hash_seconds: float):
+        with self._lock:
+            self.completed += 1
+            self.hash_seconds_total += hash_seconds
+            self.wait_seconds_total += time.perf_counter() - start - hash_seconds
+
+    def generate_password_hash(self, password: str) -> str:
+        return self.run(security.generate_password_hash, password)
+
+    def check_password_hash(self, pwhash: str, password: str) -> bool:
+        return self.run(security.check_password_hash, pwhash, password)
+
+    async def generate_password_hash_async(self, password: str) -> str:
+        return await self.run_async(security.generate_password_hash, password)
+
+    async def check_password_hash_async(self, pwhash: str, password: str) -> bool:
+        return await self.run_async(security.check_password_hash, pwhash, password)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queue_size': self.queue_size,
+                'in_flight': self.in_flight,
+                'queue_depth': max(0, self.in_flight - self.workers),
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'hash_seconds_total': self.hash_seconds_total,
+                'wait_seconds_total': self.wait_seconds_total,
+            }
+
+    def discard(self, executor: ProcessPoolExecutor | None):
+        '''Drops broken executor, unless another thread already replaced it.'''
+        with self._lock:
+            self.rejected += 1
+        with self._executor_lock:
+            if executor is None or self._executor is not executor:
+                return
+            self._executor = None
+        executor.shutdown(wait=False)
+
+    def shutdown(self):
+        '''Stops worker processes. Executor is taken out under the lock and shut down outside of it,
+        shutdown waits for done-callbacks of pending work.'''
+        with self._executor_lock:
+            executor, pid = self._executor, self._pid
+            self._executor = None
+        if executor is not None and pid == os.getpid():
+            executor.shutdown()
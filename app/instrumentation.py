@@ -0,0 +1,104 @@
+import time
+from collections import Counter
+
+from flask import Flask, current_app, g, has_app_context, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    '''Counts SQL round trips made while handling current request.'''
+    if has_app_context():
+        g.sql_statement_count = g.get('sql_statement_count', 0) + 1
+
+
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info['statement_start'] = time.perf_counter()
+
+
+def stop_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    '''Adds time of the statement to SQL time of current request and logs it when it is slow.'''
+    if has_app_context():
+        seconds = time.perf_counter() - conn.info['statement_start']
+        g.sql_statement_seconds = g.get('sql_statement_seconds', 0.0) + seconds
+        threshold = current_app.config['SLOW_QUERY_SECONDS']
+        if threshold is not None and seconds >= threshold:
+            route = f'{request.method} {request.path} ({request.endpoint})' if has_request_context() else 'no request'
+            current_app.logger.warning(f'slow SQL statement, {seconds * 1000:.1f} ms in {route}: {statement}')
+
+
+def count_statement_shape(conn, cursor, statement, parameters, context, executemany):
+    '''Counts executions of every statement in current request. Parameters are bound separately, so lazy
+    loads of the same relationship share one statement text.'''
+    if has_app_context():
+        shapes = g.get('sql_statement_shapes')
+        if shapes is not None:
+            shapes[statement] += 1
+
+
+def reset_request_stats():
+    g.sql_statement_count = 0
+    g.sql_statement_seconds = 0.0
+    g.sql_statement_shapes = Counter() if current_app.config['N_PLUS_ONE_THRESHOLD'] is not None else None
+
+
+def statement_count() -> int:
+    '''Returns number of SQL statements executed since the start of current request.'''
+    return g.get('sql_statement_count', 0)
+
+
+def statement_seconds() -> float:
+    '''Returns time spent executing SQL statements since the start of current request.'''
+    return g.get('sql_statement_seconds', 0.0)
+
+
+class QueryBudgetExceeded(Exception):
+    '''When request issues more SQL statements than SQL_STATEMENT_LIMIT allows.'''
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def check_statement_budget():
+    '''Checks that current request did not issue more SQL statements than configured limit. Under tests
+    the request fails, so lazy-load storms are caught before they reach production, otherwise a warning is logged.'''
+    limit = current_app.config['SQL_STATEMENT_LIMIT']
+    if limit is None or statement_count() <= limit:
+        return
+    message = f'{request.endpoint} issued {statement_count()} SQL statements, limit is {limit}.'
+    if current_app.testing:
+        raise QueryBudgetExceeded(message)
+    current_app.logger.warning(message)
+
+
+class RepeatedStatement(Exception):
+    '''When request executes the same SQL statement N_PLUS_ONE_THRESHOLD times, usually lazy loads in a loop.'''
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def check_repeated_statements():
+    '''Reports the most repeated statement of current request when it reached N_PLUS_ONE_THRESHOLD executions.
+    Like the statement budget, it fails the request under tests and logs a warning otherwise.'''
+    threshold, shapes = current_app.config['N_PLUS_ONE_THRESHOLD'], g.get('sql_statement_shapes')
+    if threshold is None or not shapes:
+        return
+    statement, count = shapes.most_common(1)[0]
+    if count < threshold:
+        return
+    message = f'{request.endpoint} executed the same SQL statement {count} times, N+1 query?: {statement}'
+    if current_app.testing:
+        raise RepeatedStatement(message)
+    current_app.logger.warning(message)
+
+
+def init_app(app: Flask):
+    if not event.contains(Engine, 'before_cursor_execute', count_statement):
+        event.listen(Engine, 'before_cursor_execute', count_statement)
+    # listeners are only registered when something uses them, disabled instrumentation costs nothing
+    timed = app.config['METRICS_ENABLED'] or app.config['SLOW_QUERY_SECONDS'] is not None
+    if timed and not event.contains(Engine, 'before_cursor_execute', start_statement_timer):
+        event.listen(Engine, 'before_cursor_execute', start_statement_timer)
+        event.listen(Engine, 'after_cursor_execute', stop_statement_timer)
+    if app.config['N_PLUS_ONE_THRESHOLD'] is not None and \
+            not event.contains(Engine, 'before_cursor_execute', count_statement_shape):
+        event.listen(Engine, 'before_cursor_execute', count_statement_shape)
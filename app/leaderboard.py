@@ -0,0 +1,114 @@
+'''
+Top rated companies. Approved companies with at least one grade are ranked by Bayesian average
+
+    score = (C * m + grade_sum) / (C + grade_count)
+
+where m is the mean of all grades and C is TOP_PRIOR_WEIGHT: a company's own average outweighs the
+mean only after about C grades, so a single 5 does not rank above hundreds of 4.8s.
+
+Ranking is built in the worker process from Company rating aggregates, without reading Grade rows,
+and cached. company_service applies committed grades to the cached aggregates, so grades given through
+this worker show up immediately. The cache is reloaded from the database after TOP_CACHE_TTL seconds,
+which bounds how long grades committed by other workers are missing.
+'''
+import time
+from threading import Lock
+
+from flask import Flask, current_app
+
+from app.models import Company
+
+
+class RankedCompany:
+    '''Cached rating aggregates of one company.'''
+
+    def __init__(self, id: int, name: str, location: str, grade_count: int, grade_sum: int):
+        self.id = id
+        self.name = name
+        self.location = location
+        self.grade_count = grade_count
+        self.grade_sum = grade_sum
+        self.score = 0.0
+
+    def to_dict(self) -> dict:
+        return {'id': self.id, 'name': self.name, 'location': self.location, 'grade_count': self.grade_count,
+                'avg_grade': self.grade_sum / self.grade_count, 'score': self.score}
+
+
+class Leaderboard:
+    '''Thread safe ranking of companies, rebuilt lazily after grades are added.'''
+
+    def __init__(self, ttl: float, prior_weight: float):
+        self.ttl = ttl
+        self.prior_weight = prior_weight
+        self._companies: dict[int, RankedCompany] = {}
+        self._ranking: list[RankedCompany] | None = None
+        self._expires_at = 0.0
+        self._lock = Lock()
+
+    def load(self, rows):
+        '''Replaces cached aggregates with rows of (id, name, location, grade_count, grade_sum).'''
+        with self._lock:
+            self._companies = {row[0]: RankedCompany(*row) for row in rows}
+            self._ranking = None
+            self._expires_at = time.monotonic() + self.ttl
+
+    @property
+    def expired(self) -> bool:
+        return self._expires_at <= time.monotonic()
+
+    def expire(self):
+        self._expires_at = 0.0
+
+    def add_grades(self, company_id: int, grades: list[int]):
+        '''Applies grades committed for a company. Company which had no grades is not cached
+        and its name and location are not known here, so the whole ranking is reloaded instead.'''
+        with self._lock:
+            company = self._companies.get(company_id)
+            if company is None:
+                self.expire()
+                return
+            company.grade_count += len(grades)
+            company.grade_sum += sum(grades)
+            self._ranking = None
+
+    def top(self, location: str = None, limit: int = 50) -> list[dict]:
+        '''Best ranked companies, optionally only those whose location contains `location`, case insensitive.'''
+        if location:
+            location = location.casefold()
+        top = []
+        with self._lock:
+            if self._ranking is None:
+                self._ranking = self.rank()
+            for company in self._ranking:
+                if len(top) == limit:
+                    break
+                if not location or location in company.location.casefold():
+                    top.append(company.to_dict())
+        return top
+
+    def rank(self) -> list[RankedCompany]:
+        grade_count = sum(company.grade_count for company in self._companies.values())
+        grade_sum = sum(company.grade_sum for company in self._companies.values())
+        prior = self.prior_weight * (grade_sum / grade_count if grade_count else 0)
+        for company in self._companies.values():
+            company.score = (prior + company.grade_sum) / (self.prior_weight + company.grade_count)
+        return sorted(self._companies.values(), key=lambda company: (-company.score, company.id))
+
+
+def get() -> Leaderboard:
+    '''Returns this worker's leaderboard, reloaded from the database when it is stale.'''
+    leaderboard: Leaderboard = current_app.extensions['leaderboard']
+    if leaderboard.expired:
+        leaderboard.load(Company.query
+                         .with_entities(Company.id, Company.name, Company.location, Company.grade_count, Company.grade_sum)
+                         .filter(Company.approved == True, Company.grade_count > 0))
+    return leaderboard
+
+
+def add_grades(company_id: int, grades: list[int]):
+    current_app.extensions['leaderboard'].add_grades(company_id, grades)
+
+
+def init_app(app: Flask):
+    app.extensions['leaderboard'] = Leaderboard(app.config['TOP_CACHE_TTL'], app.config['TOP_PRIOR_WEIGHT'])
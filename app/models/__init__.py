@@ -1,5 +1,7 @@
+from datetime import datetime
 from typing import Literal
 from app import db
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy_serializer import SerializerMixin
 import enum
 
@@ -14,9 +16,12 @@ class UserRole(enum.Enum):
 
 
 class Grade(db.Model, SerializerMixin):
+    # company's grades are read newest first, page by page
+    __table_args__ = (db.Index('ix_grade_company_id_id', 'company_id', 'id'),)
+
     id:int = db.Column(db.Integer, primary_key=True)
     company_id:int = db.Column(db.Integer, db.ForeignKey('company.id'))
-    user_id: int =  db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id: int =  db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     grade: int = db.Column(db.Integer, nullable=False)
 
     def __init__(self, fields: dict) -> None:
@@ -25,10 +30,12 @@ class Grade(db.Model, SerializerMixin):
 
 
 class Comment(db.Model, SerializerMixin):
+    # company's comments are read newest first, page by page
+    __table_args__ = (db.Index('ix_comment_company_id_id', 'company_id', 'id'),)
 
     id:int = db.Column(db.Integer, primary_key=True)
     company_id:int = db.Column(db.Integer, db.ForeignKey('company.id'))
-    user_id: int =  db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id: int =  db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     description: str = db.Column(db.String(200), nullable=False)
 
     def __init__(self, fields: dict) -> None:
@@ -37,16 +44,38 @@ class Comment(db.Model, SerializerMixin):
 
 
 class Company(db.Model, SerializerMixin):
-    serialize_rules = ("-comments.company", "-grades.company")
+    serialize_rules = ("-comments.company", "-grades.company", "-search_vector")
+    __table_args__ = (
+        # companies are listed by approval status, ordered by id
+        db.Index('ix_company_approved_id', 'approved', 'id'),
+        # pending registrations, the admin's queue, stay a small index however many companies are approved
+        db.Index('ix_company_pending_id', 'id', postgresql_where=db.text('approved = false')),
+        db.Index('ix_company_search_vector', 'search_vector', postgresql_using='gin'),
+    )
 
     id:int = db.Column(db.Integer, primary_key=True)
-    user_id:int = db.Column(db.Integer, db.ForeignKey('user.id'))
+    user_id:int = db.Column(db.Integer, db.ForeignKey('user.id'), index=True)
     approved: bool = db.Column(db.Boolean, default=False) # approval for company registration
     name: str = db.Column(db.String(120), nullable=False)
     email: str = db.Column(db.String(120), nullable=False)
     location: str = db.Column(db.String(120), nullable=False)
     website: str = db.Column(db.String(120), nullable=False)
     description: str = db.Column(db.String(120), nullable=False)
+    # bumped by company_service on every write which changes company's representation, used as ETag
+    version: int = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # rating aggregates, maintained by company_service.add_grade
+    grade_count: int = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    grade_sum: int = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    avg_grade: float = db.Column(db.Float, nullable=True)
+    grade_1_count: int = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    grade_2_count: int = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    grade_3_count: int = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    grade_4_count: int = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    grade_5_count: int = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    # full-text search document, computed by the database, see app.search
+    search_vector = db.deferred(db.Column(TSVECTOR, db.Computed(
+        "setweight(to_tsvector('simple', name), 'A') || setweight(to_tsvector('simple', location), 'B') "
+        "|| setweight(to_tsvector('simple', description), 'C')", persisted=True)))
     comments: list[Comment] = db.relationship('Comment', backref='company')
     grades: list[Grade] = db.relationship('Grade', backref='company')
 
@@ -54,6 +83,15 @@ class Company(db.Model, SerializerMixin):
     # merge dictionaries
         self.__dict__ = {**self.__dict__, **fields}
 
+    # columns maintained by the service or the database, never taken from request data
+    rating_fields = ('search_vector', 'version', 'grade_count', 'grade_sum', 'avg_grade', 'grade_1_count',
+                     'grade_2_count', 'grade_3_count', 'grade_4_count', 'grade_5_count')
+
+    @property
+    def grade_histogram(self) -> dict[int, int]:
+        '''Number of grades per grade value.'''
+        return {grade: getattr(self, f'grade_{grade}_count') for grade in range(1, 6)}
+
 
 class User(db.Model, SerializerMixin):
     serialize_rules = ("-company.user",)
@@ -62,6 +100,7 @@ class User(db.Model, SerializerMixin):
     username:str = db.Column(db.String(80), unique=True, nullable=False)
     password: str = db.Column(db.String(200), unique=False, nullable=False)
     role: UserRole = db.Column(db.Enum(UserRole), default=UserRole.user, nullable=True)
+    token_version: int = db.Column(db.Integer, default=0, server_default='0', nullable=False) # bumped when issued tokens become stale
     company: Company = db.relationship('Company', uselist=False, backref='user', lazy=True)
 
     def __init__(self, fields: dict) -> None:
@@ -69,3 +108,16 @@ class User(db.Model, SerializerMixin):
         self.__dict__ = {**self.__dict__, **fields}
 
 
+class OutboxEvent(db.Model):
+    '''Domain event waiting to be published to Kafka, written in the same transaction as the change it describes.'''
+    __tablename__ = 'outbox_event'
+
+    id: int = db.Column(db.BigInteger, primary_key=True)
+    event_type: str = db.Column(db.String(80), nullable=False)
+    key: str = db.Column(db.String(80), nullable=True) # kafka message key, events with the same key keep their order
+    payload: dict = db.Column(db.JSON, nullable=False)
+    created_at: datetime = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+
+    def __init__(self, fields: dict) -> None:
+    # merge dictionaries
+        self.__dict__ = {**self.__dict__, **fields}
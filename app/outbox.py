@@ -0,0 +1,143 @@
+'''
+Transactional outbox. Domain events are added to the outbox_event table in the same transaction as
+the change they describe, so an event is stored if and only if the change is committed. OutboxRelay
+publishes stored events to Kafka in batches afterwards, requests never wait for the broker.
+'''
+import json
+import logging
+from threading import Event
+
+from flask import Flask
+from sqlalchemy import delete, insert, select
+
+from app import database, db
+from app.models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+
+def event(event_type: str, key, payload: dict) -> OutboxEvent:
+    return OutboxEvent({'event_type': event_type, 'key': str(key), 'payload': payload})
+
+
+def record(event_type: str, key, payload: dict) -> OutboxEvent:
+    '''Adds event to current transaction, it is stored when the transaction is committed.'''
+    return database.add(event(event_type, key, payload))
+
+
+def record_many(event_type: str, events: list[tuple]):
+    '''Adds many (key, payload) events of one type to current transaction. psycopg2 executemany
+    is batched by SQLAlchemy into multi-row INSERTs.'''
+    if events:
+        db.session.execute(insert(OutboxEvent), [{'event_type': event_type, 'key': str(key), 'payload': payload}
+                                                 for key, payload in events])
+
+
+def encode(event: OutboxEvent) -> bytes:
+    return json.dumps({'id': event.id, 'type': event.event_type, 'payload': event.payload},
+                      separators=(',', ':'), sort_keys=True).encode()
+
+
+class OutboxRelay:
+    '''
+    Drains outbox to Kafka. Every batch is read with FOR UPDATE SKIP LOCKED, so several relays can run at once,
+    sent and flushed to the broker, and deleted from the outbox only when the broker acknowledged every event.
+    When publishing fails nothing is deleted and the batch is retried, consumers must tolerate duplicates.
+    '''
+
+    def __init__(self, producer, topic: str, batch_size: int, poll_interval: float, send_timeout: float = 30):
+        self.producer = producer
+        self.topic = topic
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.send_timeout = send_timeout
+        self.published = 0
+
+    def drain_once(self) -> int:
+        '''Publishes one batch of events, oldest first. Returns number of published events.'''
+        try:
+            events = db.session.execute(
+                select(OutboxEvent).order_by(OutboxEvent.id).limit(self.batch_size).with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not events:
+                db.session.rollback()
+                return 0
+
+            futures = [self.producer.send(self.topic, value=encode(event),
+                                          key=None if event.key is None else event.key.encode())
+                       for event in events]
+            self.producer.flush(timeout=self.send_timeout)
+            for future in futures:
+                future.get(timeout=self.send_timeout) # raises if broker did not acknowledge the event
+
+            db.session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in events])))
+            database.commit_changes()
+        except Exception:
+            db.session.rollback()
+            raise
+        self.published += len(events)
+        return len(events)
+
+    def run(self, stop: Event = None, retry_after: float = 5):
+        '''Publishes events until `stop` is set. Full batches are followed right away by the next one,
+        otherwise relay sleeps for poll interval. When broker is unavailable, relay retries after `retry_after` seconds.'''
+        stop = stop or Event()
+        while not stop.is_set():
+            try:
+                published = self.drain_once()
+            except Exception:
+                logger.exception('publishing outbox events failed, retrying in %s seconds', retry_after)
+                stop.wait(retry_after)
+                continue
+            if published < self.batch_size:
+                stop.wait(self.poll_interval)
+
+
+def create_producer(app: Flask):
+    '''Kafka producer configured with batching settings of the app.'''
+    from kafka import KafkaProducer
+    return KafkaProducer(
+        bootstrap_servers=app.config['KAFKA_BOOTSTRAP_SERVERS'],
+        linger_ms=app.config['KAFKA_LINGER_MS'],
+        batch_size=app.config['KAFKA_BATCH_SIZE'],
+        acks='all',
+    )
+
+
+def create_relay(app: Flask, producer=None) -> OutboxRelay:
+    return OutboxRelay(producer or create_producer(app), app.config['KAFKA_TOPIC'],
+                       app.config['OUTBOX_BATCH_SIZE'], app.config['OUTBOX_POLL_INTERVAL'])
+
+
+class SentMessage:
+    '''Already acknowledged send result of InMemoryBroker, same interface as kafka FutureRecordMetadata.'''
+
+    def __init__(self, error: Exception = None):
+        self.error = error
+
+    def get(self, timeout: float = None):
+        if self.error is not None:
+            raise self.error
+        return None
+
+
+class InMemoryBroker:
+    '''In-process stand-in for KafkaProducer, for tests and local runs without a broker.
+    While `available` is False every send fails, like an unreachable broker.'''
+
+    def __init__(self):
+        self.messages: list[tuple[str, bytes, bytes]] = []
+        self.available = True
+        self.flushes = 0
+
+    def send(self, topic: str, value: bytes = None, key: bytes = None) -> SentMessage:
+        if not self.available:
+            return SentMessage(ConnectionError('broker is not available.'))
+        self.messages.append((topic, key, value))
+        return SentMessage()
+
+    def flush(self, timeout: float = None):
+        self.flushes += 1
+
+    def events(self) -> list[dict]:
+        return [json.loads(value) for _, _, value in self.messages]
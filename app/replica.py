@@ -0,0 +1,92 @@
+'''
+Read replica routing. With DATABASE_REPLICA_URI set, SELECTs issued inside `reads()` (read-only routes
+and the auth user lookup) go to the replica, everything else goes to the primary.
+
+Reads stick to the primary once the request writes, so a request always sees its own writes,
+and for REPLICA_STICKY_SECONDS after it, so the same user's next requests do not read from a
+replica which has not replayed the write yet. Sticky window is tracked per worker process.
+'''
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import Flask, current_app, g, has_app_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event
+from sqlalchemy.sql import Select
+
+from app.cache import LRUCache
+
+REPLICA = 'replica'
+
+
+class RoutingSession(SignallingSession):
+    '''Session which sends reads to the replica engine when current request allows it.'''
+
+    def get_bind(self, mapper=None, clause=None):
+        if getattr(clause, 'is_dml', False):
+            mark_written() # INSERT, UPDATE and DELETE statements issued outside of flush, e.g. Query.update()
+        elif isinstance(clause, Select) and not self._flushing and use_replica():
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        session_factory = super().create_session(options)
+        session_factory.class_ = RoutingSession
+        return session_factory
+
+
+def use_replica() -> bool:
+    if not has_app_context() or not g.get('db_replica_reads') or g.get('db_written'):
+        return False
+    if REPLICA not in (current_app.config.get('SQLALCHEMY_BINDS') or {}):
+        return False
+    username = sticky_username()
+    return username is None or not current_app.extensions['replica_sticky'].get(username)
+
+
+def sticky_username():
+    auth = g.get('auth')
+    return None if auth is None else auth.claims.get('username')
+
+
+def mark_written():
+    '''Current request and, for a while, requests of the same user read from the primary.'''
+    if not has_app_context():
+        return
+    g.db_written = True
+    username = sticky_username()
+    if username is not None and 'replica_sticky' in current_app.extensions:
+        current_app.extensions['replica_sticky'].set(username, True)
+
+
+@contextmanager
+def reads():
+    '''Allows SELECTs issued in this block to be served by the replica.'''
+    previous = g.get('db_replica_reads', False)
+    g.db_replica_reads = True
+    try:
+        yield
+    finally:
+        g.db_replica_reads = previous
+
+
+def read_only(f):
+    '''Route decorator, reads of the route can be served by the replica.'''
+    @wraps(f)
+    def wrap(*args, **kwargs):
+        with reads():
+            return f(*args, **kwargs)
+    return wrap
+
+
+def init_app(app: Flask, db: SQLAlchemy):
+    app.extensions['replica_sticky'] = LRUCache(app.config['TOKEN_CACHE_SIZE'], app.config['REPLICA_STICKY_SECONDS'])
+    if not event.contains(RoutingSession, 'after_flush', on_flush):
+        event.listen(RoutingSession, 'after_flush', on_flush)
+
+
+def on_flush(session, flush_context):
+    mark_written()
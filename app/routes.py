@@ -1,16 +1,17 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 
-from app import database
+from app import database, db, db_pool, replica, serializers
 from app.models import User, Company
 from app.services import auth_service
 from app.services import company_service
-from app.services.company_service import NotApproved
+from app.services.company_service import NotApproved, RoleNotAllowed
 from app.services.auth_service import AuthException 
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import DataError, IntegrityError
 
 
 api = Blueprint('api', __name__)
-from app.routes_utils import check_token, required_roles, get_logged_in_user
+from app.routes_utils import check_token, required_roles, get_logged_in_user, page_response, \
+    company_etag, page_etag, not_modified
 
 @api.get('/test')
 def test():
@@ -70,6 +71,30 @@ def resolve_company_registration():
     return jsonify(company.to_dict())
 
 
+@api.post('/company/resolve-registrations')
+@check_token
+@required_roles(['admin'])
+def resolve_company_registrations():
+    '''
+    Admin resolves many pending registrations at once, in one transaction.
+    Body: {"registrations": [{"username": "pera", "reject": false}, {"company_id": 5, "reject": true}, ...]}.
+    Returns company id and status or error for every item, in the same order.
+    '''
+    data = request.json
+    if not isinstance(data, dict) or not isinstance(data.get('registrations'), list):
+        return 'did not receive registrations.', 400
+
+    registrations = data['registrations']
+    if len(registrations) > current_app.config['BULK_MAX_ITEMS']:
+        return f"at most {current_app.config['BULK_MAX_ITEMS']} items can be sent at once.", 400
+
+    try:
+        return jsonify(company_service.resolve_company_registrations(registrations))
+    except DataError as e:
+        db.session.rollback()
+        return jsonify(str(e.orig)), 400
+
+
 @api.post('/company')
 @check_token
 def create_company_registration():
@@ -86,24 +111,128 @@ def create_company_registration():
         return jsonify(str(e)), 400
 
 
+@api.get('/company/search')
+@check_token
+@replica.read_only
+def search_companies():
+    '''
+    Full-text search of approved companies by name, location and description, best matches first.
+    Query params: `q` - search text, `offset` - X-Next-Offset header of previous page, `limit` - page size.
+    Companies are returned without embedded comments and grades.
+    '''
+    text = request.args.get('q', '').strip()
+    if not text:
+        return 'did not receive search text.', 400
+
+    try:
+        limit, offset = request.args.get('limit', type=int), request.args.get('offset', 0, type=int)
+        companies = company_service.search_companies(text, offset=offset, limit=limit,
+                                                     options=company_service.serialization_loaders(False))
+    except ValueError as e:
+        return jsonify(str(e)), 400
+
+    response = serializers.jsonify([serializers.to_dict(company, company_service.WITHOUT_COLLECTIONS_RULES)
+                                    for company in companies])
+    if len(companies) == company_service.page_size(limit):
+        response.headers['X-Next-Offset'] = str(offset + len(companies))
+    return response
+
+
+@api.get('/company/top')
+@check_token
+@replica.read_only
+def get_top_companies():
+    '''
+    Returns approved companies with the best Bayesian average grade, best first.
+    Query params: `location` - only companies whose location contains it, `limit` - number of companies.
+    '''
+    try:
+        companies = company_service.top_companies(request.args.get('location'), limit=request.args.get('limit', type=int))
+        return serializers.jsonify(companies)
+    except ValueError as e:
+        return jsonify(str(e)), 400
+
+
 @api.get('/company/<string:type>')
 @check_token
 @required_roles(['admin'])
+@replica.read_only
 def get_companies(type:str):
-    '''Returns all/approved/not-resolved companies. Type param can be: all, appproved or not-resolved.'''
+    '''
+    Returns one page of all/approved/not-resolved companies. Type param can be: all, appproved or not-resolved.
+    Query params: `after` - cursor (X-Next-Cursor header of previous page), `limit` - page size.
+    Response has ETag, when If-None-Match matches it 304 is returned without loading companies.
+    '''
     if not type:
         return 'did not receive data.', 400
 
-    companies = company_service.get_all_companies(type)
-    return jsonify([company.to_dict() for company in companies])
+    try:
+        limit, after = request.args.get('limit', type=int), request.args.get('after', type=int)
+        if request.if_none_match:
+            # client's copy is checked against ids and versions only, the page is loaded when it changed
+            versions = company_service.get_page_versions(type, after=after, limit=limit)
+            response = not_modified(page_etag(versions))
+            if response:
+                if versions and len(versions) == company_service.page_size(limit):
+                    response.headers['X-Next-Cursor'] = str(versions[-1][0])
+                return response
+
+        companies = company_service.get_all_companies(type, after=after, limit=limit,
+                                                      options=company_service.serialization_loaders())
+        response = page_response(companies, limit)
+        response.set_etag(page_etag([(company.id, company.version) for company in companies]))
+        return response
+    except ValueError as e:
+        return jsonify(str(e)), 400
 
 
 @api.get('/company/<int:company_id>')
 @check_token
+@replica.read_only
 def get_company(company_id: int):
-    '''Get one company.'''
-    company = database.find_by_id(Company, company_id)
-    return jsonify(company.to_dict())
+    '''Get one company. With `embed=false` query param comments and grades are not embedded.
+    Response has ETag, when If-None-Match matches it 304 is returned without loading the company.'''
+    collections = request.args.get('embed', 'true').lower() != 'false'
+    if request.if_none_match:
+        response = not_modified(company_etag(company_id, company_service.get_version(company_id), collections))
+        if response:
+            return response
+
+    company = company_service.get_company(company_id, options=company_service.serialization_loaders(collections))
+    rules = () if collections else company_service.WITHOUT_COLLECTIONS_RULES
+    response = serializers.jsonify(serializers.to_dict(company, rules))
+    response.set_etag(company_etag(company.id, company.version, collections))
+    return response
+
+
+@api.get('/company/<int:company_id>/comments')
+@check_token
+def get_company_comments(company_id: int):
+    '''
+    Returns one page of company comments, newest first.
+    Query params: `after` - cursor (X-Next-Cursor header of previous page), `limit` - page size.
+    '''
+    try:
+        limit = request.args.get('limit', type=int)
+        comments = company_service.get_comments(company_id, after=request.args.get('after', type=int), limit=limit)
+        return page_response(comments, limit, rules=('-company',))
+    except ValueError as e:
+        return jsonify(str(e)), 400
+
+
+@api.get('/company/<int:company_id>/grades')
+@check_token
+def get_company_grades(company_id: int):
+    '''
+    Returns one page of company grades, newest first.
+    Query params: `after` - cursor (X-Next-Cursor header of previous page), `limit` - page size.
+    '''
+    try:
+        limit = request.args.get('limit', type=int)
+        grades = company_service.get_grades(company_id, after=request.args.get('after', type=int), limit=limit)
+        return page_response(grades, limit, rules=('-company',))
+    except ValueError as e:
+        return jsonify(str(e)), 400
 
 
 @api.post('/company/<int:company_id>/comment')
@@ -146,3 +275,39 @@ def add_grade(company_id: int):
         return jsonify(grade.to_dict())
     except Exception as e:
         return jsonify(str(e)), 400
+
+
+@api.post('/company/reviews')
+@check_token
+@required_roles(['user'])
+def add_reviews():
+    '''
+    Logged in user (ony as user role) adds many grades and comments at once, for approved companies only.
+    Body: {"grades": [{"company_id": 1, "grade": 5}, ...], "comments": [{"company_id": 1, "description": "..."}, ...]}.
+    Returns id or error for every item, in the same order.
+    '''
+    data = request.json
+    if not isinstance(data, dict) or not isinstance(data.get('grades', []), list) \
+            or not isinstance(data.get('comments', []), list):
+        return 'did not receive grades or comments.', 400
+
+    grades, comments = data.get('grades', []), data.get('comments', [])
+    if len(grades) + len(comments) > current_app.config['BULK_MAX_ITEMS']:
+        return f"at most {current_app.config['BULK_MAX_ITEMS']} items can be sent at once.", 400
+
+    user = get_logged_in_user(request)
+    try:
+        return jsonify(company_service.add_reviews(user, grades, comments))
+    except RoleNotAllowed as e:
+        return jsonify(str(e)), 403
+    except DataError as e:
+        db.session.rollback()
+        return jsonify(str(e.orig)), 400
+
+
+@api.get('/stats')
+@check_token
+@required_roles(['admin'])
+def get_stats():
+    '''Returns runtime metrics of this worker process.'''
+    return jsonify({'hash_pool': auth_service.hash_pool().metrics(), 'db_pool': db_pool.metrics(current_app)})
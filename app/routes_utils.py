@@ -1,22 +1,83 @@
+import hashlib
 from functools import wraps
-from flask import jsonify, request, current_app, Response, Request
-from functools import wraps
+from typing import Optional
+from flask import jsonify, request, current_app, Response, Request, g
 import jwt
-from app import database
+from app import compression, database, instrumentation, metrics, replica, serializers
+from app.services import auth_service, company_service
+from app.hash_pool import PoolSaturated
 from app.models import User
 from .routes import api
 from sqlalchemy.exc import NoResultFound
 
 
-def get_logged_in_user(request: Request):
-    '''Verifies token. If user from provided token exists, returns user.'''
-    
+class AuthContext:
+    '''Identity of the user who sent current request. Token is decoded once and user is loaded
+    from the database at most once per request.'''
+
+    def __init__(self, token: str):
+        self.token = token
+        self.claims: dict = auth_service.decode_token(token)
+        self._user: User | None = None
+
+    @property
+    def role(self) -> str:
+        '''Role name of the user. Answered from token claims when AUTH_ROLES_FROM_TOKEN is enabled.'''
+        if current_app.config['AUTH_ROLES_FROM_TOKEN']:
+            return self.claims['role']
+        return self.user.role.name
+
+    @property
+    def user(self) -> User:
+        if self._user is None:
+            with replica.reads():
+                self._user = database.find_by_username(self.claims['username']) # find user with username
+            if not self._user:
+                raise NoResultFound(f"No user with given username: {self.claims['username']}")
+        return self._user
+
+
+def get_auth_context(request: Request) -> AuthContext:
+    '''Returns authentication context of current request, creating it on first use.'''
     token = request.headers['authorization'].split(' ')[1]
-    user:dict | None | User = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
-    found_user = database.find_by_username(user['username']) # find user with username
-    if not user:
-        raise NoResultFound(f"No user with given username: {user['username']}")
-    return found_user
+    auth: AuthContext | None = g.get('auth')
+    if auth is None or auth.token != token:
+        auth = AuthContext(token)
+        g.auth = auth
+    return auth
+
+
+def get_logged_in_user(request: Request) -> User:
+    '''Verifies token. If user from provided token exists, returns user.'''
+    return get_auth_context(request).user
+
+
+def page_response(items: list, limit: int = None, rules: tuple = ()) -> Response:
+    '''Serializes one page of items. When page is full, id of its last item is returned
+    in X-Next-Cursor header and is used as `after` param for the next page.'''
+    response = serializers.jsonify([serializers.to_dict(item, rules) for item in items])
+    if items and len(items) == company_service.page_size(limit):
+        response.headers['X-Next-Cursor'] = str(items[-1].id)
+    return response
+
+
+def company_etag(company_id: int, version: int, collections: bool = True) -> str:
+    '''Strong ETag of company representation, it changes whenever company's version is bumped.'''
+    return f'company-{company_id}-v{version}' + ('' if collections else '-flat')
+
+
+def page_etag(versions: list[tuple[int, int]]) -> str:
+    '''Strong ETag of a page of companies from (id, version) of every company on it.'''
+    return 'companies-' + hashlib.sha1(','.join(f'{id}:{version}' for id, version in versions).encode()).hexdigest()
+
+
+def not_modified(etag: str) -> Optional[Response]:
+    '''Returns empty 304 response when client already has representation with this ETag.'''
+    if not request.if_none_match.contains_weak(etag):
+        return None
+    response = current_app.response_class(status=304)
+    response.set_etag(etag)
+    return response
 
 
 def check_token(f):
@@ -26,7 +87,9 @@ def check_token(f):
             return jsonify('no token provided'), 403
         try:
             # verify token
-            user = get_logged_in_user(request)
+            get_auth_context(request)
+            if not current_app.config['AUTH_ROLES_FROM_TOKEN']:
+                get_logged_in_user(request) # user from token must exist
 
         except jwt.ExpiredSignatureError:
             return 'Signature expired. Please log in again.', 403
@@ -47,10 +110,10 @@ def required_roles(roles: list[str]):
         def wrap(*args, **kwargs):
             try:
                 # verify token
-                found_user = get_logged_in_user(request)
+                role = get_auth_context(request).role
 
-                if found_user.role.name not in roles: 
-                    return f'provided role: {found_user.role.name}. Accepted roles: {roles}', 403
+                if role not in roles: 
+                    return f'provided role: {role}. Accepted roles: {roles}', 403
                     
             except:
                 return 'Problem with auth.', 403
@@ -60,6 +123,30 @@ def required_roles(roles: list[str]):
     return decorator_required_roles
 
 
+@api.before_request
+def before_request():
+    instrumentation.reset_request_stats()
+    metrics.start_request()
+
+
+@api.after_request
+def after_api_request(response):
+    metrics.record_response(response)
+    instrumentation.check_statement_budget()
+    instrumentation.check_repeated_statements()
+    return response
+
+
+@api.teardown_request
+def teardown_api_request(exception):
+    metrics.end_request(exception)
+
+
+@api.app_errorhandler(PoolSaturated)
+def handle_pool_saturated(e):
+    return jsonify(str(e)), 503, {'Retry-After': str(current_app.config['HASH_POOL_RETRY_AFTER'])}
+
+
 @api.app_errorhandler(KeyError)
 def handle_key_error(e):
     return jsonify("Bad keys. Check json keys."), 400
@@ -77,4 +164,4 @@ def after_request(response):
     header["Access-Control-Allow-Origin"] = "*"
     header["Access-Control-Allow-Headers"] = "*"
     header["Access-Control-Allow-Methods"] = "*"
-    return response
+    return compression.compress_response(request, response)
@@ -0,0 +1,31 @@
+'''
+Database schema is managed by Alembic migrations (migrations/), applied with `flask migrate`
+before the app is started. On boot the app only compares database revision with the newest
+migration; in fast start mode (FAST_START) even that is skipped and the database is not touched.
+'''
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask import Flask
+
+from app import db
+
+
+def head_revisions(app: Flask) -> set[str]:
+    '''Newest revisions of migration history.'''
+    config = app.extensions['migrate'].migrate.get_config()
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+def current_revisions() -> set[str]:
+    '''Revisions the database is migrated to, empty if it was never migrated.'''
+    with db.engine.connect() as connection:
+        return set(MigrationContext.configure(connection).get_current_heads())
+
+
+def check_revision(app: Flask) -> bool:
+    '''Warns when database is not migrated to the newest revision. Returns True if it is.'''
+    current, heads = current_revisions(), head_revisions(app)
+    if current != heads:
+        app.logger.warning(f"database revision {', '.join(sorted(current)) or 'none'} is not the newest "
+                           f"{', '.join(sorted(heads))}, run `flask migrate`.")
+    return current == heads
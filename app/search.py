@@ -0,0 +1,137 @@
+'''
+Full-text search of approved companies by name, location and description.
+
+In Postgres, companies are matched against `Company.search_vector`, a generated tsvector column with
+a GIN index, and ranked with ts_rank_cd. Name weighs more than location, location more than description.
+
+InvertedIndex is an in-memory fallback with the same weights, used with SEARCH_BACKEND=memory
+(tests, development without Postgres). It matches companies containing every search term; websearch
+syntax (quotes, `or`, `-`) is not supported. The index lives in the worker process: it is built from
+approved companies on the first search and updated by company_service when a company is approved.
+'''
+import re
+from threading import Lock
+
+from flask import Flask, current_app
+from sqlalchemy import func
+
+from app.models import Company
+
+BACKENDS = ('postgres', 'memory')
+# text search configuration of search_vector, 'simple' does not stem, names and places are not English words
+TEXT_SEARCH_CONFIG = 'simple'
+# ts_rank's default weights of A, B and C labels given to name, location and description
+WEIGHTS = {'name': 1.0, 'location': 0.4, 'description': 0.2}
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN.findall(text.lower())
+
+
+class InvertedIndex:
+    '''Thread safe map of term -> company id -> weight.'''
+
+    def __init__(self):
+        self.built = False
+        self._postings: dict[str, dict[int, float]] = {}
+        self._terms: dict[int, set[str]] = {}
+        self._lock = Lock()
+
+    def build(self, companies):
+        with self._lock:
+            self._postings.clear()
+            self._terms.clear()
+            for company in companies:
+                self._add(company)
+            self.built = True
+
+    def add(self, company):
+        '''Indexes company, replacing its previous entry.'''
+        with self._lock:
+            self._remove(company.id)
+            self._add(company)
+
+    def remove(self, company_id: int):
+        with self._lock:
+            self._remove(company_id)
+
+    def search(self, text: str, offset: int = 0, limit: int = 50) -> list[int]:
+        '''Returns ids of companies containing every term of `text`, best matches first, ties by id.'''
+        terms = set(tokenize(text))
+        if not terms:
+            return []
+        with self._lock:
+            postings = sorted((self._postings.get(term, {}) for term in terms), key=len)
+            ids = set(postings[0]).intersection(*postings[1:])
+            scores = {id: sum(posting[id] for posting in postings) for id in ids}
+        return sorted(scores, key=lambda id: (-scores[id], id))[offset:offset + limit]
+
+    def _add(self, company):
+        weights: dict[str, float] = {}
+        for field, weight in WEIGHTS.items():
+            for term in tokenize(getattr(company, field)):
+                weights[term] = weights.get(term, 0) + weight
+        for term, weight in weights.items():
+            self._postings.setdefault(term, {})[company.id] = weight
+        self._terms[company.id] = set(weights)
+
+    def _remove(self, company_id: int):
+        for term in self._terms.pop(company_id, ()):
+            posting = self._postings[term]
+            del posting[company_id]
+            if not posting:
+                del self._postings[term]
+
+    def __len__(self):
+        return len(self._terms)
+
+
+class UnknownSearchBackend(Exception):
+    '''When SEARCH_BACKEND is not one of BACKENDS.'''
+    def __init__(self, message):
+        super().__init__(message)
+
+
+def search(text: str, offset: int, limit: int, options: tuple = ()) -> list[Company]:
+    '''Returns one page of approved companies matching `text`, best matches first.'''
+    if current_app.config['SEARCH_BACKEND'] == 'memory':
+        ids = get_index().search(text, offset, limit)
+        companies = {company.id: company for company in Company.query.filter(Company.id.in_(ids)).options(*options)}
+        return [companies[id] for id in ids if id in companies]
+
+    query = func.websearch_to_tsquery(TEXT_SEARCH_CONFIG, text)
+    rank = func.ts_rank_cd(Company.search_vector, query)
+    return (Company.query.options(*options)
+            .filter(Company.approved == True, Company.search_vector.op('@@')(query))
+            .order_by(rank.desc(), Company.id)
+            .offset(offset).limit(limit).all())
+
+
+def get_index() -> InvertedIndex:
+    index: InvertedIndex = current_app.extensions['search_index']
+    if not index.built:
+        index.build(Company.query.filter(Company.approved == True)
+                    .with_entities(Company.id, Company.name, Company.location, Company.description))
+    return index
+
+
+def index_company(company: Company):
+    '''Keeps in-memory index up to date with a company which was just approved.'''
+    index: InvertedIndex = current_app.extensions['search_index']
+    if current_app.config['SEARCH_BACKEND'] == 'memory' and index.built:
+        index.add(company)
+
+
+def index_companies(company_ids: list[int]):
+    '''index_company for many companies which were just approved, loaded only when the in-memory index is used.'''
+    index: InvertedIndex = current_app.extensions['search_index']
+    if company_ids and current_app.config['SEARCH_BACKEND'] == 'memory' and index.built:
+        for company in Company.query.filter(Company.id.in_(company_ids)):
+            index.add(company)
+
+
+def init_app(app: Flask):
+    if app.config['SEARCH_BACKEND'] not in BACKENDS:
+        raise UnknownSearchBackend(f"SEARCH_BACKEND must be one of {', '.join(BACKENDS)}, got: {app.config['SEARCH_BACKEND']}")
+    app.extensions['search_index'] = InvertedIndex()
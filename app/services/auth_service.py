@@ -1,9 +1,13 @@
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import database
+import atexit
+from app import database, db
+from app.cache import LRUCache
+from app.hash_pool import HashPool
 from app.models import User
 import jwt
-from flask import current_app
+from flask import Flask, current_app
 from datetime import datetime, timedelta
+import time
+from sqlalchemy import update
 from sqlalchemy.exc import NoResultFound
 
 
@@ -16,7 +20,7 @@ class AuthException(Exception):
 def signup(username: str, password: str):
     '''creates new user with given username and password. '''
     
-    pass_hash = generate_password_hash(password)
+    pass_hash = hash_pool().generate_password_hash(password)
     user = User({'username': username, 'password': pass_hash})
     return database.add_or_update(user)
 
@@ -29,13 +33,77 @@ def login(username: str, password: str):
         raise NoResultFound(f"No user with given username: {username}")
     
     # check password
-    is_password_correct = check_password_hash(user.password, password)
+    is_password_correct = hash_pool().check_password_hash(user.password, password)
     if not is_password_correct:
         raise AuthException('wrong password provided')
     
-    token = jwt.encode({'username': user.username, 'role': user.role.name, 'exp': datetime.utcnow() + timedelta(minutes=30)},
+    token = jwt.encode({'username': user.username, 'role': user.role.name, 'ver': user.token_version,
+                        'exp': datetime.utcnow() + timedelta(minutes=30)},
                         current_app.config['SECRET_KEY'],
                         algorithm='HS256')
     
     return token
 
+
+def init_app(app: Flask):
+    app.extensions['verified_tokens'] = LRUCache(app.config['TOKEN_CACHE_SIZE'], app.config['TOKEN_CACHE_TTL'])
+    app.extensions['token_versions'] = LRUCache(app.config['TOKEN_CACHE_SIZE'], app.config['TOKEN_VERSION_TTL'])
+    app.extensions['hash_pool'] = HashPool(app.config['HASH_POOL_WORKERS'], app.config['HASH_POOL_QUEUE_SIZE'],
+                                           app.config['HASH_POOL_TIMEOUT'])
+    atexit.register(app.extensions['hash_pool'].shutdown)
+
+
+def hash_pool() -> HashPool:
+    '''Pool of worker processes which hash passwords.'''
+    return current_app.extensions['hash_pool']
+
+
+def decode_token(token: str) -> dict:
+    '''Verifies token and returns its claims. Claims of already verified tokens are cached
+    until token expires, so signature is checked once per token instead of once per request.'''
+    verified_tokens: LRUCache = current_app.extensions['verified_tokens']
+    claims = verified_tokens.get(token)
+    if claims is None:
+        claims = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+        verified_tokens.set(token, claims, ttl=claims['exp'] - time.time() if 'exp' in claims else None)
+
+    if current_app.config['AUTH_ROLES_FROM_TOKEN'] and is_revoked(claims):
+        raise jwt.InvalidTokenError('token was revoked')
+    return claims
+
+
+def token_version(username: str) -> int:
+    '''Returns persisted token version of user. Versions are cached for TOKEN_VERSION_TTL seconds,
+    so a bump made by any worker is seen by every other worker at most that much later.'''
+    token_versions: LRUCache = current_app.extensions['token_versions']
+    version = token_versions.get(username)
+    if version is None:
+        row = User.query.with_entities(User.token_version).filter_by(username=username).first()
+        version = row.token_version if row else 0
+        token_versions.set(username, version)
+    return version
+
+
+def is_revoked(claims: dict) -> bool:
+    '''Token is revoked when it was issued before user's token version was bumped.'''
+    return claims.get('ver', 0) < token_version(claims['username'])
+
+
+def revoke_tokens(user: User):
+    '''Invalidates all tokens issued to user so far, e.g. when user's role changes.
+    Caller is responsible for committing bumped token version.'''
+    user.token_version = (user.token_version or 0) + 1
+    current_app.extensions['token_versions'].set(user.username, user.token_version)
+
+
+def revoke_tokens_of(user_ids: list[int], values: dict = None):
+    '''Set-based revoke_tokens: one UPDATE bumps token versions of many users, and sets `values`
+    (e.g. new role) on the same rows. Caller is responsible for committing.'''
+    if not user_ids:
+        return
+    statement = update(User).where(User.id.in_(user_ids)) \
+        .values({**(values or {}), User.token_version: User.token_version + 1}) \
+        .returning(User.username, User.token_version).execution_options(synchronize_session=False)
+    token_versions = current_app.extensions['token_versions']
+    for username, version in db.session.execute(statement):
+        token_versions.set(username, version)
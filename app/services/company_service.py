@@ -1,16 +1,27 @@
 from dataclasses import field
 from typing import Literal
 from app.models import User, Company, UserRole, Comment, Grade
-from app import database
+from app import database, db, leaderboard, outbox, search
+from app.services import auth_service
+from flask import current_app
+from sqlalchemy import Float, cast, func, or_
 from sqlalchemy.exc import NoResultFound
+from sqlalchemy.orm import joinedload, selectinload
 from psycopg2.errors import NotNullViolation
 
+MAX_ID = 2**31 - 1
+
 def create_company_registration(user: User, data: dict):
-    company = Company(fields=data)
+    company = Company(fields={key: value for key, value in data.items() if key not in Company.rating_fields})
     company.approved = False
     user.company = company
     try: 
-        return database.add_or_update(company)
+        company = database.add(company)
+        database.flush()
+        outbox.record('company_registered', company.id, {'company_id': company.id, 'user_id': user.id,
+                                                         'name': company.name})
+        database.commit_changes()
+        return company
     except NotNullViolation:
         raise NotNullViolation('some fields are missing in request.')
 
@@ -20,32 +31,182 @@ def resolve_company_registration(username: str, reject: bool):
     Returns True if successfully deleted, returns company object otherwise.'''
 
     user = database.find_by_username(username)
-    print(user, user.to_dict())
-
     if not user:
-        raise NoResultFound(f"No user with given username: {user['username']}")
+        raise NoResultFound(f"No user with given username: {username}")
 
+    event = {'company_id': user.company.id, 'user_id': user.id}
     if reject:
+        outbox.record('company_rejected', user.company.id, event)
         database.delete_instance(Company, user.company.id)
         return True
 
     else:
         user.company.approved = True
+        user.company.version = Company.version + 1
         user.role = UserRole.company_owner
+        auth_service.revoke_tokens(user) # role claim in previously issued tokens is stale
+        outbox.record('company_approved', user.company.id, event)
         user = database.add_or_update(user)
+        search.index_company(user.company)
         return user.company
 
 
-def get_all_companies(type: Literal['approved', 'all', 'not-resolved']):
-    companies = database.get_all(Company)
+def resolve_company_registrations(items: list[dict]) -> list[dict]:
+    '''
+    Resolves many pending registrations in one transaction. Every item is {"username": ..., "reject": bool}
+    or {"company_id": ..., "reject": bool}. Approved companies and promotions of their owners to company owners
+    (with revoked tokens) are single UPDATEs, rejected companies are one DELETE, whatever the number of items.
+    Returns {"company_id": ..., "status": "approved" | "rejected"} or {"error": ...} for every item, in order.
+    '''
+    def key(item) -> tuple | None:
+        if not isinstance(item, dict) or not isinstance(item.get('reject'), bool):
+            return None
+        if is_id(item.get('company_id')) and 'username' not in item:
+            return 'company_id', item['company_id']
+        if isinstance(item.get('username'), str) and 'company_id' not in item:
+            return 'username', item['username']
+        return None
+
+    keys = [key(item) for item in items]
+    ids = {value for field, value in filter(None, keys) if field == 'company_id'}
+    usernames = {value for field, value in filter(None, keys) if field == 'username'}
+    # rows are locked in id order, concurrent resolutions of the same companies wait for each other
+    rows = db.session.query(Company.id, Company.approved, Company.user_id, User.username) \
+        .outerjoin(User, Company.user_id == User.id) \
+        .filter(or_(Company.id.in_(ids), User.username.in_(usernames))) \
+        .order_by(Company.id).with_for_update(of=Company).all()
+    by_key = {('company_id', row.id): row for row in rows}
+    by_key.update({('username', row.username): row for row in rows if row.username is not None})
+
+    results, approved, rejected = [], {}, {}
+    for item, item_key in zip(items, keys):
+        row = by_key.get(item_key)
+        if item_key is None:
+            results.append({'error': 'item must contain reject and either company_id or username.'})
+        elif row is None:
+            field, value = item_key
+            results.append({'error': f'no company with id: {value}' if field == 'company_id'
+                            else f'no company registration of user: {value}'})
+        elif row.approved:
+            results.append({'error': f'registration of company {row.id} is already resolved.'})
+        elif row.id in approved or row.id in rejected:
+            results.append({'error': f'company {row.id} appears in more than one item.'})
+        else:
+            (rejected if item['reject'] else approved)[row.id] = row
+            results.append({'company_id': row.id, 'status': 'rejected' if item['reject'] else 'approved'})
+
+    if approved:
+        Company.query.filter(Company.id.in_(approved)) \
+            .update({Company.approved: True, **version_increment()}, synchronize_session=False)
+        # role claim in previously issued tokens of new owners is stale
+        auth_service.revoke_tokens_of([row.user_id for row in approved.values() if row.user_id is not None],
+                                      {User.role: UserRole.company_owner})
+        outbox.record_many('company_approved', [(id, {'company_id': id, 'user_id': row.user_id})
+                                                for id, row in approved.items()])
+    if rejected:
+        outbox.record_many('company_rejected', [(id, {'company_id': id, 'user_id': row.user_id})
+                                                for id, row in rejected.items()])
+        Company.query.filter(Company.id.in_(rejected)).delete(synchronize_session=False)
+    database.commit_changes()
+    search.index_companies(list(approved))
+    return results
+
+
+# serialization rules for company without embedded comments and grades
+WITHOUT_COLLECTIONS_RULES = ('-comments', '-grades', '-user.company.comments', '-user.company.grades')
+
+
+def serialization_loaders(collections: bool = True) -> tuple:
+    '''Loader options for companies which are serialized with Company.to_dict(). Every relationship
+    walked by the serializer is loaded upfront, so a page of companies costs 3 statements instead of 1+4N.
+    Without collections, company is serialized with WITHOUT_COLLECTIONS_RULES in a single statement.'''
+    user_loader = joinedload(Company.user).joinedload(User.company)
+    if not collections:
+        return (user_loader,)
+    return (
+        selectinload(Company.comments),
+        selectinload(Company.grades),
+        user_loader,
+    )
+
+
+def get_company(company_id: int, options: tuple = ()) -> Company:
+    company = database.find_by_id(Company, company_id, options=options)
+    if not company:
+        raise NoResultFound(f'no company with id: {company_id}')
+    return company
+
+
+def get_comments(company_id: int, after: int = None, limit: int = None) -> list[Comment]:
+    '''Returns one page of company's comments, newest first. `after` is the id of the last comment from the previous page.'''
+    get_company(company_id)
+    query = Comment.query.filter(Comment.company_id == company_id)
+    return database.get_page(query, Comment.id, after=after, limit=page_size(limit), descending=True)
+
+
+def get_grades(company_id: int, after: int = None, limit: int = None) -> list[Grade]:
+    '''Returns one page of company's grades, newest first. `after` is the id of the last grade from the previous page.'''
+    get_company(company_id)
+    query = Grade.query.filter(Grade.company_id == company_id)
+    return database.get_page(query, Grade.id, after=after, limit=page_size(limit), descending=True)
+
+
+def get_all_companies(type: Literal['approved', 'all', 'not-resolved'], after: int = None, limit: int = None,
+                      options: tuple = ()):
+    '''Returns one page of companies ordered by id. Filtering by approval status is done in the database.
+    `after` is the id of the last company from the previous page.'''
+    query = companies_query(type).options(*options)
+    return database.get_page(query, Company.id, after=after, limit=page_size(limit))
+
+
+def get_page_versions(type: Literal['approved', 'all', 'not-resolved'], after: int = None,
+                      limit: int = None) -> list[tuple[int, int]]:
+    '''Returns (id, version) of companies on the same page get_all_companies returns, without loading them.'''
+    query = companies_query(type).with_entities(Company.id, Company.version)
+    return database.get_page(query, Company.id, after=after, limit=page_size(limit))
+
+
+def get_version(company_id: int) -> int:
+    '''Returns company's version without loading the company.'''
+    version = Company.query.with_entities(Company.version).filter(Company.id == company_id).scalar()
+    if version is None:
+        raise NoResultFound(f'no company with id: {company_id}')
+    return version
+
+
+def search_companies(text: str, offset: int = None, limit: int = None, options: tuple = ()) -> list[Company]:
+    '''Returns one page of approved companies matching search text, best matches first.'''
+    if offset is None:
+        offset = 0
+    if offset < 0:
+        raise ValueError('offset must not be negative.')
+    return search.search(text, offset, page_size(limit), options=options)
+
+
+def top_companies(location: str = None, limit: int = None) -> list[dict]:
+    '''Returns approved companies with the best Bayesian average grade, see app.leaderboard.'''
+    return leaderboard.get().top(location, page_size(limit))
+
 
+def companies_query(type: Literal['approved', 'all', 'not-resolved']):
     match type:
         case 'all':
-            return companies
+            return Company.query
         case 'approved':
-            return [co for co in companies if co.approved == True]
+            return Company.query.filter(Company.approved == True)
         case 'not-resolved':
-            return [co for co in companies if co.approved == False]
+            return Company.query.filter(Company.approved == False)
+        case _:
+            raise ValueError(f'unknown company type: {type}. Type can be: all, approved or not-resolved.')
+
+
+def page_size(limit: int = None) -> int:
+    '''Returns requested page size, bounded by configured maximum.'''
+    if limit is None:
+        return current_app.config['DEFAULT_PAGE_SIZE']
+    if limit < 1:
+        raise ValueError('limit must be positive.')
+    return min(limit, current_app.config['MAX_PAGE_SIZE'])
     
 
 def create_comment(user: User, company_id: int, description: str):
@@ -57,8 +218,13 @@ def create_comment(user: User, company_id: int, description: str):
     if user.role != UserRole.user:
         raise Exception('must login as user')
     
-    comment = Comment({'company_id': company_id, 'description': description, 'user_id': user.id})
-    return database.add_or_update(comment)
+    comment = database.add(Comment({'company_id': company_id, 'description': description, 'user_id': user.id}))
+    database.flush()
+    outbox.record('comment_created', company_id, {'id': comment.id, 'company_id': company_id, 'user_id': user.id,
+                                                  'description': description})
+    Company.query.filter_by(id=company_id).update(version_increment(), synchronize_session=False)
+    database.commit_changes()
+    return comment
 
 
 def add_grade(user: User, company_id: int, grade: int):
@@ -70,11 +236,141 @@ def add_grade(user: User, company_id: int, grade: int):
     if user.role != UserRole.user:
         raise Exception('must login as user')
 
-    if grade < 1 or grade > 5:
+    if not is_grade(grade):
         raise Exception('grade must be in range [1,5].')
 
-    grade = Grade({'company_id': company_id, 'grade': grade, 'user_id': user.id})
-    return database.add_or_update(grade)
+    # grade, company aggregates and grade event are written in the same transaction
+    grade = database.add(Grade({'company_id': company_id, 'grade': grade, 'user_id': user.id}))
+    database.flush()
+    outbox.record('grade_created', company_id, {'id': grade.id, 'company_id': company_id, 'user_id': user.id,
+                                                'grade': grade.grade})
+    Company.query.filter_by(id=company_id).update({**grade_aggregates_increment(grade.grade), **version_increment()},
+                                                  synchronize_session=False)
+    database.commit_changes()
+    leaderboard.add_grades(company_id, [grade.grade])
+    return grade
+
+
+def add_reviews(user: User, grades: list[dict], comments: list[dict]) -> dict:
+    '''
+    Adds many grades and comments of logged in user (only as user role) in one transaction.
+    Items are validated together, invalid items are skipped and reported, valid ones are inserted with multi-row INSERTs.
+    Returns {'grades': [...], 'comments': [...]} with {'id': ...} or {'error': ...} for every item, in order.
+    '''
+    if user.role != UserRole.user:
+        raise RoleNotAllowed('must login as user')
+
+    items = grades + comments
+    company_ids = {item['company_id'] for item in items if isinstance(item, dict) and is_id(item.get('company_id'))}
+    approved = dict(Company.query.with_entities(Company.id, Company.approved).filter(Company.id.in_(company_ids)))
+
+    def validate(item, field: str, is_valid) -> str | None:
+        if not isinstance(item, dict) or not is_id(item.get('company_id')) or field not in item:
+            return f'item must contain company_id and {field}.'
+        if item['company_id'] not in approved:
+            return f"no company with id: {item['company_id']}"
+        if not approved[item['company_id']]:
+            return 'company registration not approved by admin'
+        if not is_valid(item[field]):
+            return f'invalid {field}.'
+        return None
+
+    grade_errors = [validate(item, 'grade', is_grade) for item in grades]
+    comment_errors = [validate(item, 'description', lambda text: isinstance(text, str) and 0 < len(text) <= 200)
+                      for item in comments]
+
+    valid_grades = [{'company_id': item['company_id'], 'user_id': user.id, 'grade': item['grade']}
+                    for item, error in zip(grades, grade_errors) if error is None]
+    valid_comments = [{'company_id': item['company_id'], 'user_id': user.id, 'description': item['description']}
+                      for item, error in zip(comments, comment_errors) if error is None]
+
+    grade_ids = database.insert_many(Grade, valid_grades)
+    comment_ids = database.insert_many(Comment, valid_comments)
+    outbox.record_many('grade_created', [(row['company_id'], {'id': id, **row}) for id, row in zip(grade_ids, valid_grades)])
+    outbox.record_many('comment_created', [(row['company_id'], {'id': id, **row})
+                                           for id, row in zip(comment_ids, valid_comments)])
+
+    # one aggregates and version update per reviewed company, in id order so concurrent bulk requests
+    # lock rows in the same order
+    grades_by_company: dict[int, list[int]] = {row['company_id']: [] for row in valid_comments}
+    for row in valid_grades:
+        grades_by_company.setdefault(row['company_id'], []).append(row['grade'])
+    for company_id in sorted(grades_by_company):
+        company_grades = grades_by_company[company_id]
+        values = grade_aggregates_increment(*company_grades) if company_grades else {}
+        Company.query.filter_by(id=company_id).update({**values, **version_increment()}, synchronize_session=False)
+    database.commit_changes()
+    for company_id, company_grades in grades_by_company.items():
+        if company_grades:
+            leaderboard.add_grades(company_id, company_grades)
+
+    grade_ids, comment_ids = iter(grade_ids), iter(comment_ids)
+    return {
+        'grades': [{'error': error} if error else {'id': next(grade_ids)} for error in grade_errors],
+        'comments': [{'error': error} if error else {'id': next(comment_ids)} for error in comment_errors],
+    }
+
+
+def is_id(value) -> bool:
+    '''bool is a subclass of int, but true is not a valid id. Ids are bounded by postgres integer.'''
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_ID
+
+
+def is_grade(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and 1 <= value <= 5
+
+
+def version_increment() -> dict:
+    '''SET clause which bumps company's version, evaluated by the database.'''
+    return {Company.version: Company.version + 1}
+
+
+def grade_aggregates_increment(*grades: int) -> dict:
+    '''SET clause which adds grades to company rating aggregates. Expressions are evaluated
+    by the database, so concurrent grades for the same company are not lost.'''
+    count, total = len(grades), sum(grades)
+    values = {
+        Company.grade_count: Company.grade_count + count,
+        Company.grade_sum: Company.grade_sum + total,
+        Company.avg_grade: cast(Company.grade_sum + total, Float) / (Company.grade_count + count),
+    }
+    for grade in set(grades):
+        histogram_column = getattr(Company, f'grade_{grade}_count')
+        values[histogram_column] = histogram_column + grades.count(grade)
+    return values
+
+
+def rebuild_grade_aggregates() -> int:
+    '''Recomputes rating aggregates of all companies from Grade table. Returns number of graded companies.'''
+    stats = Grade.query.with_entities(
+        Grade.company_id.label('company_id'),
+        func.count(Grade.id).label('grade_count'),
+        func.sum(Grade.grade).label('grade_sum'),
+        *[func.count(Grade.id).filter(Grade.grade == grade).label(f'grade_{grade}_count') for grade in range(1, 6)],
+    ).group_by(Grade.company_id).subquery()
+
+    Company.query.update({
+        Company.grade_count: 0,
+        Company.grade_sum: 0,
+        Company.avg_grade: None,
+        **{getattr(Company, f'grade_{grade}_count'): 0 for grade in range(1, 6)},
+    }, synchronize_session=False)
+
+    graded = Company.query.filter(Company.id == stats.c.company_id).update({
+        Company.grade_count: stats.c.grade_count,
+        Company.grade_sum: stats.c.grade_sum,
+        Company.avg_grade: cast(stats.c.grade_sum, Float) / stats.c.grade_count,
+        **{getattr(Company, f'grade_{grade}_count'): stats.c[f'grade_{grade}_count'] for grade in range(1, 6)},
+    }, synchronize_session=False)
+
+    database.commit_changes()
+    return graded
+
+
+class RoleNotAllowed(Exception):
+    '''When logged in user's role is not allowed to do the action.'''
+    def __init__(self, message):
+        super().__init__(message)
 
 
 class NotApproved(Exception):
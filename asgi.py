@@ -0,0 +1,7 @@
+'''
+ASGI entry point, see app.aio:
+    uvicorn asgi:app --host 0.0.0.0 --port 8060 --workers 4
+'''
+from app.aio import create_app
+
+app = create_app()
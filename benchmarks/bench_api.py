@@ -0,0 +1,276 @@
+'''
+API benchmark suite. For every data volume, seeds users, companies, comments and grades, then drives
+signup, login, get_companies, get_company, create_comment and add_grade
+  - through the Flask test client, in process: latency and SQL statements per request,
+  - through gunicorn (gunicorn.conf.py) over keep-alive connections: latency and requests per second.
+Reports p50/p95/p99 latency, requests per second and statements per request, and saves them as JSON,
+so runs on two commits can be compared:
+
+Run from repository root against a throwaway database, tables are dropped:
+    DATABASE_SCHEMA=bench python -m benchmarks.bench_api --volumes small,medium --output before.json
+    DATABASE_SCHEMA=bench python -m benchmarks.bench_api --volumes small,medium --output after.json --compare before.json
+'''
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.services import auth_service, company_service
+from benchmarks.bench_server import free_port, wait_until_listening
+
+VOLUMES = {
+    'small': {'users': 100, 'companies': 50, 'reviews': 10},
+    'medium': {'users': 2000, 'companies': 1000, 'reviews': 20},
+    'large': {'users': 20000, 'companies': 10000, 'reviews': 50},
+}
+SCENARIOS = ('signup', 'login', 'get_companies', 'get_company', 'create_comment', 'add_grade')
+PASSWORD = 'benchbench'
+
+
+def seed(connection, users: int, companies: int, reviews: int):
+    '''Users user1..N share one password hash, company i is owned by its own company_owner, every 10th
+    registration is pending. Every company gets `reviews` comments and grades from users.'''
+    params = {'users': users, 'companies': companies, 'reviews': reviews, 'password': generate_password_hash(PASSWORD)}
+    connection.execute(text(
+        "INSERT INTO \"user\" (username, password, role, token_version) "
+        "SELECT 'user' || i, :password, 'user'::userrole, 0 FROM generate_series(1, :users) AS i "
+        "UNION ALL SELECT 'owner' || i, :password, 'company_owner'::userrole, 0 FROM generate_series(1, :companies) AS i "
+        "UNION ALL SELECT 'admin', :password, 'admin'::userrole, 0"
+    ), params)
+    connection.execute(text(
+        "INSERT INTO company (user_id, approved, name, email, location, website, description, version, grade_count, "
+        "grade_sum, grade_1_count, grade_2_count, grade_3_count, grade_4_count, grade_5_count) "
+        "SELECT :users + i, i % 10 <> 0, 'co' || i, 'contact@co.com', 'Novi Sad', 'co.com', 'company', 0, 0, 0, 0, 0, 0, 0, 0 "
+        "FROM generate_series(1, :companies) AS i"
+    ), params)
+    for table, value in (('comment', "description) SELECT c, 1 + (c * :reviews + r) % :users, 'comment ' || r"),
+                         ('grade', "grade) SELECT c, 1 + (c * :reviews + r) % :users, r % 5 + 1")):
+        connection.execute(text(
+            f"INSERT INTO {table} (company_id, user_id, {value} "
+            "FROM generate_series(1, :companies) AS c, generate_series(1, :reviews) AS r"
+        ), params)
+
+
+def build_requests(scenario: str, count: int, volume: dict, tokens: dict, run_id: str) -> list[tuple]:
+    '''(method, path, json body, headers) of `count` requests of a scenario. Reads and reviews target
+    random approved companies, with a fixed seed so every run sends the same requests.'''
+    rng = random.Random(scenario)
+    approved = [id for id in range(1, volume['companies'] + 1) if id % 10]
+    user = {'Authorization': f"Bearer {tokens['user']}"}
+    match scenario:
+        case 'signup':
+            return [('POST', '/api/signup', {'username': f'new-{run_id}-{i}', 'password': PASSWORD}, {})
+                    for i in range(count)]
+        case 'login':
+            return [('POST', '/api/login', {'username': f"user{rng.randint(1, volume['users'])}", 'password': PASSWORD}, {})
+                    for _ in range(count)]
+        case 'get_companies':
+            admin = {'Authorization': f"Bearer {tokens['admin']}"}
+            return [('GET', f"/api/company/approved?after={rng.choice(approved) - 1}&limit=20", None, admin)
+                    for _ in range(count)]
+        case 'get_company':
+            return [('GET', f'/api/company/{rng.choice(approved)}', None, user) for _ in range(count)]
+        case 'create_comment':
+            return [('POST', f'/api/company/{rng.choice(approved)}/comment', {'description': 'benchmark'}, user)
+                    for _ in range(count)]
+        case 'add_grade':
+            return [('POST', f'/api/company/{rng.choice(approved)}/grade', {'grade': rng.randint(1, 5)}, user)
+                    for _ in range(count)]
+
+
+def summarize(latencies: list[float], seconds: float, errors: int, statements: list[int] = None) -> dict:
+    requests = len(latencies)
+    if len(latencies) < 2:
+        latencies = (latencies or [0.0]) * 2
+    percentiles = statistics.quantiles(latencies, n=100)
+    result = {
+        'requests': requests,
+        'errors': errors,
+        'p50_ms': percentiles[49] * 1000,
+        'p95_ms': percentiles[94] * 1000,
+        'p99_ms': percentiles[98] * 1000,
+        'rps': requests / seconds,
+    }
+    if statements is not None:
+        result['statements_per_request'] = statistics.mean(statements)
+    return result
+
+
+class StatementCounter:
+    '''Counts statements of every engine, the test client runs requests one at a time in this thread.'''
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def run_test_client(app, scenario_requests: list[tuple]) -> dict:
+    counter = StatementCounter()
+    event.listen(Engine, 'before_cursor_execute', counter)
+    latencies, statements, errors = [], [], 0
+    try:
+        with app.test_client() as client:
+            started = time.perf_counter()
+            for method, path, body, headers in scenario_requests:
+                before, start = counter.count, time.perf_counter()
+                response = client.open(path, method=method, json=body, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                statements.append(counter.count - before)
+                errors += response.status_code >= 400
+            seconds = time.perf_counter() - started
+    finally:
+        event.remove(Engine, 'before_cursor_execute', counter)
+    return summarize(latencies, seconds, errors, statements)
+
+
+def send_all(port: int, scenario_requests: list[tuple]) -> tuple[list[float], int]:
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    latencies, errors = [], 0
+    for method, path, body, headers in scenario_requests:
+        start = time.perf_counter()
+        try:
+            connection.request(method, path, body=None if body is None else json.dumps(body),
+                               headers={**headers, 'Content-Type': 'application/json'})
+            response = connection.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            errors += response.status >= 400
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+    connection.close()
+    return latencies, errors
+
+
+def run_server(port: int, scenario_requests: list[tuple], connections: int) -> dict:
+    '''Splits requests over `connections` concurrent keep-alive connections.'''
+    chunks = [scenario_requests[i::connections] for i in range(connections)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(connections) as executor:
+        results = list(executor.map(lambda chunk: send_all(port, chunk), chunks))
+    seconds = time.perf_counter() - started
+    return summarize([latency for latencies, _ in results for latency in latencies], seconds,
+                     sum(errors for _, errors in results))
+
+
+def start_server(args) -> tuple[subprocess.Popen, int]:
+    port = free_port()
+    env = {**os.environ, 'PORT': str(port), 'GUNICORN_WORKERS': str(args.workers),
+           'GUNICORN_THREADS': str(args.threads), 'GUNICORN_ACCESS_LOG': '', 'FAST_START': 'true'}
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_until_listening(port)
+    return server, port
+
+
+def run_volume(app, name: str, volume: dict, args) -> dict:
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        with db.engine.begin() as connection:
+            seed(connection, **volume)
+        company_service.rebuild_grade_aggregates()
+        tokens = {'user': auth_service.login('user1', PASSWORD), 'admin': auth_service.login('admin', PASSWORD)}
+        db.session.remove()
+    print(f"{name}: {volume['users']} users, {volume['companies']} companies, {volume['reviews']} comments "
+          f"and grades per company")
+
+    results = {}
+    for mode in args.modes.split(','):
+        server = None
+        if mode == 'server':
+            server, port = start_server(args)
+        try:
+            for scenario in SCENARIOS:
+                count = args.requests // 10 if scenario == 'signup' else args.requests # hashing is slow by design
+                scenario_requests = build_requests(scenario, count, volume, tokens, f'{mode}-{time.time_ns()}')
+                if mode == 'server':
+                    result = run_server(port, scenario_requests, args.connections)
+                else:
+                    result = run_test_client(app, scenario_requests)
+                results.setdefault(mode, {})[scenario] = result
+                print(f"  {mode:<11} {scenario:<15} p50 {result['p50_ms']:8.2f} ms  p95 {result['p95_ms']:8.2f} ms  "
+                      f"p99 {result['p99_ms']:8.2f} ms  {result['rps']:8.1f} req/s"
+                      + (f"  {result['statements_per_request']:5.1f} stmt/req" if 'statements_per_request' in result else '')
+                      + (f"  errors: {result['errors']}" if result['errors'] else ''))
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait(timeout=60)
+    return results
+
+
+def compare(results: dict, baseline: dict):
+    '''Prints change of p95 latency, throughput and statements against a previous run.'''
+    print(f"compared with {baseline['meta'].get('commit')}:")
+    for volume, modes in results.items():
+        for mode, scenarios in modes.items():
+            for scenario, result in scenarios.items():
+                before = baseline['results'].get(volume, {}).get(mode, {}).get(scenario)
+                if not before:
+                    continue
+                changes = [f"p95 {(result['p95_ms'] / before['p95_ms'] - 1) * 100:+6.1f}%",
+                           f"rps {(result['rps'] / before['rps'] - 1) * 100:+6.1f}%"]
+                if 'statements_per_request' in result and 'statements_per_request' in before:
+                    changes.append(f"stmt/req {before['statements_per_request']:.1f} -> {result['statements_per_request']:.1f}")
+                print(f"  {volume:<7} {mode:<11} {scenario:<15} " + '  '.join(changes))
+
+
+def commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--volumes', default='small', help=f"comma separated, of: {', '.join(VOLUMES)}")
+    parser.add_argument('--modes', default='test_client,server', help='comma separated, of: test_client, server')
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario, signup sends a tenth')
+    parser.add_argument('--connections', type=int, default=8, help='concurrent connections to the server')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--output', default='benchmark.json', help='JSON file results are saved to')
+    parser.add_argument('--compare', help='JSON file of a previous run')
+    args = parser.parse_args()
+
+    app = create_app()
+    results = {}
+    try:
+        for name in args.volumes.split(','):
+            results[name] = run_volume(app, name, VOLUMES[name], args)
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        app.extensions['hash_pool'].shutdown()
+
+    meta = {'commit': commit(), 'time': datetime.now(timezone.utc).isoformat(), 'python': platform.python_version(),
+            'cpus': os.cpu_count(), 'volumes': {name: VOLUMES[name] for name in results},
+            **{key: value for key, value in vars(args).items() if key not in ('output', 'compare')}}
+    with open(args.output, 'w') as file:
+        json.dump({'meta': meta, 'results': results}, file, indent=2, sort_keys=True)
+    print(f'saved to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+'''
+Sync (gunicorn, gthread workers, wsgi:app) against async (uvicorn, asgi:app) serving at high connection
+counts. Both servers run the same number of worker processes, clients keep every connection busy with
+GET /api/company/<id> for a fixed time. Reports requests per second, latency percentiles and failures.
+The sync server handles at most workers * threads requests at once, the rest wait in its accept queue.
+
+Run from repository root against a throwaway database, tables are dropped:
+    DATABASE_SCHEMA=bench python -m benchmarks.bench_async --workers 2 --connections 16,64,256
+'''
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+from app import create_app, db
+from benchmarks.bench_server import free_port, seed, wait_until_listening
+
+
+def server_command(stack: str, port: int, workers: int, threads: int) -> tuple[list[str], dict]:
+    if stack == 'sync':
+        env = {**os.environ, 'PORT': str(port), 'GUNICORN_WORKERS': str(workers), 'GUNICORN_THREADS': str(threads),
+               'GUNICORN_ACCESS_LOG': ''}
+        return [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], env
+    return [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port), '--workers', str(workers),
+            '--no-access-log', '--log-level', 'warning'], dict(os.environ)
+
+
+async def connection(port: int, request: bytes, deadline: float, latencies: list[float]) -> int:
+    '''Sends requests one after another over a keep-alive connection. Returns number of failed requests.'''
+    failed = 0
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            writer.write(request)
+            status = int((await reader.readline()).split()[1])
+            length = 0
+            while (line := await reader.readline()) != b'\r\n':
+                name, _, value = line.partition(b':')
+                if name.lower() == b'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                failed += 1
+    except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+        failed += 1
+    finally:
+        writer.close()
+    return failed
+
+
+def client(port: int, path: str, token: str, connections: int, duration: float) -> tuple[list[float], int]:
+    '''Runs `connections` concurrent connections in one process. Returns latencies of successful requests and failures.'''
+    request = (f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nAuthorization: Bearer {token}\r\n'
+               'Connection: keep-alive\r\n\r\n').encode()
+    latencies: list[float] = []
+
+    async def main():
+        deadline = time.monotonic() + duration
+        return await asyncio.gather(*(connection(port, request, deadline, latencies) for _ in range(connections)))
+    return latencies, sum(asyncio.run(main()))
+
+
+def measure(stack: str, workers: int, threads: int, connections: int, processes: int, duration: float,
+            path: str, token: str) -> dict:
+    port = free_port()
+    command, env = server_command(stack, port, workers, threads)
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_listening(port)
+        client(port, path, token, workers * 2, 1) # warm up connection pools and serializers
+        per_process = [connections // processes + (i < connections % processes) for i in range(processes)]
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(client, [(port, path, token, count, duration) for count in per_process if count])
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    latencies = sorted(latency for process_latencies, _ in results for latency in process_latencies)
+    if not latencies:
+        return {'rps': 0.0, 'p50': 0.0, 'p99': 0.0, 'failed': sum(failed for _, failed in results)}
+    percentiles = statistics.quantiles(latencies, n=100)
+    return {'rps': len(latencies) / duration, 'p50': percentiles[49] * 1000, 'p99': percentiles[98] * 1000,
+            'failed': sum(failed for _, failed in results)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=2, help='worker processes of both servers')
+    parser.add_argument('--threads', type=int, default=4, help='threads per sync worker')
+    parser.add_argument('--connections', default='16,64,256', help='comma separated concurrent connection counts')
+    parser.add_argument('--client-processes', type=int, default=2)
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--reviews', type=int, default=20, help='comments and grades of the company')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        company_id, token = seed(args.reviews)
+        db.session.remove()
+    app.extensions['hash_pool'].shutdown()
+
+    print(f'cores: {multiprocessing.cpu_count()}, workers: {args.workers}, threads per sync worker: {args.threads}')
+    try:
+        for connections in [int(count) for count in args.connections.split(',')]:
+            for stack in ('sync', 'async'):
+                result = measure(stack, args.workers, args.threads, connections, args.client_processes, args.duration,
+                                 f'/api/company/{company_id}', token)
+                print(f"{stack:>5}  connections: {connections:>4}  {result['rps']:9.1f} req/s  "
+                      f"p50: {result['p50']:8.1f} ms  p99: {result['p99']:8.1f} ms  failed: {result['failed']}")
+    finally:
+        with app.app_context():
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
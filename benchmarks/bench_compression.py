@@ -0,0 +1,58 @@
+'''
+Bytes on the wire and CPU time of response compression for company payloads (as returned by
+GET /api/company/all), for every gzip level and brotli quality worth considering.
+
+Run from repository root against a throwaway database, tables are dropped:
+    DATABASE_SCHEMA=bench python -m benchmarks.bench_compression --companies 50 --reviews 20
+'''
+import argparse
+import gzip
+import timeit
+from app import create_app, db, serializers
+from app.compression import brotli, compress
+from app.services import company_service
+from benchmarks.bench_serializers import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--companies', type=int, default=50, help='companies on the page')
+    parser.add_argument('--reviews', type=int, default=20, help='comments and grades per company')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.companies, args.reviews)
+        companies = company_service.get_all_companies('all', limit=args.companies,
+                                                      options=company_service.serialization_loaders())
+        payload = serializers.dumps([serializers.to_dict(company) for company in companies])
+        serialize = min(timeit.repeat(lambda: serializers.dumps([serializers.to_dict(company) for company in companies]),
+                                      number=1, repeat=args.repeat))
+        print(f'payload: {len(payload)} bytes, serialized in {serialize * 1000:.2f} ms')
+
+        cases = [('gzip', 'COMPRESS_GZIP_LEVEL', level) for level in (1, 6, 9)]
+        if brotli is not None:
+            cases += [('br', 'COMPRESS_BROTLI_QUALITY', quality) for quality in (1, 4, 6, 11)]
+        else:
+            print('brotli is not installed, only gzip is measured')
+
+        with app.test_request_context():
+            for encoding, setting, level in cases:
+                app.config[setting] = level
+                data = compress(payload, encoding)
+                decoded = gzip.decompress(data) if encoding == 'gzip' else brotli.decompress(data)
+                assert decoded == payload
+                seconds = min(timeit.repeat(lambda: compress(payload, encoding), number=1, repeat=args.repeat))
+                print(f'{encoding:>4} {level:>2}: {len(data):9} bytes ({len(data) / len(payload):6.1%}), '
+                      f'{seconds * 1000:7.2f} ms, {len(payload) / seconds / 2**20:7.1f} MiB/s')
+
+        db.session.remove()
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
+
+
+if __name__ == '__main__':
+    main()
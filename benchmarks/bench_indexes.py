@@ -0,0 +1,101 @@
+'''
+Query plans and timings of hot lookups without and with the lookup indexes (migration 0005_lookup_indexes).
+Seeds a large dataset, drops the indexes, runs every query, creates the indexes and runs them again.
+
+Run from repository root against a throwaway database, tables are dropped:
+    DATABASE_SCHEMA=bench python -m benchmarks.bench_indexes --companies 20000 --reviews 20
+'''
+import argparse
+import timeit
+from sqlalchemy import text
+from app import create_app, db
+
+QUERIES = {
+    'comments page': 'SELECT * FROM comment WHERE company_id = :company_id ORDER BY id DESC LIMIT 50',
+    'grades page': 'SELECT * FROM grade WHERE company_id = :company_id ORDER BY id DESC LIMIT 50',
+    'grades of companies (selectinload)': 'SELECT * FROM grade WHERE company_id = ANY(:company_ids)',
+    'company of user (User.company)': 'SELECT * FROM company WHERE user_id = :user_id',
+    'grades of user': 'SELECT * FROM grade WHERE user_id = :reviewer_id',
+    'pending registrations page': 'SELECT * FROM company WHERE approved = false ORDER BY id LIMIT 50',
+    'approved companies page': 'SELECT * FROM company WHERE approved = true AND id > :after ORDER BY id LIMIT 50',
+}
+
+
+def seed(connection, companies: int, reviews: int, reviewers: int):
+    '''Every company has an owner, every 10th registration is pending, reviews are spread over reviewers.'''
+    connection.execute(text(
+        "INSERT INTO \"user\" (username, password, role, token_version) "
+        "SELECT 'user' || i, 'x', 'user', 0 FROM generate_series(1, :users) AS i"
+    ), {'users': companies + reviewers})
+    connection.execute(text(
+        "INSERT INTO company (user_id, approved, name, email, location, website, description, grade_count, grade_sum, "
+        "grade_1_count, grade_2_count, grade_3_count, grade_4_count, grade_5_count) "
+        "SELECT i, i % 10 <> 0, 'co' || i, 'contact@co.com', 'Novi Sad', 'co.com', 'company', 0, 0, 0, 0, 0, 0, 0 "
+        "FROM generate_series(1, :companies) AS i"
+    ), {'companies': companies})
+    for table, value in (('comment', "description) SELECT c, :companies + 1 + (c * :reviews + r) % :reviewers, 'comment'"),
+                         ('grade', "grade) SELECT c, :companies + 1 + (c * :reviews + r) % :reviewers, r % 5 + 1")):
+        connection.execute(text(
+            f"INSERT INTO {table} (company_id, user_id, {value} "
+            "FROM generate_series(1, :companies) AS c, generate_series(1, :reviews) AS r"
+        ), {'companies': companies, 'reviews': reviews, 'reviewers': reviewers})
+
+
+def run(connection, params: dict, repeat: int) -> dict:
+    '''Returns plan nodes, top to first leaf, and best execution time of every query.'''
+    results = {}
+    connection.execute(text('ANALYZE'))
+    for name, query in QUERIES.items():
+        plan = connection.execute(text(f'EXPLAIN (FORMAT JSON) {query}'), params).scalar()[0]['Plan']
+        nodes = []
+        while plan:
+            nodes.append(plan['Node Type'] + (f" ({plan['Index Name']})" if 'Index Name' in plan else ''))
+            plan = plan.get('Plans', [None])[0]
+        node = ' > '.join(nodes)
+        seconds = min(timeit.repeat(lambda: connection.execute(text(query), params).fetchall(), number=1, repeat=repeat))
+        results[name] = (node, seconds)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--companies', type=int, default=20000)
+    parser.add_argument('--reviews', type=int, default=20, help='comments and grades per company')
+    parser.add_argument('--reviewers', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        indexes = [index for table in db.metadata.sorted_tables for index in table.indexes]
+        params = {'company_id': args.companies // 2, 'company_ids': list(range(1, args.companies, args.companies // 50 or 1)),
+                  'user_id': args.companies // 2, 'reviewer_id': args.companies + 1, 'after': args.companies // 2}
+
+        with db.engine.begin() as connection:
+            for index in indexes:
+                index.drop(connection)
+            seed(connection, args.companies, args.reviews, args.reviewers)
+        print(f'{args.companies} companies, {args.companies * args.reviews} comments and grades')
+
+        with db.engine.connect() as connection:
+            before = run(connection, params, args.repeat)
+        with db.engine.begin() as connection:
+            for index in indexes:
+                index.create(connection)
+        with db.engine.connect() as connection:
+            after = run(connection, params, args.repeat)
+
+        for name in QUERIES:
+            (plan_before, before_seconds), (plan_after, after_seconds) = before[name], after[name]
+            print(f'{name}\n    without indexes: {before_seconds * 1000:9.2f} ms  {plan_before}'
+                  f'\n    with indexes:    {after_seconds * 1000:9.2f} ms  {plan_after}')
+
+        db.session.remove()
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+'''
+Overhead of request metrics (app.metrics): time per GET /api/company/<id> through the test client with
+METRICS_ENABLED on and off, runs are interleaved so both see the same database and machine noise.
+Also reports the cost of recording one request and of rendering /metrics.
+
+Run from repository root against a throwaway database, tables are dropped:
+    DATABASE_SCHEMA=bench python -m benchmarks.bench_metrics --requests 2000 --reviews 20
+'''
+import argparse
+import timeit
+from app import config, create_app, db, metrics
+from benchmarks.bench_server import seed
+
+
+def app_with_metrics(enabled: bool):
+    previous = config.METRICS_ENABLED
+    config.METRICS_ENABLED = enabled
+    try:
+        return create_app()
+    finally:
+        config.METRICS_ENABLED = previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per run')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--reviews', type=int, default=20, help='comments and grades of the company')
+    args = parser.parse_args()
+
+    apps = {'off': app_with_metrics(False), 'on': app_with_metrics(True)}
+    with apps['off'].app_context():
+        db.drop_all()
+        db.create_all()
+        company_id, token = seed(args.reviews)
+        db.session.remove()
+
+    path, headers = f'/api/company/{company_id}', {'authorization': f'Bearer {token}'}
+    clients = {name: app.test_client() for name, app in apps.items()}
+    for client in clients.values():
+        assert client.get(path, headers=headers).status_code == 200
+    timings = {name: [] for name in apps}
+    for _ in range(args.repeat):
+        for name, client in clients.items():
+            timings[name].append(timeit.timeit(lambda: client.get(path, headers=headers), number=args.requests))
+    per_request = {name: min(seconds) / args.requests * 1e6 for name, seconds in timings.items()}
+    for name, microseconds in per_request.items():
+        print(f'metrics {name:>3}: {microseconds:8.1f} us/request')
+    overhead = per_request['on'] - per_request['off']
+    print(f'overhead: {overhead:.1f} us/request ({overhead / per_request["off"]:.1%})')
+
+    app = apps['on']
+    family = app.extensions['metrics']
+    with app.test_request_context(path):
+        record = min(timeit.repeat(lambda: (family.latency.observe(('api.get_company', 'GET'), 0.01),
+                                            family.requests.inc(('api.get_company', 'GET', 200)),
+                                            family.statements.observe(('api.get_company',), 2),
+                                            family.sql_time.observe(('api.get_company',), 0.001)),
+                                   number=10000, repeat=args.repeat)) / 10000
+        render = min(timeit.repeat(lambda: metrics.render(app), number=100, repeat=args.repeat)) / 100
+    print(f'recording one request: {record * 1e6:.1f} us, rendering /metrics: {render * 1e3:.2f} ms')
+
+    with apps['off'].app_context():
+        db.session.remove()
+        db.drop_all()
+    for app in apps.values():
+        app.extensions['hash_pool'].shutdown()
+
+
+if __name__ == '__main__':
+    main()
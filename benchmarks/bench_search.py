@@ -0,0 +1,76 @@
+'''
+Company search: ILIKE scan over name, location and description compared with the full-text search
+of company_service.search_companies, with the GIN indexed tsvector column and with the in-memory index.
+
+Run from repository root against a throwaway database, tables are dropped:
+    DATABASE_SCHEMA=bench python -m benchmarks.bench_search --companies 50000
+'''
+import argparse
+import timeit
+from sqlalchemy import text
+from app import create_app, db
+from app.services import company_service
+
+WORDS = ['software', 'outsourcing', 'bakery', 'consulting', 'games', 'fintech', 'design', 'cloud', 'data', 'mobile']
+CITIES = ['Novi Sad', 'Beograd', 'Nis', 'Kragujevac', 'Subotica']
+SEARCHES = ['novi sad', 'cloud data', 'beograd mobile games', 'company 4242']
+
+
+def seed(connection, companies: int):
+    '''Companies get names and descriptions from WORDS and locations from CITIES, every 10th one is pending.'''
+    connection.execute(text(
+        "INSERT INTO company (approved, name, email, location, website, description, version, grade_count, grade_sum, "
+        "grade_1_count, grade_2_count, grade_3_count, grade_4_count, grade_5_count) "
+        "SELECT i % 10 <> 0, 'Company ' || i || ' ' || (:words)[i % 10 + 1], 'contact@co.com', (:cities)[i % 5 + 1], "
+        "'co.com', (:words)[i % 7 + 1] || ' and ' || (:words)[i % 3 + 1], 0, 0, 0, 0, 0, 0, 0, 0 "
+        "FROM generate_series(1, :companies) AS i"
+    ), {'companies': companies, 'words': WORDS, 'cities': CITIES})
+
+
+def ilike(search: str, limit: int):
+    conditions = ' AND '.join(f"(name || ' ' || location || ' ' || description) ILIKE :term{i}"
+                              for i in range(len(search.split())))
+    params = {f'term{i}': f'%{term}%' for i, term in enumerate(search.split())}
+    return db.session.execute(text(f'SELECT id FROM company WHERE approved AND {conditions} ORDER BY id LIMIT {limit}'),
+                              params).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--companies', type=int, default=50000)
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        with db.engine.begin() as connection:
+            seed(connection, args.companies)
+            connection.execute(text('ANALYZE company'))
+        print(f'{args.companies} companies, best of {args.repeat}, page of {args.limit}')
+
+        app.config['SEARCH_BACKEND'] = 'memory'
+        print(f"building in-memory index: {timeit.timeit(lambda: company_service.search_companies('x'), number=1) * 1000:.0f} ms")
+
+        for search in SEARCHES:
+            results = {'ILIKE scan': lambda: ilike(search, args.limit)}
+            for backend in ('postgres', 'memory'):
+                def run(backend=backend):
+                    app.config['SEARCH_BACKEND'] = backend
+                    return company_service.search_companies(search, limit=args.limit)
+                results[backend] = run
+            print(f'{search!r}')
+            for name, fn in results.items():
+                seconds = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+                print(f'    {name:<12} {seconds * 1000:9.2f} ms')
+            db.session.remove()
+
+        db.session.remove()
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+'''
+Compares SerializerMixin.to_dict + flask.jsonify with compiled serializers on company payloads.
+
+Run from repository root against a throwaway database, tables are dropped:
+    DATABASE_SCHEMA=bench python -m benchmarks.bench_serializers --companies 200 --reviews 20
+'''
+import argparse
+import timeit
+from flask import jsonify
+from app import create_app, db, serializers
+from app.models import User, Company, Comment, Grade, UserRole
+from app.services import company_service
+
+
+def seed(companies: int, reviews: int):
+    reviewer = User({'username': 'reviewer', 'password': 'x', 'role': UserRole.user})
+    owners = [User({'username': f'owner{i}', 'password': 'x', 'role': UserRole.company_owner}) for i in range(companies)]
+    db.session.add_all([reviewer, *owners])
+    db.session.commit()
+
+    for owner in owners:
+        company = Company({'name': f'co{owner.id}', 'email': 'contact@co.com', 'location': 'Novi Sad – Čačak',
+                           'website': 'co.com', 'description': 'company', 'approved': True, 'user_id': owner.id})
+        db.session.add(company)
+        db.session.flush()
+        for i in range(reviews):
+            db.session.add(Comment({'company_id': company.id, 'user_id': reviewer.id, 'description': f'komentar {i}, Čačak'}))
+            db.session.add(Grade({'company_id': company.id, 'user_id': reviewer.id, 'grade': i % 5 + 1}))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--companies', type=int, default=200)
+    parser.add_argument('--reviews', type=int, default=20, help='comments and grades per company')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.companies, args.reviews)
+        companies = company_service.get_all_companies('all', limit=args.companies,
+                                                      options=company_service.serialization_loaders())
+
+        with app.test_request_context():
+            mixin = jsonify([company.to_dict() for company in companies]).get_data()
+            compiled = serializers.dumps([serializers.to_dict(company) for company in companies])
+            print(f'payload: {len(mixin)} bytes, byte-for-byte equal: {mixin == compiled}')
+
+            cases = {
+                'to_dict': lambda: [company.to_dict() for company in companies],
+                'compiled': lambda: [serializers.to_dict(company) for company in companies],
+                'to_dict + jsonify': lambda: jsonify([company.to_dict() for company in companies]).get_data(),
+                'compiled + dumps': lambda: serializers.dumps([serializers.to_dict(company) for company in companies]),
+            }
+            for name, case in cases.items():
+                best = min(timeit.repeat(case, number=1, repeat=args.repeat))
+                print(f'{name:>20}: {best * 1000:9.2f} ms')
+
+        db.session.remove()
+        db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+'''
+Throughput of the production server (gunicorn, gunicorn.conf.py) for growing number of workers.
+Every run starts gunicorn, drives GET /api/company/<id> from client processes over keep-alive
+connections for a fixed time and reports requests per second. Throughput should grow with workers
+up to the number of cores.
+
+Run from repository root against a throwaway database, tables are dropped:
+    DATABASE_SCHEMA=bench python -m benchmarks.bench_server --workers 1,2,4 --threads 4 --clients 16
+'''
+import argparse
+import http.client
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+from werkzeug.security import generate_password_hash
+from app import create_app, db
+from app.models import User, Company, Comment, Grade, UserRole
+from app.services import auth_service
+
+
+def seed(reviews: int) -> tuple[int, str]:
+    '''Creates an approved company with reviews. Returns its id and token of a user who can read it.'''
+    owner = User({'username': 'owner', 'password': 'x', 'role': UserRole.company_owner})
+    reader = User({'username': 'reader', 'password': generate_password_hash('readerreader'), 'role': UserRole.user})
+    db.session.add_all([owner, reader])
+    db.session.commit()
+
+    company = Company({'name': 'co', 'email': 'contact@co.com', 'location': 'Novi Sad', 'website': 'co.com',
+                       'description': 'company', 'approved': True, 'user_id': owner.id})
+    db.session.add(company)
+    db.session.flush()
+    for i in range(reviews):
+        db.session.add(Comment({'company_id': company.id, 'user_id': reader.id, 'description': f'comment {i}'}))
+        db.session.add(Grade({'company_id': company.id, 'user_id': reader.id, 'grade': i % 5 + 1}))
+    db.session.commit()
+    return company.id, auth_service.login('reader', 'readerreader')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_listening(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f'server did not start listening on port {port}')
+
+
+def client(port: int, path: str, token: str, duration: float) -> tuple[int, int]:
+    '''Sends requests one after another over a keep-alive connection. Returns (completed, failed).'''
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    headers = {'Authorization': f'Bearer {token}'}
+    completed = failed = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status == 200:
+                completed += 1
+            else:
+                failed += 1
+        except (OSError, http.client.HTTPException):
+            failed += 1
+            connection.close()
+    connection.close()
+    return completed, failed
+
+
+def measure(workers: int, threads: int, clients: int, duration: float, path: str, token: str) -> tuple[float, int]:
+    port = free_port()
+    env = {**os.environ, 'PORT': str(port), 'GUNICORN_WORKERS': str(workers), 'GUNICORN_THREADS': str(threads),
+           'GUNICORN_ACCESS_LOG': ''}
+    server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app'], env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_listening(port)
+        client(port, path, token, 0.5) # warm up every worker's connection pool and serializers
+        with multiprocessing.Pool(clients) as pool:
+            results = pool.starmap(client, [(port, path, token, duration)] * clients)
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    completed = sum(done for done, _ in results)
+    failed = sum(errors for _, errors in results)
+    return completed / duration, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default='1,2,4', help='comma separated worker counts')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--clients', type=int, default=16, help='concurrent client processes')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per run')
+    parser.add_argument('--reviews', type=int, default=20, help='comments and grades of the company')
+    args = parser.parse_args()
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        company_id, token = seed(args.reviews)
+        db.session.remove()
+    app.extensions['hash_pool'].shutdown()
+
+    print(f'cores: {multiprocessing.cpu_count()}, threads per worker: {args.threads}, clients: {args.clients}')
+    baseline = None
+    try:
+        for workers in [int(count) for count in args.workers.split(',')]:
+            rps, failed = measure(workers, args.threads, args.clients, args.duration, f'/api/company/{company_id}', token)
+            baseline = baseline or rps
+            print(f'workers: {workers:>3}  {rps:9.1f} req/s  x{rps / baseline:4.2f}  failed: {failed}')
+    finally:
+        with app.app_context():
+            db.drop_all()
+
+
+if __name__ == '__main__':
+    main()
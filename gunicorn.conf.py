@@ -0,0 +1,32 @@
+'''
+Gunicorn settings, every one can be overridden with an environment variable.
+
+Workers are forked from the master after the app is loaded (GUNICORN_PRELOAD), so code and
+schema checks run once and workers start fast. Graceful reload:
+    kill -HUP <master pid>    restarts workers, new ones finish requests of old ones first
+                              (with preloading, workers are forked from already loaded code)
+    kill -USR2 <master pid>   starts a new master with new code, then stop the old one with -TERM
+'''
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8060')}"
+
+# requests are mostly I/O bound (database), so every worker serves several requests with threads
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true')
+
+# seconds idle keep-alive connections are kept open, should be longer than load balancer's idle timeout
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 75))
+# worker silent for longer is killed and replaced
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+# time given to workers to finish in-flight requests on reload or shutdown
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# workers are recycled after this many requests, jitter keeps them from restarting at once. 0 disables it.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 0))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None # empty disables access log
+errorlog = '-'
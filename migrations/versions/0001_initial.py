@@ -0,0 +1,68 @@
+"""initial schema, as created by db.create_all() before migrations were introduced
+
+Databases created by db.create_all() already have this schema, mark them with
+`flask db stamp 0001_initial` before running `flask db upgrade`.
+
+Revision ID: 0001_initial
+Revises: 
+Create Date: 2022-06-20 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(length=80), nullable=False),
+        sa.Column('password', sa.String(length=200), nullable=False),
+        sa.Column('role', sa.Enum('admin', 'user', 'company_owner', name='userrole'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('username')
+    )
+    op.create_table('company',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('approved', sa.Boolean(), nullable=True),
+        sa.Column('name', sa.String(length=120), nullable=False),
+        sa.Column('email', sa.String(length=120), nullable=False),
+        sa.Column('location', sa.String(length=120), nullable=False),
+        sa.Column('website', sa.String(length=120), nullable=False),
+        sa.Column('description', sa.String(length=120), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('comment',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('description', sa.String(length=200), nullable=False),
+        sa.ForeignKeyConstraint(['company_id'], ['company.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('grade',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('company_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('grade', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['company_id'], ['company.id'], ),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('grade')
+    op.drop_table('comment')
+    op.drop_table('company')
+    op.drop_table('user')
+    sa.Enum(name='userrole').drop(op.get_bind(), checkfirst=True)
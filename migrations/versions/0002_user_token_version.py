@@ -0,0 +1,25 @@
+"""user token version, bumped when issued tokens become stale
+
+Revision ID: 0002_user_token_version
+Revises: 0001_initial
+Create Date: 2022-06-27 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_user_token_version'
+down_revision = '0001_initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # server default fills existing rows, so NOT NULL holds right away
+    op.add_column('user', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('user', 'token_version')
@@ -0,0 +1,56 @@
+"""company rating aggregates, maintained by company_service.add_grade
+
+Existing grades are backfilled here, same as `flask rebuild-grade-aggregates` does.
+
+Revision ID: 0003_company_rating_aggregates
+Revises: 0002_user_token_version
+Create Date: 2022-06-28 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_company_rating_aggregates'
+down_revision = '0002_user_token_version'
+branch_labels = None
+depends_on = None
+
+COUNTERS = ['grade_count', 'grade_sum', 'grade_1_count', 'grade_2_count', 'grade_3_count', 'grade_4_count', 'grade_5_count']
+
+
+def upgrade():
+    for name in COUNTERS:
+        op.add_column('company', sa.Column(name, sa.Integer(), server_default='0', nullable=False))
+    op.add_column('company', sa.Column('avg_grade', sa.Float(), nullable=True))
+
+    op.execute('''
+        UPDATE company SET
+            grade_count = stats.grade_count,
+            grade_sum = stats.grade_sum,
+            avg_grade = CAST(stats.grade_sum AS FLOAT) / stats.grade_count,
+            grade_1_count = stats.grade_1_count,
+            grade_2_count = stats.grade_2_count,
+            grade_3_count = stats.grade_3_count,
+            grade_4_count = stats.grade_4_count,
+            grade_5_count = stats.grade_5_count
+        FROM (
+            SELECT company_id,
+                count(id) AS grade_count,
+                sum(grade) AS grade_sum,
+                count(id) FILTER (WHERE grade = 1) AS grade_1_count,
+                count(id) FILTER (WHERE grade = 2) AS grade_2_count,
+                count(id) FILTER (WHERE grade = 3) AS grade_3_count,
+                count(id) FILTER (WHERE grade = 4) AS grade_4_count,
+                count(id) FILTER (WHERE grade = 5) AS grade_5_count
+            FROM grade GROUP BY company_id
+        ) AS stats
+        WHERE company.id = stats.company_id
+    ''')
+
+
+def downgrade():
+    op.drop_column('company', 'avg_grade')
+    for name in reversed(COUNTERS):
+        op.drop_column('company', name)
@@ -0,0 +1,31 @@
+"""outbox of domain events, published to Kafka by the outbox relay
+
+Revision ID: 0004_outbox_event
+Revises: 0003_company_rating_aggregates
+Create Date: 2022-06-29 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_outbox_event'
+down_revision = '0003_company_rating_aggregates'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('outbox_event',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('event_type', sa.String(length=80), nullable=False),
+        sa.Column('key', sa.String(length=80), nullable=True),
+        sa.Column('payload', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('outbox_event')
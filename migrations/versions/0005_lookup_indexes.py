@@ -0,0 +1,41 @@
+"""indexes for relationship loads, review pages and company listing by approval status
+
+Indexes are built CONCURRENTLY, so writes are not blocked while they are built on large tables.
+
+Revision ID: 0005_lookup_indexes
+Revises: 0004_outbox_event
+Create Date: 2022-06-30 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_lookup_indexes'
+down_revision = '0004_outbox_event'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_grade_company_id_id', 'grade', ['company_id', 'id'], {}),
+    ('ix_grade_user_id', 'grade', ['user_id'], {}),
+    ('ix_comment_company_id_id', 'comment', ['company_id', 'id'], {}),
+    ('ix_comment_user_id', 'comment', ['user_id'], {}),
+    ('ix_company_user_id', 'company', ['user_id'], {}),
+    ('ix_company_approved_id', 'company', ['approved', 'id'], {}),
+    ('ix_company_pending_id', 'company', ['id'], {'postgresql_where': sa.text('approved = false')}),
+]
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns, options in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, **options)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
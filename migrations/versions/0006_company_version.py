@@ -0,0 +1,24 @@
+"""company version, bumped on every write which changes company's representation
+
+Revision ID: 0006_company_version
+Revises: 0005_lookup_indexes
+Create Date: 2022-07-01 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_company_version'
+down_revision = '0005_lookup_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('company', sa.Column('version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('company', 'version')
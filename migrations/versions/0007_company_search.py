@@ -0,0 +1,36 @@
+"""company full-text search: generated tsvector column with GIN index
+
+Adding a stored generated column rewrites the company table under an exclusive lock, the index
+is then built CONCURRENTLY.
+
+Revision ID: 0007_company_search
+Revises: 0006_company_version
+Create Date: 2022-07-04 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_company_search'
+down_revision = '0006_company_version'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('company', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "setweight(to_tsvector('simple', name), 'A') || setweight(to_tsvector('simple', location), 'B') "
+        "|| setweight(to_tsvector('simple', description), 'C')", persisted=True), nullable=True))
+    # CREATE INDEX CONCURRENTLY can not run inside a transaction
+    with op.get_context().autocommit_block():
+        op.create_index('ix_company_search_vector', 'company', ['search_vector'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_company_search_vector', table_name='company', postgresql_concurrently=True)
+    op.drop_column('company', 'search_vector')
@@ -1,6 +1,9 @@
+import os
 from app import create_app
 
 
 if __name__ == "__main__":
+    # development server, production runs gunicorn with wsgi.py (see gunicorn.conf.py)
     app = create_app()
-    app.run(debug=True, host="0.0.0.0", port=8060)
+    app.run(debug=os.environ.get("FLASK_DEBUG", "0").lower() in ("1", "true"), host="0.0.0.0",
+            port=int(os.environ.get("PORT", 8060)))
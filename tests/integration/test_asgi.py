@@ -0,0 +1,158 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask
+from quart import Quart
+from werkzeug.security import generate_password_hash
+import jwt
+from app import create_app, db
+from app import aio
+from app.models import User, Company, Grade, UserRole
+
+
+def seed_db():
+    db.session.add_all([
+        User({'username': 'mika_test', 'password': generate_password_hash('mikamika'), 'role': UserRole.user}),
+        User({'username': 'zika_test', 'password': generate_password_hash('zikazika'), 'role': UserRole.company_owner}),
+        User({'username': 'admin_test', 'password': generate_password_hash('adminadmin'), 'role': UserRole.admin}),
+    ])
+    db.session.flush()
+    db.session.add_all([
+        Company({'approved': True, 'name': 'co1', 'email': 'contact@co1.com', 'location': 'Novi Sad',
+                 'website': 'co1.com', 'description': 'best company ever', 'user_id': 2}),
+        Company({'approved': False, 'name': 'co2', 'email': 'contact@co2.com', 'location': 'Beograd',
+                 'website': 'co2.com', 'description': 'pending company'}),
+    ])
+    db.session.commit()
+
+
+@pytest.fixture
+def sync_app() -> Flask:
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_db()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
+
+
+@pytest.fixture
+def asgi_app(sync_app: Flask) -> Quart:
+    app = aio.create_app()
+    yield app
+    app.extensions['hash_pool'].shutdown()
+
+
+def run(app: Quart, test):
+    '''Runs test coroutine with app's test client. Pooled asyncpg connections belong to the event loop
+    which opened them, so the engine is disposed in the same loop.'''
+    async def main():
+        try:
+            await test(app.test_client())
+        finally:
+            await app.extensions['async_engine'].dispose()
+    asyncio.run(main())
+
+
+def headers(username: str, role: str) -> dict:
+    token = jwt.encode({'username': username, 'role': role, 'exp': datetime.utcnow() + timedelta(minutes=30)},
+                       key='secret', algorithm='HS256')
+    return {'authorization': f'Bearer {token}'}
+
+
+class TestAsgi:
+    '''Test case for the ASGI variant of the API.'''
+
+    def test_signup_and_login(self, asgi_app: Quart):
+        async def test(client):
+            response = await client.post('/api/signup', json={'username': 'pera', 'password': 'perapera'})
+            assert response.status_code == 200
+            assert (await response.get_json())['company'] is None
+
+            response = await client.post('/api/signup', json={'username': 'pera', 'password': 'perapera'})
+            assert response.status_code == 400
+
+            response = await client.post('/api/login', json={'username': 'pera', 'password': 'perapera'})
+            claims = jwt.decode(await response.get_json(), 'secret', algorithms=['HS256'])
+            assert claims['username'] == 'pera'
+
+            response = await client.post('/api/login', json={'username': 'pera', 'password': 'wrong'})
+            assert response.status_code == 400
+        run(asgi_app, test)
+
+    def test_get_company_same_as_sync_app(self, sync_app: Flask, asgi_app: Quart):
+        expected = sync_app.test_client().get('/api/company/1', headers=headers('mika_test', 'user')).json
+
+        async def test(client):
+            response = await client.get('/api/company/1', headers=headers('mika_test', 'user'))
+            assert response.status_code == 200
+            assert await response.get_json() == expected
+
+            response = await client.get('/api/company/1', headers={**headers('mika_test', 'user'),
+                                                                   'If-None-Match': response.headers['ETag']})
+            assert response.status_code == 304
+
+            response = await client.get('/api/company/100', headers=headers('mika_test', 'user'))
+            assert response.status_code == 404
+        run(asgi_app, test)
+
+    def test_get_companies(self, asgi_app: Quart):
+        async def test(client):
+            response = await client.get('/api/company/all?limit=1', headers=headers('admin_test', 'admin'))
+            assert [company['name'] for company in await response.get_json()] == ['co1']
+            assert response.headers['X-Next-Cursor'] == '1'
+
+            response = await client.get('/api/company/approved', headers=headers('mika_test', 'user'))
+            assert response.status_code == 403
+            response = await client.get('/api/company/unknown', headers=headers('admin_test', 'admin'))
+            assert response.status_code == 400
+        run(asgi_app, test)
+
+    def test_reviews(self, sync_app: Flask, asgi_app: Quart):
+        async def test(client):
+            response = await client.post('/api/company/1/comment', json={'description': 'nice'},
+                                         headers=headers('mika_test', 'user'))
+            assert response.status_code == 200
+            assert (await response.get_json())['company']['name'] == 'co1'
+
+            response = await client.post('/api/company/1/grade', json={'grade': 4}, headers=headers('mika_test', 'user'))
+            assert response.status_code == 200
+            response = await client.post('/api/company/1/grade', json={'grade': 6}, headers=headers('mika_test', 'user'))
+            assert response.status_code == 400
+            response = await client.post('/api/company/2/grade', json={'grade': 5}, headers=headers('mika_test', 'user'))
+            assert response.status_code == 400
+            response = await client.post('/api/company/1/grade', json={'grade': 5}, headers=headers('zika_test', 'user'))
+            assert response.status_code == 403
+
+            response = await client.get('/api/company/1/comments', headers=headers('mika_test', 'user'))
+            assert [comment['description'] for comment in await response.get_json()] == ['nice']
+        run(asgi_app, test)
+
+        with sync_app.app_context():
+            company = Company.query.get(1)
+            assert (company.grade_count, company.grade_sum, company.version) == (1, 4, 2)
+            assert Grade.query.count() == 1
+
+    def test_create_company_registration(self, asgi_app: Quart):
+        async def test(client):
+            response = await client.post('/api/company', headers=headers('mika_test', 'user'), json={
+                'name': 'co3', 'email': 'contact@co3.com', 'location': 'Nis', 'website': 'co3.com',
+                'description': 'new company', 'approved': True, 'grade_count': 10})
+            assert response.status_code == 200
+            company = await response.get_json()
+            assert (company['approved'], company['grade_count'], company['user']['username']) == (False, 0, 'mika_test')
+
+            response = await client.post('/api/company', headers=headers('mika_test', 'user'), json={'name': 'co4'})
+            assert response.status_code == 400
+        run(asgi_app, test)
+
+    def test_invalid_token(self, asgi_app: Quart):
+        async def test(client):
+            assert (await client.get('/api/company/1')).status_code == 403
+            response = await client.get('/api/company/1', headers={'authorization': 'Bearer 12345'})
+            assert response.status_code == 403
+        run(asgi_app, test)
@@ -6,6 +6,9 @@ from app.services import auth_service
 from app.models import User
 from werkzeug.security import check_password_hash, generate_password_hash
 from sqlalchemy.exc import IntegrityError
+from app.hash_pool import HashPool
+from threading import Thread
+import time
 
 def seed_db():
     pera = User(
@@ -60,6 +63,7 @@ def client() -> FlaskClient:
     # teardown
     with app.app_context():
         db.drop_all()
+    app.extensions['hash_pool'].shutdown()
 
 
 
@@ -107,3 +111,22 @@ class TestClassLogin:
         incoming_data = {'username': 'pera_test'}
         response = client.post('/api/login', json = {'username': incoming_data['username']})        
         assert response.status_code == 400
+
+
+class TestHashPoolSaturation:
+    '''When password hashing pool is saturated, API responds fast with 503.'''
+
+    def test_signup_with_saturated_pool(self, client: FlaskClient):
+        pool = HashPool(workers=1, queue_size=0, timeout=10)
+        original, client.application.extensions['hash_pool'] = client.application.extensions['hash_pool'], pool
+        busy = Thread(target=pool.run, args=(time.sleep, 1))
+        busy.start()
+        time.sleep(0.1)
+        try:
+            response = client.post('/api/signup', json={'username': 'busy', 'password': 'busybusy'})
+            assert response.status_code == 503
+            assert response.headers['Retry-After'] == '1'
+        finally:
+            busy.join()
+            client.application.extensions['hash_pool'] = original
+            pool.shutdown()
@@ -1,12 +1,14 @@
 from email import header
+import gzip
 import pytest
-from flask import current_app
+from flask import current_app, g
 from flask.testing import FlaskClient
 from app import create_app, db
 from app.models import User, Company, UserRole
 from werkzeug.security import generate_password_hash
 import jwt
 from datetime import datetime, timedelta
+from app.instrumentation import QueryBudgetExceeded
 
 mika = User(
     {
@@ -62,6 +64,7 @@ def client() -> FlaskClient:
     # teardown
     with app.app_context():
         db.drop_all()
+    app.extensions['hash_pool'].shutdown()
 
 
 @pytest.fixture(scope="function")
@@ -171,6 +174,44 @@ class TestCompany:
         assert response.status_code == 200
         assert 1 == len(response.json)
 
+    def test_get_companies_paginated(self, client: FlaskClient):
+        '''Full page returns cursor for the next page in X-Next-Cursor header.'''
+        response = client.get('/api/company/all?limit=1', headers=self.get_headers_valid(admin))
+        assert response.status_code == 200
+        assert 1 == len(response.json)
+        cursor = response.headers['X-Next-Cursor']
+
+        response = client.get(f'/api/company/all?limit=1&after={cursor}', headers=self.get_headers_valid(admin))
+        assert response.status_code == 200
+        assert 1 == len(response.json)
+        assert response.json[0]['id'] > int(cursor)
+        assert 'X-Next-Cursor' in response.headers
+
+        response = client.get(f'/api/company/all?limit=1&after={response.json[0]["id"]}', headers=self.get_headers_valid(admin))
+        assert response.json == []
+        assert 'X-Next-Cursor' not in response.headers
+
+    def test_get_companies_loads_user_once(self, client: FlaskClient):
+        '''check_token and required_roles share one user lookup, so only page query is added.'''
+        response = client.get('/api/company/all?after=1000', headers=self.get_headers_valid(admin))
+        assert response.status_code == 200
+        assert g.sql_statement_count == 2
+
+    def test_get_companies_with_roles_from_token(self, client: FlaskClient):
+        '''With AUTH_ROLES_FROM_TOKEN and cached token version only the page query hits the database.'''
+        client.application.config['AUTH_ROLES_FROM_TOKEN'] = True
+        try:
+            client.get('/api/company/all?after=1000', headers=self.get_headers_valid(admin))
+            response = client.get('/api/company/all?after=1000', headers=self.get_headers_valid(admin))
+        finally:
+            client.application.config['AUTH_ROLES_FROM_TOKEN'] = False
+        assert response.status_code == 200
+        assert g.sql_statement_count == 1
+
+    def test_get_companies_unknown_type(self, client: FlaskClient):
+        response = client.get('/api/company/trash', headers=self.get_headers_valid(admin))
+        assert response.status_code == 400
+
     def test_create_comment_success(self, client: FlaskClient):
         '''Zika's company co4 is approved. For that company user mika can create comment.'''
         description = 'My name is Giovani Giorgio and I love woriking for co4.'
@@ -215,4 +256,198 @@ class TestCompany:
         company_id = 3
         response = client.get(f'/api/company/{company_id}', headers=self.get_headers_valid(mika))
         assert response.status_code == 200
-        assert len(response.json['grades']) == 1
\ No newline at end of file
+        assert len(response.json['grades']) == 1
+
+    def test_get_company_statement_budget(self, client: FlaskClient):
+        '''Relationships walked by serializer are eager loaded: user lookup + company + comments + grades.'''
+        app = client.application
+        app.config['SQL_STATEMENT_LIMIT'], app.testing = 4, True
+        try:
+            response = client.get('/api/company/3', headers=self.get_headers_valid(mika))
+            assert response.status_code == 200
+            assert len(response.json['comments']) == 1
+
+            app.config['SQL_STATEMENT_LIMIT'] = 3
+            with pytest.raises(QueryBudgetExceeded):
+                client.get('/api/company/3', headers=self.get_headers_valid(mika))
+        finally:
+            app.config['SQL_STATEMENT_LIMIT'], app.testing = None, False
+
+    def test_statement_budget_only_warns_outside_tests(self, client: FlaskClient, caplog):
+        app = client.application
+        app.config['SQL_STATEMENT_LIMIT'] = 1
+        try:
+            response = client.get('/api/company/3', headers=self.get_headers_valid(mika))
+            assert response.status_code == 200
+            assert 'SQL statements, limit is 1' in caplog.text
+        finally:
+            app.config['SQL_STATEMENT_LIMIT'] = None
+
+    def test_get_companies_statement_budget(self, client: FlaskClient):
+        '''Number of statements does not grow with number of companies on the page.'''
+        app = client.application
+        app.config['SQL_STATEMENT_LIMIT'], app.testing = 4, True
+        try:
+            response = client.get('/api/company/all', headers=self.get_headers_valid(admin))
+            assert response.status_code == 200
+            assert len(response.json) == 2
+        finally:
+            app.config['SQL_STATEMENT_LIMIT'], app.testing = None, False
+
+    def test_get_non_existing_company(self, client: FlaskClient):
+        response = client.get('/api/company/100', headers=self.get_headers_valid(mika))
+        assert response.status_code == 404
+
+    def test_get_company_without_collections(self, client: FlaskClient):
+        response = client.get('/api/company/3?embed=false', headers=self.get_headers_valid(mika))
+        assert response.status_code == 200
+        assert 'comments' not in response.json
+        assert 'grades' not in response.json
+        assert response.json['grade_count'] == 1
+
+    def test_get_company_comments_newest_first(self, client: FlaskClient):
+        for description in ['second', 'third']:
+            client.post('/api/company/3/comment', json={'description': description}, headers=self.get_headers_valid(mika))
+
+        response = client.get('/api/company/3/comments?limit=2', headers=self.get_headers_valid(mika))
+        assert response.status_code == 200
+        assert [comment['description'] for comment in response.json] == ['third', 'second']
+        assert 'company' not in response.json[0]
+
+        cursor = response.headers['X-Next-Cursor']
+        response = client.get(f'/api/company/3/comments?limit=2&after={cursor}', headers=self.get_headers_valid(mika))
+        assert len(response.json) == 1
+        assert 'X-Next-Cursor' not in response.headers
+
+    def test_get_company_grades(self, client: FlaskClient):
+        response = client.get('/api/company/3/grades', headers=self.get_headers_valid(mika))
+        assert response.status_code == 200
+        assert [grade['grade'] for grade in response.json] == [5]
+
+    def test_get_non_existing_company_comments(self, client: FlaskClient):
+        response = client.get('/api/company/100/comments', headers=self.get_headers_valid(mika))
+        assert response.status_code == 404
+
+    def test_add_reviews(self, client: FlaskClient):
+        data = {
+            'grades': [{'company_id': 3, 'grade': 4}, {'company_id': 3, 'grade': 0}],
+            'comments': [{'company_id': 3, 'description': 'bulk comment'}],
+        }
+        response = client.post('/api/company/reviews', json=data, headers=self.get_headers_valid(mika))
+        assert response.status_code == 200
+        assert 'id' in response.json['grades'][0]
+        assert 'error' in response.json['grades'][1]
+        assert 'id' in response.json['comments'][0]
+
+    def test_add_reviews_invalid_body(self, client: FlaskClient):
+        response = client.post('/api/company/reviews', json={'grades': 'trash'}, headers=self.get_headers_valid(mika))
+        assert response.status_code == 400
+
+    def test_add_reviews_array_body(self, client: FlaskClient):
+        response = client.post('/api/company/reviews', json=[{'company_id': 3, 'grade': 4}],
+                               headers=self.get_headers_valid(mika))
+        assert response.status_code == 400
+
+    def test_add_reviews_out_of_range_company_id(self, client: FlaskClient):
+        data = {'grades': [{'company_id': 2**40, 'grade': 4}]}
+        response = client.post('/api/company/reviews', json=data, headers=self.get_headers_valid(mika))
+        assert response.status_code == 200
+        assert 'error' in response.json['grades'][0]
+
+    def test_get_stats(self, client: FlaskClient):
+        response = client.get('/api/stats', headers=self.get_headers_valid(admin))
+        assert response.status_code == 200
+        assert {'queue_depth', 'hash_seconds_total', 'rejected'} <= response.json['hash_pool'].keys()
+        assert {'checked_out', 'overflow', 'checkout_wait_seconds_total'} <= response.json['db_pool']['default'].keys()
+        assert client.get('/api/stats', headers=self.get_headers_valid(mika)).status_code == 403
+
+    def test_get_company_not_modified(self, client: FlaskClient):
+        '''Matching If-None-Match is answered with 304 after a single version lookup.'''
+        response = client.get('/api/company/3', headers=self.get_headers_valid(mika))
+        etag = response.headers['ETag']
+        headers = {**self.get_headers_valid(mika), 'If-None-Match': etag}
+
+        response = client.get('/api/company/3', headers=headers)
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+        assert g.sql_statement_count == 2 # user lookup + version
+
+        flat = client.get('/api/company/3?embed=false', headers=headers)
+        assert flat.status_code == 200
+        assert flat.headers['ETag'] != etag
+
+        client.post('/api/company/3/comment', json={'description': 'new'}, headers=self.get_headers_valid(mika))
+        response = client.get('/api/company/3', headers=headers)
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert 'new' in [comment['description'] for comment in response.json['comments']]
+
+    def test_get_companies_not_modified(self, client: FlaskClient):
+        response = client.get('/api/company/approved?limit=1', headers=self.get_headers_valid(admin))
+        etag, cursor = response.headers['ETag'], response.headers['X-Next-Cursor']
+        headers = {**self.get_headers_valid(admin), 'If-None-Match': etag}
+
+        response = client.get('/api/company/approved?limit=1', headers=headers)
+        assert response.status_code == 304
+        assert response.headers['X-Next-Cursor'] == cursor
+
+        client.post('/api/company/3/grade', json={'grade': 1}, headers=self.get_headers_valid(mika))
+        response = client.get('/api/company/approved?limit=1', headers=headers)
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+
+    def test_get_non_existing_company_with_etag(self, client: FlaskClient):
+        headers = {**self.get_headers_valid(mika), 'If-None-Match': '"company-100-v0"'}
+        assert client.get('/api/company/100', headers=headers).status_code == 404
+
+    def test_get_companies_compressed(self, client: FlaskClient):
+        plain = client.get('/api/company/all', headers=self.get_headers_valid(admin))
+        client.application.config['COMPRESS_MIN_SIZE'] = 0
+        try:
+            response = client.get('/api/company/all', headers={**self.get_headers_valid(admin), 'Accept-Encoding': 'gzip'})
+        finally:
+            client.application.config['COMPRESS_MIN_SIZE'] = 1024
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data) == plain.data
+
+    def test_search_companies(self, client: FlaskClient):
+        response = client.get('/api/company/search?q=co4 neki grad', headers=self.get_headers_valid(mika))
+        assert response.status_code == 200
+        assert [company['name'] for company in response.json] == ['co4']
+        assert 'comments' not in response.json[0]
+
+        response = client.get('/api/company/search?q=grad&limit=1', headers=self.get_headers_valid(mika))
+        assert all(company['approved'] for company in response.json)
+        assert response.headers['X-Next-Offset'] == '1'
+
+    def test_search_companies_invalid(self, client: FlaskClient):
+        headers = self.get_headers_valid(mika)
+        assert client.get('/api/company/search', headers=headers).status_code == 400
+        assert client.get('/api/company/search?q=co4&offset=-1', headers=headers).status_code == 400
+
+    def test_get_top_companies(self, client: FlaskClient):
+        response = client.get('/api/company/top', headers=self.get_headers_valid(mika))
+        assert response.status_code == 200
+        assert response.json[0]['name'] == 'co4'
+        assert {'avg_grade', 'grade_count', 'score'} <= response.json[0].keys()
+
+        response = client.get('/api/company/top?location=nowhere', headers=self.get_headers_valid(mika))
+        assert response.json == []
+        assert client.get('/api/company/top?limit=0', headers=self.get_headers_valid(mika)).status_code == 400
+
+    def test_resolve_company_registrations(self, client: FlaskClient, valid_co_data: dict):
+        client.post('/api/company', json={**valid_co_data, 'name': 'co5'}, headers=self.get_headers_valid(mika))
+        registrations = [{'username': mika.username, 'reject': False}, {'company_id': 100, 'reject': True}]
+        response = client.post('/api/company/resolve-registrations', json={'registrations': registrations},
+                               headers=self.get_headers_valid(admin))
+        assert response.status_code == 200
+        assert response.json[0]['status'] == 'approved'
+        assert response.json[1] == {'error': 'no company with id: 100'}
+
+        response = client.post('/api/company/resolve-registrations', json={'registrations': registrations},
+                               headers=self.get_headers_valid(mika))
+        assert response.status_code == 403
+        response = client.post('/api/company/resolve-registrations', json=registrations,
+                               headers=self.get_headers_valid(admin))
+        assert response.status_code == 400
@@ -9,6 +9,10 @@ from sqlalchemy.exc import IntegrityError, NoResultFound
 import jwt
 
 from app.services.auth_service import AuthException
+from app import routes # routes_utils must be imported after api blueprint
+from app.routes_utils import get_logged_in_user, get_auth_context
+from app import instrumentation
+from flask import request
 
 def seed_db():
     mika = User(
@@ -53,6 +57,7 @@ def app() -> Flask:
     # teardown
     with app.app_context():
         db.drop_all()
+    app.extensions['hash_pool'].shutdown()
 
 
 class TestSignup:
@@ -105,4 +110,78 @@ class TestClassLogin:
         incoming_data = {'username': 'mika_test', 'password': 'trash'}
         with pytest.raises(AuthException):
             auth_service.login(incoming_data['username'], incoming_data['password'])
-        assert True
\ No newline at end of file
+        assert True
+
+
+class TestAuthContext:
+    '''Test case for request scoped identity resolution.'''
+
+    def test_user_loaded_once_per_request(self, app: Flask):
+        token = auth_service.login('mika_test', 'mikamika')
+        with app.test_request_context(headers={'authorization': f'Bearer {token}'}):
+            instrumentation.reset_request_stats()
+            users = [get_logged_in_user(request) for _ in range(3)]
+            assert instrumentation.statement_count() == 1
+            assert all(user is users[0] for user in users)
+            assert users[0].username == 'mika_test'
+
+    def test_unknown_user(self, app: Flask):
+        token = jwt.encode({'username': 'trash'}, app.config['SECRET_KEY'], algorithm='HS256')
+        with app.test_request_context(headers={'authorization': f'Bearer {token}'}):
+            with pytest.raises(NoResultFound):
+                get_logged_in_user(request)
+
+    def test_role_from_token_claims(self, app: Flask):
+        '''With AUTH_ROLES_FROM_TOKEN role is read from verified token. Database is only used
+        to read user's token version, which is then cached.'''
+        app.config['AUTH_ROLES_FROM_TOKEN'] = True
+        token = auth_service.login('mika_test', 'mikamika')
+        for expected_statements in [1, 0]:
+            with app.test_request_context(headers={'authorization': f'Bearer {token}'}):
+                instrumentation.reset_request_stats()
+                assert get_auth_context(request).role == 'user'
+                assert instrumentation.statement_count() == expected_statements
+
+
+class TestDecodeToken:
+    '''Test case for verified token cache.'''
+
+    def test_verified_token_is_cached(self, app: Flask):
+        token = auth_service.login('mika_test', 'mikamika')
+        claims = auth_service.decode_token(token)
+        assert claims['username'] == 'mika_test'
+        assert auth_service.decode_token(token) is claims
+
+    def test_invalid_token_is_not_cached(self, app: Flask):
+        token = jwt.encode({'username': 'mika_test'}, 'wrong secret', algorithm='HS256')
+        for _ in range(2):
+            with pytest.raises(jwt.InvalidTokenError):
+                auth_service.decode_token(token)
+        assert len(app.extensions['verified_tokens']) == 0
+
+    def test_revoked_token(self, app: Flask):
+        '''Token issued before user's token version was bumped is rejected when roles come from claims.'''
+        app.config['AUTH_ROLES_FROM_TOKEN'] = True
+        token = auth_service.login('mika_test', 'mikamika')
+        auth_service.decode_token(token)
+
+        auth_service.revoke_tokens(database.find_by_username('mika_test'))
+        db.session.commit()
+        with pytest.raises(jwt.InvalidTokenError):
+            auth_service.decode_token(token)
+
+        new_token = auth_service.login('mika_test', 'mikamika')
+        assert auth_service.decode_token(new_token)['ver'] == 1
+
+    def test_revocation_is_persisted(self, app: Flask):
+        '''Other workers and restarted workers read bumped token version from the database.'''
+        app.config['AUTH_ROLES_FROM_TOKEN'] = True
+        token = auth_service.login('mika_test', 'mikamika')
+        auth_service.decode_token(token)
+
+        user = database.find_by_username('mika_test')
+        user.token_version += 1 # bumped by another worker
+        db.session.commit()
+        app.extensions['token_versions'].clear() # cached version expired
+        with pytest.raises(jwt.InvalidTokenError):
+            auth_service.decode_token(token)
@@ -0,0 +1,30 @@
+import time
+from app.cache import LRUCache
+
+
+class TestLRUCache:
+    '''Test case for bounded LRU/TTL cache.'''
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        assert cache.get('a') == 1 # 'b' becomes least recently used
+        cache.set('c', 3)
+        assert cache.get('b') == None
+        assert cache.get('a') == 1
+        assert cache.get('c') == 3
+        assert len(cache) == 2
+
+    def test_entry_expires(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set('a', 1, ttl=0.01)
+        time.sleep(0.02)
+        assert cache.get('a') == None
+        assert len(cache) == 0
+
+    def test_entry_ttl_cannot_exceed_configured_ttl(self):
+        cache = LRUCache(maxsize=2, ttl=0.01)
+        cache.set('a', 1, ttl=60)
+        time.sleep(0.02)
+        assert cache.get('a') == None
@@ -2,11 +2,13 @@ import pytest
 from flask import Flask
 from app import create_app, db
 from app import database
-from app.services import company_service
-from app.models import User, Company, UserRole
+from app.services import company_service, auth_service
+from app import instrumentation
+from app.models import User, Company, Grade, UserRole, OutboxEvent
 from werkzeug.security import generate_password_hash
 from sqlalchemy.exc import IntegrityError, NoResultFound
 from app.services.company_service import NotApproved
+import jwt
 
 
 
@@ -87,6 +89,7 @@ def app() -> Flask:
     # teardown
     with app.app_context():
         db.drop_all()
+    app.extensions['hash_pool'].shutdown()
 
 
 # PARAMS
@@ -144,6 +147,15 @@ class TestCompany:
         assert valid_co_data['website'] == company.website
         assert valid_co_data['description'] == company.description
 
+    def test_create_company_request_ignores_rating_aggregates(self, app: Flask, mika: User, valid_co_data:dict):
+        forged = {'grade_count': 1000, 'grade_sum': 5000, 'avg_grade': 5.0, 'grade_5_count': 1000}
+        company = company_service.create_company_registration(user=mika, data={**valid_co_data, **forged})
+        company = database.find_by_id(Company, company.id)
+        assert company.grade_count == 0
+        assert company.grade_sum == 0
+        assert company.avg_grade is None
+        assert company.grade_histogram == {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+
 
     def test_create_company_request_invalid_data(self, app: Flask, mika: User, invalid_co_data:dict):
         '''all fields are neccessary.'''
@@ -171,6 +183,17 @@ class TestCompany:
         assert mika.company == company
         assert mika.role == UserRole.company_owner
 
+    def test_accept_company_registration_revokes_tokens(self, app: Flask, mika: User):
+        '''Tokens issued before promotion carry stale role claim, so they are revoked.'''
+        app.config['AUTH_ROLES_FROM_TOKEN'] = True
+        token = auth_service.login('mika_test', 'mikamika')
+        company_service.resolve_company_registration(username='mika_test', reject=False)
+        with pytest.raises(jwt.InvalidTokenError):
+            auth_service.decode_token(token)
+
+        new_token = auth_service.login('mika_test', 'mikamika')
+        assert auth_service.decode_token(new_token)['role'] == UserRole.company_owner.name
+
     def test_get_all_companies(self, app: Flask):
         '''Should return all companies'''
         companies = company_service.get_all_companies('all')
@@ -187,6 +210,24 @@ class TestCompany:
         companies = company_service.get_all_companies('not-resolved')
         assert len(companies) == 2
 
+    def test_get_companies_page(self, app: Flask):
+        '''Companies are returned in pages ordered by id, next page starts after given cursor.'''
+        first_page = company_service.get_all_companies('all', limit=2)
+        assert [co.name for co in first_page] == ['co1', 'co2']
+
+        second_page = company_service.get_all_companies('all', after=first_page[-1].id, limit=2)
+        assert [co.name for co in second_page] == ['co3']
+
+    def test_get_not_resolved_companies_page(self, app: Flask):
+        '''Status filter and cursor are applied together.'''
+        first_page = company_service.get_all_companies('not-resolved', limit=1)
+        second_page = company_service.get_all_companies('not-resolved', after=first_page[-1].id, limit=1)
+        assert [co.name for co in first_page + second_page] == ['co1', 'co2']
+
+    def test_get_companies_with_unknown_type(self, app: Flask):
+        with pytest.raises(ValueError):
+            company_service.get_all_companies('trash')
+
     def test_create_comment_success(self, app: Flask, mika: User, zika: User):
         '''Comment can create user (mika) for company that's approved (company owned by zika).'''
         description = 'My name is Giovani Giorgio and I love woriking for co1.'
@@ -235,4 +276,160 @@ class TestCompany:
         company = zika.company
         with pytest.raises(Exception):
             company_service.add_grade(user=mika, company_id=company.id, grade=grade)
-            
\ No newline at end of file
+            
+    def test_grade_updates_company_rating(self, app: Flask, mika: User, zika: User):
+        '''Rating aggregates are updated together with added grade.'''
+        company = zika.company
+        for grade in [5, 4, 4]:
+            company_service.add_grade(user=mika, company_id=company.id, grade=grade)
+        
+        company = database.find_by_id(Company, company.id)
+        assert company.grade_count == 3
+        assert company.grade_sum == 13
+        assert company.avg_grade == pytest.approx(13 / 3)
+        assert company.grade_histogram == {1: 0, 2: 0, 3: 0, 4: 2, 5: 1}
+
+    def test_rebuild_grade_aggregates(self, app: Flask, mika: User, zika: User):
+        '''Aggregates which drifted from Grade table are recomputed.'''
+        company_id, not_graded_company_id = zika.company.id, mika.company.id
+        company_service.add_grade(user=mika, company_id=company_id, grade=2)
+        company_service.add_grade(user=mika, company_id=company_id, grade=3)
+        database.edit_instance(Company, company_id, {'grade_count': 100, 'grade_sum': 7, 'grade_1_count': 3})
+
+        result = app.test_cli_runner().invoke(args=['rebuild-grade-aggregates'])
+        assert result.exit_code == 0
+
+        company = database.find_by_id(Company, company_id)
+        assert company.grade_count == 2
+        assert company.grade_sum == 5
+        assert company.avg_grade == 2.5
+        assert company.grade_histogram == {1: 0, 2: 1, 3: 1, 4: 0, 5: 0}
+        assert database.find_by_id(Company, not_graded_company_id).grade_count == 0
+
+    def test_get_grades_newest_first(self, app: Flask, mika: User, zika: User):
+        company_id = zika.company.id
+        for grade in [1, 2, 3]:
+            company_service.add_grade(user=mika, company_id=company_id, grade=grade)
+
+        first_page = company_service.get_grades(company_id, limit=2)
+        assert [grade.grade for grade in first_page] == [3, 2]
+        second_page = company_service.get_grades(company_id, after=first_page[-1].id, limit=2)
+        assert [grade.grade for grade in second_page] == [1]
+
+    def test_add_reviews(self, app: Flask, mika: User, zika: User):
+        '''Valid items are inserted in one transaction, invalid ones are reported by index.'''
+        approved_id, not_approved_id = zika.company.id, mika.company.id
+        grades = [
+            {'company_id': approved_id, 'grade': 5},
+            {'company_id': approved_id, 'grade': 10},
+            {'company_id': not_approved_id, 'grade': 3},
+            {'company_id': approved_id, 'grade': 4},
+            {'grade': 4},
+        ]
+        comments = [{'company_id': approved_id, 'description': 'great'}, {'company_id': 100, 'description': 'great'}]
+        result = company_service.add_reviews(mika, grades, comments)
+
+        assert [('id' in item) for item in result['grades']] == [True, False, False, True, False]
+        assert result['grades'][2]['error'] == 'company registration not approved by admin'
+        assert 'error' in result['comments'][1]
+
+        company = database.find_by_id(Company, approved_id)
+        assert sorted(grade.grade for grade in company.grades) == [4, 5]
+        assert [comment.id for comment in company.comments] == [result['comments'][0]['id']]
+        assert company.grade_count == 2
+        assert company.avg_grade == 4.5
+        assert company.grade_histogram == {1: 0, 2: 0, 3: 0, 4: 1, 5: 1}
+
+    def test_add_reviews_rejects_bool(self, app: Flask, mika: User, zika: User):
+        '''true is an int in python, it must not pass as grade 1 or as company id 1.'''
+        result = company_service.add_reviews(mika, [{'company_id': zika.company.id, 'grade': True},
+                                                    {'company_id': True, 'grade': 5}], [])
+        assert all('error' in item for item in result['grades'])
+        with pytest.raises(Exception):
+            company_service.add_grade(user=mika, company_id=zika.company.id, grade=True)
+
+    def test_add_reviews_ids_match_items(self, app: Flask, mika: User, zika: User):
+        grades = [{'company_id': zika.company.id, 'grade': grade} for grade in [5, 1, 3, 1, 2]]
+        result = company_service.add_reviews(mika, grades, [])
+        for item, row in zip(grades, result['grades']):
+            assert database.find_by_id(Grade, row['id']).grade == item['grade']
+        assert len({row['id'] for row in result['grades']}) == len(grades)
+
+    def test_writes_bump_company_version(self, app: Flask, mika: User, zika: User):
+        company_id = zika.company.id
+        versions = [company_service.get_version(company_id)]
+        company_service.create_comment(mika, company_id, 'nice')
+        versions.append(company_service.get_version(company_id))
+        company_service.add_grade(mika, company_id, 4)
+        versions.append(company_service.get_version(company_id))
+        company_service.add_reviews(mika, [], [{'company_id': company_id, 'description': 'bulk'}])
+        versions.append(company_service.get_version(company_id))
+        assert versions == [0, 1, 2, 3]
+
+        pending_id = mika.company.id
+        company_service.resolve_company_registration(username='mika_test', reject=False)
+        assert company_service.get_version(pending_id) == 1
+
+    def test_page_versions(self, app: Flask, zika: User):
+        company_service.add_grade(database.find_by_username('mika_test'), zika.company.id, 5)
+        versions = company_service.get_page_versions('all', limit=2)
+        assert versions == [(company.id, company.version) for company in company_service.get_all_companies('all', limit=2)]
+
+    def test_add_reviews_as_company_owner(self, app: Flask, zika: User):
+        with pytest.raises(company_service.RoleNotAllowed):
+            company_service.add_reviews(zika, [{'company_id': zika.company.id, 'grade': 5}], [])
+
+    def test_resolve_company_registrations(self, app: Flask, mika: User, zika: User):
+        '''Items are resolved together, invalid ones are reported by index.'''
+        pending_id, ownerless_id, approved_id = mika.company.id, 2, zika.company.id
+        items = [
+            {'username': 'mika_test', 'reject': False},
+            {'company_id': ownerless_id, 'reject': True},
+            {'company_id': approved_id, 'reject': True},
+            {'company_id': 100, 'reject': False},
+            {'username': 'admin_test', 'reject': False},
+            {'company_id': pending_id},
+            {'company_id': pending_id, 'reject': True},
+        ]
+        results = company_service.resolve_company_registrations(items)
+        assert results == [
+            {'company_id': pending_id, 'status': 'approved'},
+            {'company_id': ownerless_id, 'status': 'rejected'},
+            {'error': f'registration of company {approved_id} is already resolved.'},
+            {'error': 'no company with id: 100'},
+            {'error': 'no company registration of user: admin_test'},
+            {'error': 'item must contain reject and either company_id or username.'},
+            {'error': f'company {pending_id} appears in more than one item.'},
+        ]
+
+        db.session.expire_all()
+        assert database.find_by_id(Company, ownerless_id) is None
+        company = database.find_by_id(Company, pending_id)
+        assert (company.approved, company.version) == (True, 1)
+        assert (mika.role, mika.token_version) == (UserRole.company_owner, 1)
+        assert sorted(event.event_type for event in OutboxEvent.query) == ['company_approved', 'company_rejected']
+
+    def test_resolve_company_registrations_revokes_tokens(self, app: Flask, mika: User):
+        app.config['AUTH_ROLES_FROM_TOKEN'] = True
+        token = auth_service.login('mika_test', 'mikamika')
+        company_service.resolve_company_registrations([{'company_id': mika.company.id, 'reject': False}])
+        with pytest.raises(jwt.InvalidTokenError):
+            auth_service.decode_token(token)
+
+    def test_resolve_company_registrations_statements(self, app: Flask, zika: User):
+        '''Lock, approve, promote, reject and two outbox inserts, however many registrations are resolved.'''
+        users = [User({'username': f'owner{i}', 'password': 'x', 'role': UserRole.user}) for i in range(10)]
+        db.session.add_all(users)
+        db.session.flush()
+        db.session.add_all([Company({'approved': False, 'name': f'pending{i}', 'email': f'contact@pending{i}.com',
+                                     'location': 'Novi Sad', 'website': f'pending{i}.com', 'description': 'pending',
+                                     'user_id': user.id}) for i, user in enumerate(users)])
+        db.session.commit()
+
+        items = [{'username': user.username, 'reject': i % 2 == 0} for i, user in enumerate(users)]
+        with app.test_request_context():
+            instrumentation.reset_request_stats()
+            results = company_service.resolve_company_registrations(items)
+            assert instrumentation.statement_count() == 6
+        assert [result['status'] for result in results] == ['rejected', 'approved'] * 5
+        assert User.query.filter_by(role=UserRole.company_owner).count() == 6
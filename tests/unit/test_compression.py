@@ -0,0 +1,101 @@
+import gzip
+import json
+import pytest
+from flask import Flask, Response
+from app import create_app, compression
+from app.compression import compress_response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+PAYLOAD = json.dumps([{'id': i, 'location': 'Novi Sad', 'description': 'best company ever'} for i in range(100)])
+
+
+@pytest.fixture
+def app() -> Flask:
+    app = create_app()
+    yield app
+    app.extensions['hash_pool'].shutdown()
+
+
+def compressed(app: Flask, response: Response, accept_encoding: str = None, method: str = 'GET') -> Response:
+    headers = {'Accept-Encoding': accept_encoding} if accept_encoding else {}
+    with app.test_request_context(method=method, headers=headers) as context:
+        return compress_response(context.request, response)
+
+
+def json_response(data: str = PAYLOAD, **kwargs) -> Response:
+    return Response(data, mimetype='application/json', **kwargs)
+
+
+class TestCompression:
+    '''Test case for negotiated response compression.'''
+
+    def test_gzip(self, app: Flask):
+        response = compressed(app, json_response(), 'gzip')
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Accept-Encoding' in response.vary
+        assert int(response.headers['Content-Length']) == len(response.get_data()) < len(PAYLOAD)
+        assert gzip.decompress(response.get_data()).decode() == PAYLOAD
+
+    @pytest.mark.skipif(brotli is None, reason='brotli is not installed')
+    def test_brotli_preferred(self, app: Flask):
+        response = compressed(app, json_response(), 'gzip, deflate, br')
+        assert response.headers['Content-Encoding'] == 'br'
+        assert brotli.decompress(response.get_data()).decode() == PAYLOAD
+
+    def test_client_preference(self, app: Flask):
+        response = compressed(app, json_response(), 'br;q=0.5, gzip')
+        assert response.headers['Content-Encoding'] == 'gzip'
+
+    def test_not_accepted(self, app: Flask):
+        response = compressed(app, json_response())
+        assert 'Content-Encoding' not in response.headers
+        assert 'Accept-Encoding' in response.vary
+        assert response.get_data().decode() == PAYLOAD
+
+    def test_small_body_is_not_compressed(self, app: Flask):
+        response = compressed(app, json_response('{"id": 1}'), 'gzip')
+        assert 'Content-Encoding' not in response.headers
+        assert response.get_data() == b'{"id": 1}'
+
+    def test_level_and_threshold_are_configurable(self, app: Flask):
+        app.config['COMPRESS_MIN_SIZE'] = 0
+        assert compressed(app, json_response('{"id": 1}'), 'gzip').headers['Content-Encoding'] == 'gzip'
+        # gzip header's XFL byte records fastest (4) or best (2) compression
+        app.config['COMPRESS_GZIP_LEVEL'] = 1
+        assert compressed(app, json_response(), 'gzip').get_data()[8] == 4
+        app.config['COMPRESS_GZIP_LEVEL'] = 9
+        assert compressed(app, json_response(), 'gzip').get_data()[8] == 2
+
+    def test_streamed_response(self, app: Flask):
+        chunks = [PAYLOAD[i:i + 100] for i in range(0, len(PAYLOAD), 100)]
+        response = compressed(app, json_response((chunk for chunk in chunks), headers={'Content-Length': str(len(PAYLOAD))}),
+                              'gzip')
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert 'Content-Length' not in response.headers
+        body = list(response.response)
+        assert len(body) == len(chunks) + 1 # every chunk is flushed to the client, then gzip trailer
+        assert gzip.decompress(b''.join(body)).decode() == PAYLOAD
+
+    def test_strong_etag_becomes_weak(self, app: Flask):
+        response = json_response()
+        response.set_etag('company-1-v1')
+        response = compressed(app, response, 'gzip')
+        assert response.get_etag() == ('company-1-v1', True)
+
+    @pytest.mark.parametrize('response', [
+        Response(status=304),
+        Response(PAYLOAD, mimetype='image/png'),
+        Response(PAYLOAD, mimetype='application/json', headers={'Content-Encoding': 'gzip'}),
+        Response(PAYLOAD, mimetype='application/json', headers={'Cache-Control': 'no-transform'}),
+    ])
+    def test_skipped_responses(self, app: Flask, response: Response):
+        body = response.get_data()
+        assert compressed(app, response, 'gzip').get_data() == body
+
+    def test_disabled(self, app: Flask):
+        app.config['COMPRESS_ENABLED'] = False
+        assert 'Content-Encoding' not in compressed(app, json_response(), 'gzip').headers
@@ -0,0 +1,57 @@
+import pytest
+from flask import Flask
+from sqlalchemy import exc, text
+from app import create_app, config, db, db_pool
+from app.db_pool import TimedQueuePool
+
+
+@pytest.fixture
+def app(monkeypatch) -> Flask:
+    monkeypatch.setattr(config, 'DB_POOL_SIZE', 1)
+    monkeypatch.setattr(config, 'DB_MAX_OVERFLOW', 1)
+    monkeypatch.setattr(config, 'DB_POOL_TIMEOUT', 0.1)
+    monkeypatch.setattr(config, 'DB_STATEMENT_TIMEOUT', 100)
+    app = create_app()
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+    app.extensions['hash_pool'].shutdown()
+
+
+class TestDbPool:
+    '''Test case for connection pool settings and metrics.'''
+
+    def test_engine_options(self, app: Flask):
+        pool = db.engine.pool
+        assert isinstance(pool, TimedQueuePool)
+        assert pool.size() == 1
+        assert pool._pre_ping
+
+    def test_checkout_metrics(self, app: Flask):
+        before = db_pool.metrics(app)['default']
+        with db.engine.connect(), db.engine.connect():
+            metrics = db_pool.metrics(app)['default']
+            assert metrics['checked_out'] == 2
+            assert metrics['overflow'] == 1
+            assert metrics['checkouts'] == before['checkouts'] + 2
+
+            with pytest.raises(exc.TimeoutError):
+                db.engine.connect()
+            metrics = db_pool.metrics(app)['default']
+            assert metrics['timeouts'] == 1
+            assert metrics['checkout_wait_seconds_max'] >= 0.1
+
+        assert db_pool.metrics(app)['default']['checked_out'] == 0
+
+    def test_stats_survive_dispose(self, app: Flask):
+        with db.engine.connect():
+            pass
+        checkouts = db_pool.metrics(app)['default']['checkouts']
+        db.engine.dispose()
+        assert db_pool.metrics(app)['default']['checkouts'] == checkouts
+
+    def test_statement_timeout(self, app: Flask):
+        with db.engine.connect() as connection:
+            with pytest.raises(exc.OperationalError, match='statement timeout'):
+                connection.execute(text('SELECT pg_sleep(1)'))
@@ -0,0 +1,72 @@
+import os
+import time
+import pytest
+from threading import Thread
+from werkzeug.security import check_password_hash
+from app.hash_pool import HashPool, PoolSaturated
+
+
+@pytest.fixture
+def pool() -> HashPool:
+    pool = HashPool(workers=1, queue_size=0, timeout=10)
+    yield pool
+    pool.shutdown()
+
+
+class TestHashPool:
+    '''Test case for password hashing worker pool.'''
+
+    def test_hash_in_worker_process(self, pool: HashPool):
+        pwhash = pool.generate_password_hash('perapera')
+        assert check_password_hash(pwhash, 'perapera')
+        assert pool.check_password_hash(pwhash, 'perapera')
+        assert not pool.check_password_hash(pwhash, 'trash')
+
+        metrics = pool.metrics()
+        assert metrics['completed'] == 3
+        assert metrics['in_flight'] == 0
+        assert metrics['hash_seconds_total'] > 0
+
+    def test_hash_inline(self):
+        pool = HashPool(workers=0, queue_size=0, timeout=10)
+        assert pool.check_password_hash(pool.generate_password_hash('perapera'), 'perapera')
+        assert pool.metrics()['completed'] == 2
+
+    def test_saturated_pool_rejects(self, pool: HashPool):
+        '''When every worker is busy and queue is full, request is rejected without waiting.'''
+        busy = Thread(target=pool.run, args=(time.sleep, 1))
+        busy.start()
+        time.sleep(0.1)
+        try:
+            with pytest.raises(PoolSaturated):
+                pool.generate_password_hash('perapera')
+            assert pool.metrics()['rejected'] == 1
+            assert pool.metrics()['in_flight'] == 1
+        finally:
+            busy.join()
+
+    def test_timeout(self):
+        pool = HashPool(workers=1, queue_size=0, timeout=0.1)
+        try:
+            with pytest.raises(PoolSaturated):
+                pool.run(time.sleep, 1)
+        finally:
+            pool.shutdown()
+
+    def test_broken_pool_is_recreated(self, pool: HashPool):
+        '''When a worker dies, request is rejected and next one gets a fresh executor.'''
+        with pytest.raises(PoolSaturated):
+            pool.run(os._exit, 1)
+        assert pool.metrics()['in_flight'] == 0
+        assert pool.check_password_hash(pool.generate_password_hash('perapera'), 'perapera')
+
+    def test_shutdown_with_pending_work(self):
+        '''Shutdown waits for pending work without deadlocking with its done-callbacks.'''
+        pool = HashPool(workers=1, queue_size=1, timeout=10)
+        busy = Thread(target=pool.run, args=(time.sleep, 0.5))
+        busy.start()
+        time.sleep(0.1)
+        pool.shutdown()
+        busy.join(timeout=5)
+        assert not busy.is_alive()
+        assert pool.metrics()['in_flight'] == 0
@@ -0,0 +1,95 @@
+import logging
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask, g
+from werkzeug.security import generate_password_hash
+import jwt
+from app import config, create_app, db, instrumentation
+from app.instrumentation import RepeatedStatement
+from app.models import User, Company, Comment, UserRole
+
+
+@pytest.fixture
+def app(monkeypatch) -> Flask:
+    monkeypatch.setattr(config, 'N_PLUS_ONE_THRESHOLD', 3)
+    monkeypatch.setattr(config, 'SLOW_QUERY_SECONDS', 0)
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(User({'username': 'admin_test', 'password': generate_password_hash('adminadmin'),
+                             'role': UserRole.admin}))
+        for i in range(3):
+            company = Company({'approved': True, 'name': f'co{i}', 'email': f'contact@co{i}.com', 'location': 'Novi Sad',
+                               'website': f'co{i}.com', 'description': 'company'})
+            db.session.add(company)
+            db.session.flush()
+            db.session.add(Comment({'company_id': company.id, 'user_id': 1, 'description': 'nice'}))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
+
+
+def headers() -> dict:
+    token = jwt.encode({'username': 'admin_test', 'role': 'admin', 'exp': datetime.utcnow() + timedelta(minutes=30)},
+                       key='secret', algorithm='HS256')
+    return {'authorization': f'Bearer {token}'}
+
+
+def lazy_load_comments():
+    instrumentation.reset_request_stats()
+    for company in Company.query.all():
+        assert len(company.comments) == 1
+
+
+class TestRepeatedStatements:
+    '''Test case for N+1 query detection.'''
+
+    def test_raises_under_tests(self, app: Flask):
+        app.testing = True
+        with app.test_request_context('/api/company/all'):
+            lazy_load_comments()
+            assert max(g.sql_statement_shapes.values()) == 3
+            with pytest.raises(RepeatedStatement, match='executed the same SQL statement 3 times'):
+                instrumentation.check_repeated_statements()
+
+    def test_warns_outside_tests(self, app: Flask, caplog):
+        with app.test_request_context('/api/company/all'):
+            lazy_load_comments()
+            instrumentation.check_repeated_statements()
+        assert 'executed the same SQL statement 3 times' in caplog.text
+
+    def test_below_threshold(self, app: Flask):
+        app.testing = True
+        app.config['N_PLUS_ONE_THRESHOLD'] = 4
+        with app.test_request_context('/api/company/all'):
+            lazy_load_comments()
+            instrumentation.check_repeated_statements()
+
+    def test_eager_loaded_route_passes(self, app: Flask):
+        app.testing = True
+        response = app.test_client().get('/api/company/all', headers=headers())
+        assert response.status_code == 200
+        assert len(response.json) == 3
+
+    def test_disabled(self, app: Flask):
+        app.config['N_PLUS_ONE_THRESHOLD'] = None
+        with app.test_request_context('/api/company/all'):
+            lazy_load_comments()
+            assert g.sql_statement_shapes is None
+            instrumentation.check_repeated_statements()
+
+
+def test_slow_query_log(app: Flask, caplog):
+    with caplog.at_level(logging.WARNING):
+        assert app.test_client().get('/api/company/1', headers=headers()).status_code == 200
+    assert 'slow SQL statement' in caplog.text
+    assert 'in GET /api/company/1 (api.get_company): SELECT' in caplog.text
+
+    caplog.clear()
+    app.config['SLOW_QUERY_SECONDS'] = 10
+    assert app.test_client().get('/api/company/1', headers=headers()).status_code == 200
+    assert 'slow SQL statement' not in caplog.text
@@ -0,0 +1,109 @@
+import pytest
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from app import create_app, config, db
+from app.leaderboard import Leaderboard
+from app.models import User, Company, UserRole
+from app.services import company_service
+
+
+def seed_db():
+    db.session.add(User({'username': 'mika_test', 'password': generate_password_hash('mikamika'), 'role': UserRole.user}))
+    for name, location, approved in (('co1', 'Novi Sad', True), ('co2', 'Beograd', True), ('co3', 'novi sad', True),
+                                     ('co4', 'Novi Sad', False)):
+        db.session.add(Company({'approved': approved, 'name': name, 'email': 'contact@co.com', 'location': location,
+                                'website': 'co.com', 'description': 'best company ever'}))
+    db.session.commit()
+
+
+@pytest.fixture
+def app(monkeypatch) -> Flask:
+    monkeypatch.setattr(config, 'TOP_PRIOR_WEIGHT', 2)
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_db()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
+
+
+def add_grades(grades: dict[int, list[int]]):
+    user = User.query.filter_by(username='mika_test').one()
+    for company_id, company_grades in grades.items():
+        for grade in company_grades:
+            company_service.add_grade(user, company_id, grade)
+
+
+class TestLeaderboard:
+    '''Test case for ranking by Bayesian average.'''
+
+    def test_many_good_grades_beat_few_perfect_ones(self):
+        leaderboard = Leaderboard(ttl=60, prior_weight=5)
+        leaderboard.load([(1, 'few', 'Novi Sad', 1, 5), (2, 'many', 'Novi Sad', 100, 480), (3, 'bad', 'Beograd', 50, 100)])
+        top = leaderboard.top()
+        assert [company['name'] for company in top] == ['many', 'few', 'bad']
+        assert top[0]['avg_grade'] == 4.8
+        # mean grade is 585 / 151
+        assert top[1]['score'] == pytest.approx((5 * 585 / 151 + 5) / 6)
+
+    def test_location_filter_and_limit(self):
+        leaderboard = Leaderboard(ttl=60, prior_weight=0)
+        leaderboard.load([(1, 'a', 'Novi Sad', 1, 5), (2, 'b', 'Beograd', 1, 4), (3, 'c', 'ulica 1, NOVI SAD', 1, 3)])
+        assert [company['id'] for company in leaderboard.top(location='novi sad')] == [1, 3]
+        assert [company['id'] for company in leaderboard.top(limit=2)] == [1, 2]
+
+    def test_add_grades_reranks(self):
+        leaderboard = Leaderboard(ttl=60, prior_weight=0)
+        leaderboard.load([(1, 'a', 'Novi Sad', 1, 5), (2, 'b', 'Beograd', 1, 4)])
+        assert leaderboard.top()[0]['id'] == 1
+        leaderboard.add_grades(1, [1, 1])
+        assert [company['id'] for company in leaderboard.top()] == [2, 1]
+        assert not leaderboard.expired
+
+    def test_unknown_company_expires_cache(self):
+        leaderboard = Leaderboard(ttl=60, prior_weight=0)
+        leaderboard.load([])
+        leaderboard.add_grades(1, [5])
+        assert leaderboard.expired
+
+
+class TestTopCompanies:
+    '''Test case for top companies, cached in the app.'''
+
+    def test_top_companies(self, app: Flask):
+        add_grades({1: [5, 5, 4], 2: [5], 3: [2, 3]})
+        top = company_service.top_companies()
+        assert [company['name'] for company in top] == ['co1', 'co2', 'co3']
+        assert [company['name'] for company in company_service.top_companies(location='NOVI')] == ['co1', 'co3']
+
+    def test_grades_update_cached_ranking(self, app: Flask):
+        add_grades({1: [5], 2: [4]})
+        assert [company['name'] for company in company_service.top_companies()] == ['co1', 'co2']
+
+        leaderboard = app.extensions['leaderboard']
+        expires_at = leaderboard._expires_at
+        add_grades({1: [1, 1, 1]})
+        assert [company['name'] for company in company_service.top_companies()] == ['co2', 'co1']
+        assert leaderboard._expires_at == expires_at # updated in place, not reloaded
+
+    def test_bulk_reviews_update_cached_ranking(self, app: Flask):
+        add_grades({1: [4], 2: [4]})
+        assert company_service.top_companies()[0]['name'] == 'co1'
+        user = User.query.filter_by(username='mika_test').one()
+        company_service.add_reviews(user, [{'company_id': 2, 'grade': 5}] * 5, [])
+        assert company_service.top_companies()[0]['name'] == 'co2'
+
+    def test_cache_staleness(self, app: Flask):
+        add_grades({1: [4]})
+        company_service.top_companies()
+        # grade committed by another worker
+        Company.query.filter_by(id=2).update({'grade_count': 10, 'grade_sum': 50, 'avg_grade': 5.0})
+        db.session.commit()
+        assert [company['name'] for company in company_service.top_companies()] == ['co1']
+
+        app.extensions['leaderboard'].ttl = 0
+        app.extensions['leaderboard'].expire()
+        assert [company['name'] for company in company_service.top_companies()] == ['co2', 'co1']
@@ -0,0 +1,98 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask
+from werkzeug.security import generate_password_hash
+import jwt
+from app import create_app, config, db
+from app.metrics import Counter, Histogram, RequestMetrics
+from app.models import User, Company, UserRole
+
+
+@pytest.fixture
+def app() -> Flask:
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add(User({'username': 'mika_test', 'password': generate_password_hash('mikamika'), 'role': UserRole.user}))
+        db.session.add(Company({'approved': True, 'name': 'co1', 'email': 'contact@co1.com', 'location': 'Novi Sad',
+                                'website': 'co1.com', 'description': 'best company ever'}))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
+
+
+def headers() -> dict:
+    token = jwt.encode({'username': 'mika_test', 'role': 'user', 'exp': datetime.utcnow() + timedelta(minutes=30)},
+                       key='secret', algorithm='HS256')
+    return {'authorization': f'Bearer {token}'}
+
+
+class TestMetricTypes:
+    '''Test case for Prometheus text format of metric families.'''
+
+    def test_histogram(self):
+        histogram = Histogram('latency', 'Latency.', ('endpoint',), buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(('a',), value)
+        assert histogram.render() == [
+            '# HELP latency Latency.',
+            '# TYPE latency histogram',
+            'latency_bucket{endpoint="a",le="0.1"} 2',
+            'latency_bucket{endpoint="a",le="1"} 3',
+            'latency_bucket{endpoint="a",le="+Inf"} 4',
+            'latency_sum{endpoint="a"} 3.65',
+            'latency_count{endpoint="a"} 4',
+        ]
+
+    def test_counter_escapes_labels(self):
+        counter = Counter('requests_total', 'Requests.', ('path',))
+        counter.inc(('say "hi"\\\n',))
+        counter.inc(('say "hi"\\\n',), 2)
+        assert counter.render()[-1] == 'requests_total{path="say \\"hi\\"\\\\\\n"} 3'
+
+
+class TestRequestMetrics:
+    '''Test case for metrics recorded by the api blueprint.'''
+
+    def test_requests_are_recorded(self, app: Flask):
+        client = app.test_client()
+        assert client.get('/api/company/1', headers=headers()).status_code == 200
+        assert client.get('/api/company/2', headers=headers()).status_code == 404
+
+        metrics: RequestMetrics = app.extensions['metrics']
+        assert metrics.latency.count(('api.get_company', 'GET')) == 2
+        assert metrics.requests.value(('api.get_company', 'GET', 200)) == 1
+        assert metrics.requests.value(('api.get_company', 'GET', 404)) == 1
+        assert metrics.in_flight.value(('api.get_company',)) == 0
+        assert metrics.statements.count(('api.get_company',)) == 2
+        assert metrics.sql_time._series[('api.get_company',)][-1] > 0
+
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.content_type.startswith('text/plain; version=0.0.4')
+        body = response.get_data(as_text=True)
+        assert 'joberty_http_requests_total{endpoint="api.get_company",method="GET",status="404"} 1' in body
+        assert 'joberty_http_request_duration_seconds_count{endpoint="api.get_company",method="GET"} 2' in body
+        assert 'joberty_db_pool_checkouts{bind="default"}' in body
+        assert 'joberty_hash_pool_completed{pool="default"} 0' in body
+
+    def test_in_flight_after_unhandled_error(self, app: Flask, monkeypatch):
+        from app.services import company_service
+        monkeypatch.setattr(company_service, 'get_company', lambda *args, **kwargs: 1 / 0)
+        app.testing = False
+        assert app.test_client().get('/api/company/1', headers=headers()).status_code == 500
+        assert app.extensions['metrics'].in_flight.value(('api.get_company',)) == 0
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(config, 'METRICS_ENABLED', False)
+    app = create_app()
+    client = app.test_client()
+    assert client.get('/metrics').status_code == 404
+    client.get('/api/company/1')
+    assert app.extensions['metrics'].requests._series == {}
+    app.extensions['hash_pool'].shutdown()
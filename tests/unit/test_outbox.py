@@ -0,0 +1,142 @@
+import pytest
+from threading import Event, Thread
+from flask import Flask
+from app import create_app, db, outbox
+from app.models import User, Company, UserRole, OutboxEvent
+from app.outbox import InMemoryBroker, OutboxRelay
+from app.services import company_service
+from sqlalchemy.exc import IntegrityError
+
+
+def seed_db():
+    mika = User({"username": "mika_test", "password": "mikamika", "role": UserRole.user})
+    zika = User({"username": "zika_test", "password": "zikazika", "role": UserRole.company_owner})
+    db.session.add_all([mika, zika])
+    db.session.commit()
+
+    db.session.add(Company({
+        'approved': True,
+        'name': 'co1',
+        'email': 'contact@co1.com',
+        'location': 'ulica 1, Neki Grad',
+        'website': 'website.co1.com',
+        'description': 'best company ever',
+        'user_id': zika.id
+    }))
+    db.session.commit()
+
+
+@pytest.fixture
+def app() -> Flask:
+    # setup
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_db()
+        yield app
+
+    # teardown
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
+
+
+@pytest.fixture
+def broker() -> InMemoryBroker:
+    return InMemoryBroker()
+
+
+@pytest.fixture
+def mika() -> User:
+    return User.query.filter_by(username='mika_test').first()
+
+
+@pytest.fixture
+def company() -> Company:
+    return Company.query.filter_by(name='co1').first()
+
+
+class TestOutbox:
+    '''Test case for transactional outbox and its relay.'''
+
+    def test_events_are_published_and_deleted(self, app: Flask, broker: InMemoryBroker, mika: User, company: Company):
+        comment = company_service.create_comment(mika, company.id, 'nice')
+        grade = company_service.add_grade(mika, company.id, 4)
+        assert OutboxEvent.query.count() == 2
+
+        relay = outbox.create_relay(app, broker)
+        assert relay.drain_once() == 2
+        assert OutboxEvent.query.count() == 0
+
+        events = broker.events()
+        assert [event['type'] for event in events] == ['comment_created', 'grade_created']
+        assert events[0]['payload']['id'] == comment.id
+        assert events[1]['payload'] == {'id': grade.id, 'company_id': company.id, 'user_id': mika.id, 'grade': 4}
+        assert {key for _, key, _ in broker.messages} == {str(company.id).encode()}
+        assert {topic for topic, _, _ in broker.messages} == {app.config['KAFKA_TOPIC']}
+
+    def test_write_does_not_wait_for_broker(self, app: Flask, broker: InMemoryBroker, mika: User, company: Company):
+        '''When broker is down, writes succeed and events wait in the outbox until it is back.'''
+        broker.available = False
+        company_service.add_grade(mika, company.id, 5)
+        relay = OutboxRelay(broker, 'topic', batch_size=10, poll_interval=0)
+        with pytest.raises(ConnectionError):
+            relay.drain_once()
+        assert OutboxEvent.query.count() == 1
+
+        broker.available = True
+        assert relay.drain_once() == 1
+        assert broker.events()[0]['type'] == 'grade_created'
+
+    def test_rolled_back_write_has_no_event(self, app: Flask, mika: User):
+        with pytest.raises(IntegrityError):
+            company_service.create_company_registration(mika, {'name': 'co2'})
+        assert OutboxEvent.query.count() == 0
+
+    def test_company_registration_events(self, app: Flask, mika: User):
+        company = company_service.create_company_registration(mika, {
+            'name': 'co2', 'email': 'contact@co2.com', 'location': 'Novi Sad', 'website': 'co2.com', 'description': 'co2'})
+        company_service.resolve_company_registration('mika_test', reject=False)
+        events = OutboxEvent.query.order_by(OutboxEvent.id).all()
+        assert [event.event_type for event in events] == ['company_registered', 'company_approved']
+        assert events[1].payload == {'company_id': company.id, 'user_id': mika.id}
+
+    def test_bulk_reviews_events(self, app: Flask, mika: User, company: Company):
+        result = company_service.add_reviews(mika, [{'company_id': company.id, 'grade': 3}, {'company_id': 0, 'grade': 3}],
+                                             [{'company_id': company.id, 'description': 'bulk'}])
+        events = {event.event_type: event.payload for event in OutboxEvent.query.all()}
+        assert OutboxEvent.query.count() == 2
+        assert events['grade_created']['id'] == result['grades'][0]['id']
+        assert events['comment_created']['id'] == result['comments'][0]['id']
+
+    def test_relay_drains_in_batches(self, app: Flask, broker: InMemoryBroker, mika: User, company: Company):
+        for grade in range(1, 6):
+            company_service.add_grade(mika, company.id, grade)
+        relay = OutboxRelay(broker, 'topic', batch_size=2, poll_interval=0)
+        assert [relay.drain_once() for _ in range(4)] == [2, 2, 1, 0]
+        assert [event['payload']['grade'] for event in broker.events()] == [1, 2, 3, 4, 5]
+        assert broker.flushes == 3
+
+    def test_run_until_stopped(self, app: Flask, broker: InMemoryBroker, mika: User, company: Company):
+        company_service.add_grade(mika, company.id, 5)
+        relay = OutboxRelay(broker, 'topic', batch_size=10, poll_interval=0.01)
+        stop = Event()
+
+        def run():
+            with app.app_context():
+                relay.run(stop)
+
+        thread = Thread(target=run)
+        thread.start()
+        try:
+            for _ in range(100):
+                if relay.published:
+                    break
+                stop.wait(0.01)
+        finally:
+            stop.set()
+            thread.join(timeout=5)
+        assert relay.published == 1
+        assert not thread.is_alive()
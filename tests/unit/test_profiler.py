@@ -0,0 +1,101 @@
+import pstats
+import time
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask
+from werkzeug.security import generate_password_hash
+import jwt
+from app import config, create_app, db, profiler
+from app.models import User, Company, UserRole
+from app.services import company_service
+
+
+def make_app(monkeypatch, **settings) -> Flask:
+    for name, value in settings.items():
+        monkeypatch.setattr(config, name, value)
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.add_all([
+            User({'username': 'mika_test', 'password': generate_password_hash('mikamika'), 'role': UserRole.user}),
+            User({'username': 'admin_test', 'password': generate_password_hash('adminadmin'), 'role': UserRole.admin}),
+            Company({'approved': True, 'name': 'co1', 'email': 'contact@co1.com', 'location': 'Novi Sad',
+                     'website': 'co1.com', 'description': 'best company ever'}),
+        ])
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def make(monkeypatch):
+    apps = []
+
+    def make(**settings) -> Flask:
+        apps.append(make_app(monkeypatch, **settings))
+        return apps[-1]
+    yield make
+    for app in apps:
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+        app.extensions['hash_pool'].shutdown()
+
+
+def headers(username: str, role: str, profile: bool = False) -> dict:
+    token = jwt.encode({'username': username, 'role': role, 'exp': datetime.utcnow() + timedelta(minutes=30)},
+                       key='secret', algorithm='HS256')
+    return {'authorization': f'Bearer {token}', **({profiler.PROFILE_HEADER: '1'} if profile else {})}
+
+
+class TestProfiler:
+    '''Test case for on-demand profiling of api requests.'''
+
+    def test_admin_header(self, make, tmp_path):
+        client = make(PROFILE_DIR=str(tmp_path)).test_client()
+        assert client.get('/api/company/1', headers=headers('admin_test', 'admin')).status_code == 200
+        assert list(tmp_path.iterdir()) == []
+
+        response = client.get('/api/company/1', headers=headers('admin_test', 'admin', profile=True))
+        assert response.status_code == 200
+        [path] = (tmp_path / 'api.get_company').iterdir()
+        assert path.suffix == '.prof'
+        functions = {function for _, _, function in pstats.Stats(str(path)).stats}
+        assert 'get_company' in functions
+
+    def test_header_ignored_for_other_roles(self, make, tmp_path):
+        client = make(PROFILE_DIR=str(tmp_path)).test_client()
+        response = client.get('/api/company/1', headers=headers('mika_test', 'user', profile=True))
+        assert response.status_code == 200
+        response = client.get('/api/company/1', headers={profiler.PROFILE_HEADER: '1'})
+        assert response.status_code == 403
+        assert list(tmp_path.iterdir()) == []
+
+    def test_sampled_collapsed_stacks(self, make, tmp_path, monkeypatch):
+        client = make(PROFILE_DIR=str(tmp_path), PROFILE_SAMPLE_RATE=1, PROFILE_FORMAT='collapsed').test_client()
+        get_company = company_service.get_company
+
+        def slow_get_company(*args, **kwargs):
+            time.sleep(0.05)
+            return get_company(*args, **kwargs)
+        monkeypatch.setattr(company_service, 'get_company', slow_get_company)
+
+        assert client.get('/api/company/1', headers=headers('mika_test', 'user')).status_code == 200
+        [path] = (tmp_path / 'api.get_company').iterdir()
+        lines = path.read_text().splitlines()
+        stack, count = max((line.rsplit(' ', 1) for line in lines), key=lambda item: int(item[1]))
+        assert int(count) > 1
+        assert 'app.routes.get_company;' in stack
+        assert stack.endswith('slow_get_company')
+
+    def test_disabled(self, make, tmp_path):
+        app = make(PROFILE_SAMPLE_RATE=1)
+        assert app.config['PROFILE_DIR'] is None
+        response = app.test_client().get('/api/company/1', headers=headers('admin_test', 'admin', profile=True))
+        assert response.status_code == 200
+
+    def test_unknown_format(self, monkeypatch, tmp_path):
+        monkeypatch.setattr(config, 'PROFILE_DIR', str(tmp_path))
+        monkeypatch.setattr(config, 'PROFILE_FORMAT', 'svg')
+        with pytest.raises(profiler.UnknownProfileFormat):
+            create_app()
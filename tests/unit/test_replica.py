@@ -0,0 +1,110 @@
+import pytest
+from datetime import datetime, timedelta
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from werkzeug.security import generate_password_hash
+import jwt
+from app import create_app, config, db
+from app.models import User, Company, UserRole
+from app.replica import REPLICA
+
+
+def replica_uri() -> str:
+    '''Second database on the same server stands in for the replica.'''
+    url = make_url(config.DATABASE_CONNECTION_URI)
+    engine = create_engine(url, isolation_level='AUTOCOMMIT')
+    with engine.connect() as connection:
+        name = f'{url.database}_replica'
+        if not connection.execute(text('SELECT 1 FROM pg_database WHERE datname = :name'), {'name': name}).first():
+            connection.execute(text(f'CREATE DATABASE "{name}" ENCODING \'UTF8\' TEMPLATE template0'))
+    engine.dispose()
+    return str(url.set(database=name))
+
+
+def seed(session, company_name: str):
+    session.add_all([
+        User({'username': 'mika_test', 'password': generate_password_hash('mikamika'), 'role': UserRole.user}),
+        User({'username': 'zika_test', 'password': generate_password_hash('zikazika'), 'role': UserRole.user}),
+        Company({'approved': True, 'name': company_name, 'email': 'contact@co1.com',
+                 'location': 'ulica 1, Neki Grad', 'website': 'website.co1.com', 'description': 'best company ever'}),
+    ])
+    session.commit()
+
+
+@pytest.fixture
+def app(monkeypatch) -> Flask:
+    monkeypatch.setattr(config, 'DATABASE_REPLICA_URI', replica_uri())
+    app = create_app()
+    with app.app_context():
+        replica = db.get_engine(app, bind=REPLICA)
+        for engine in (db.engine, replica):
+            db.metadata.drop_all(bind=engine)
+            db.metadata.create_all(bind=engine)
+        seed(db.session, 'primary')
+        with Session(bind=replica) as session:
+            seed(session, 'replica')
+
+    yield app
+
+    with app.app_context():
+        for engine in (db.engine, db.get_engine(app, bind=REPLICA)):
+            db.metadata.drop_all(bind=engine)
+            engine.dispose()
+    app.extensions['hash_pool'].shutdown()
+
+
+@pytest.fixture
+def client(app: Flask) -> FlaskClient:
+    with app.test_client() as client:
+        yield client
+
+
+def headers(username: str) -> dict:
+    token = jwt.encode({'username': username, 'role': 'user', 'exp': datetime.utcnow() + timedelta(minutes=30)},
+                       key='secret', algorithm='HS256')
+    return {'authorization': f'Bearer {token}'}
+
+
+class TestReplica:
+    '''Test case for routing reads to the read replica.'''
+
+    def test_reads_served_by_replica(self, client: FlaskClient):
+        response = client.get('/api/company/1', headers=headers('mika_test'))
+        assert response.status_code == 200
+        assert response.json['name'] == 'replica'
+
+    def test_writes_go_to_primary_and_stick(self, app: Flask, client: FlaskClient):
+        response = client.post('/api/company/1/comment', json={'description': 'nice'}, headers=headers('mika_test'))
+        assert response.status_code == 200
+
+        with app.app_context():
+            assert db.session.execute(text('SELECT count(*) FROM comment')).scalar() == 1
+            replica = db.get_engine(app, bind=REPLICA)
+            with replica.connect() as connection:
+                assert connection.execute(text('SELECT count(*) FROM comment')).scalar() == 0
+
+        # writer reads its own write from the primary, other users still read the replica
+        assert client.get('/api/company/1', headers=headers('mika_test')).json['name'] == 'primary'
+        assert client.get('/api/company/1', headers=headers('zika_test')).json['name'] == 'replica'
+
+    def test_sticky_window_expires(self, app: Flask, client: FlaskClient):
+        client.post('/api/company/1/comment', json={'description': 'nice'}, headers=headers('mika_test'))
+        app.extensions['replica_sticky'].clear()
+        assert client.get('/api/company/1', headers=headers('mika_test')).json['name'] == 'replica'
+
+
+def test_without_replica_reads_primary(monkeypatch):
+    monkeypatch.setattr(config, 'DATABASE_REPLICA_URI', None)
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(db.session, 'primary')
+    with app.test_client() as client:
+        assert client.get('/api/company/1', headers=headers('mika_test')).json['name'] == 'primary'
+    with app.app_context():
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
@@ -0,0 +1,49 @@
+import logging
+import pytest
+from flask import Flask
+from sqlalchemy import inspect, text
+from app import create_app, config, db, schema
+
+
+@pytest.fixture
+def app() -> Flask:
+    # setup, database without any tables
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        yield app
+
+    # teardown
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP TABLE IF EXISTS alembic_version'))
+    app.extensions['hash_pool'].shutdown()
+
+
+class TestSchema:
+    '''Test case for migration based schema management.'''
+
+    def test_boot_does_not_create_tables(self, app: Flask):
+        create_app()
+        assert not inspect(db.engine).has_table('company')
+
+    def test_migrate_command(self, app: Flask):
+        assert not schema.check_revision(app)
+        result = app.test_cli_runner().invoke(args=['migrate'])
+        assert result.exit_code == 0, result.output
+        assert schema.current_revisions() == schema.head_revisions(app)
+        assert schema.check_revision(app)
+        assert {'user', 'company', 'comment', 'grade', 'outbox_event'} <= set(inspect(db.engine).get_table_names())
+
+    def test_boot_warns_when_not_migrated(self, app: Flask, caplog):
+        with caplog.at_level(logging.WARNING):
+            create_app()
+        assert 'run `flask migrate`' in caplog.text
+
+    def test_fast_start_skips_revision_check(self, app: Flask, caplog, monkeypatch):
+        monkeypatch.setattr(config, 'FAST_START', True)
+        with caplog.at_level(logging.WARNING):
+            create_app()
+        assert 'flask migrate' not in caplog.text
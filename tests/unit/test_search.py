@@ -0,0 +1,105 @@
+import pytest
+from types import SimpleNamespace
+from flask import Flask
+from werkzeug.security import generate_password_hash
+from app import create_app, config, db
+from app.models import User, Company, UserRole
+from app.search import InvertedIndex, UnknownSearchBackend, tokenize
+from app.services import company_service
+
+
+def company(id: int, name: str, location: str = 'Novi Sad', description: str = 'software company'):
+    return SimpleNamespace(id=id, name=name, location=location, description=description)
+
+
+def seed_db():
+    owner = User({'username': 'owner_test', 'password': generate_password_hash('owner'), 'role': UserRole.user})
+    db.session.add(owner)
+    db.session.add_all([
+        Company({'approved': True, 'name': 'Vega IT', 'email': 'a@vega.com', 'location': 'Novi Sad',
+                 'website': 'vega.com', 'description': 'software outsourcing'}),
+        Company({'approved': True, 'name': 'Levi9', 'email': 'a@levi9.com', 'location': 'Beograd',
+                 'website': 'levi9.com', 'description': 'software from Novi Sad and Beograd'}),
+        Company({'approved': True, 'name': 'Novi Sad Bakery', 'email': 'a@bakery.com', 'location': 'Novi Sad',
+                 'website': 'bakery.com', 'description': 'bread'}),
+        Company({'approved': False, 'name': 'Novi Sad Software', 'email': 'a@pending.com', 'location': 'Novi Sad',
+                 'website': 'pending.com', 'description': 'software', 'user_id': 1}),
+    ])
+    db.session.commit()
+
+
+@pytest.fixture(params=['postgres', 'memory'])
+def app(request, monkeypatch) -> Flask:
+    monkeypatch.setattr(config, 'SEARCH_BACKEND', request.param)
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_db()
+        yield app
+        db.session.remove()
+        db.drop_all()
+    app.extensions['hash_pool'].shutdown()
+
+
+class TestInvertedIndex:
+    '''Test case for in-memory search index.'''
+
+    def test_tokenize(self):
+        assert tokenize('Novi Sad – Čačak, ulica 1') == ['novi', 'sad', 'čačak', 'ulica', '1']
+
+    def test_ranks_name_over_location_over_description(self):
+        index = InvertedIndex()
+        index.build([company(1, 'Acme', description='python'), company(2, 'Python Labs'),
+                     company(3, 'Acme', location='Python Street')])
+        assert index.search('python') == [2, 3, 1]
+
+    def test_matches_all_terms(self):
+        index = InvertedIndex()
+        index.build([company(1, 'Vega'), company(2, 'Vega', location='Beograd')])
+        assert index.search('vega beograd') == [2]
+        assert index.search('vega missing') == []
+        assert index.search('  ,. ') == []
+
+    def test_pagination(self):
+        index = InvertedIndex()
+        index.build([company(id, f'Company {id}') for id in range(1, 6)])
+        assert index.search('company', offset=0, limit=2) == [1, 2]
+        assert index.search('company', offset=4, limit=2) == [5]
+
+    def test_add_replaces_and_remove(self):
+        index = InvertedIndex()
+        index.build([company(1, 'Old Name')])
+        index.add(company(1, 'New Name'))
+        assert index.search('old') == []
+        assert index.search('new') == [1]
+        index.remove(1)
+        assert index.search('name') == []
+        assert len(index) == 0
+
+
+class TestSearchCompanies:
+    '''Test case for company search, with both backends.'''
+
+    def test_only_approved_ranked(self, app: Flask):
+        companies = company_service.search_companies('novi sad')
+        assert [company.name for company in companies] == ['Novi Sad Bakery', 'Vega IT', 'Levi9']
+
+    def test_pagination(self, app: Flask):
+        first = company_service.search_companies('novi sad', limit=2)
+        second = company_service.search_companies('novi sad', offset=2, limit=2)
+        assert [company.name for company in first + second] == ['Novi Sad Bakery', 'Vega IT', 'Levi9']
+        with pytest.raises(ValueError):
+            company_service.search_companies('novi sad', offset=-1)
+
+    def test_approved_company_becomes_searchable(self, app: Flask):
+        assert [company.name for company in company_service.search_companies('software novi')] == ['Vega IT', 'Levi9']
+        company_service.resolve_company_registration('owner_test', reject=False)
+        assert [company.name for company in company_service.search_companies('software novi')] == \
+            ['Novi Sad Software', 'Vega IT', 'Levi9']
+
+
+def test_unknown_backend(monkeypatch):
+    monkeypatch.setattr(config, 'SEARCH_BACKEND', 'elastic')
+    with pytest.raises(UnknownSearchBackend):
+        create_app()
@@ -0,0 +1,86 @@
+import pytest
+from flask import Flask, jsonify
+from app import create_app, db
+from app import serializers
+from app.models import User, Company, Comment, Grade, UserRole
+from app.serializers import SerializerCompileError
+
+
+def seed_db():
+    mika = User({"username": "mika_test", "password": "mikamika", "role": UserRole.user})
+    zika = User({"username": "zika_test", "password": "zikazika", "role": UserRole.company_owner})
+    db.session.add_all([mika, zika])
+    db.session.commit()
+
+    co = Company({
+        'approved': True,
+        'name': 'co1',
+        'email': 'contact@co1.com',
+        'location': 'Novi Sad – Čačak',
+        'website': 'website.co1.com',
+        'description': 'best company ever',
+        'user_id': zika.id
+    })
+    db.session.add(co)
+    db.session.commit()
+
+    db.session.add(Comment({'company_id': co.id, 'user_id': mika.id, 'description': 'Čačak'}))
+    db.session.add(Grade({'company_id': co.id, 'user_id': mika.id, 'grade': 4}))
+    db.session.commit()
+
+
+@pytest.fixture
+def app() -> Flask:
+    # setup
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed_db()
+        yield app
+
+    # teardown
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+class TestCompiledSerializers:
+    '''Compiled serializers must produce same output as SerializerMixin.to_dict.'''
+
+    @pytest.mark.parametrize('model', [User, Company, Comment, Grade])
+    def test_same_as_to_dict(self, app: Flask, model):
+        for instance in model.query.all():
+            assert serializers.to_dict(instance) == instance.to_dict()
+
+    def test_user_without_company(self, app: Flask):
+        user = User.query.filter_by(username='mika_test').first()
+        assert serializers.to_dict(user)['company'] == None
+        assert serializers.to_dict(user) == user.to_dict()
+
+    def test_extra_rules(self, app: Flask):
+        company = Company.query.first()
+        rules = ('-comments', '-grades', '-user')
+        assert serializers.to_dict(company, rules) == company.to_dict(rules=rules)
+
+    def test_serializer_is_compiled_once(self, app: Flask):
+        assert serializers.serializer_for(Company) is serializers.serializer_for(Company)
+
+    def test_positive_rules_not_supported(self, app: Flask):
+        with pytest.raises(SerializerCompileError):
+            serializers.serializer_for(Company, ('comments',))
+
+    def test_dumps_same_as_jsonify(self, app: Flask):
+        company = Company.query.first()
+        with app.test_request_context():
+            expected = jsonify(company.to_dict()).get_data()
+            assert serializers.dumps(serializers.to_dict(company)) == expected
+
+    @pytest.mark.parametrize('as_ascii', [True, False])
+    def test_dumps_non_ascii_same_as_jsonify(self, app: Flask, as_ascii: bool):
+        app.config['JSON_AS_ASCII'] = as_ascii
+        company = Company.query.first()
+        with app.test_request_context():
+            expected = jsonify(company.to_dict()).get_data()
+            assert serializers.dumps(serializers.to_dict(company)) == expected
+            assert ('Čačak' in expected.decode()) == (not as_ascii)
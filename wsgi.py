@@ -0,0 +1,18 @@
+'''
+WSGI entry point for production servers:
+    gunicorn -c gunicorn.conf.py wsgi:app
+'''
+import os
+from app import create_app, db
+
+app = create_app()
+
+
+def dispose_inherited_connections():
+    # with preloading, the app is created in the server's master process and workers are forked from it.
+    # Pooled connections opened in master must not be shared by workers, every worker opens its own.
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+os.register_at_fork(after_in_child=dispose_inherited_connections)